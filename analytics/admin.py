@@ -1,3 +1,48 @@
 from django.contrib import admin
+from .models import ExportJob, KpiDiario, MarcaKpi
 
-# Register your models here.
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    """
+    Admin de sólo lectura para las exportaciones CSV en segundo plano.
+    """
+    list_display = ['id', 'reporte', 'solicitado_por', 'status', 'filas_procesadas', 'fecha_creacion', 'fecha_fin']
+    list_filter = ['status', 'reporte']
+    search_fields = ['solicitado_por__username']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(KpiDiario)
+class KpiDiarioAdmin(admin.ModelAdmin):
+    """
+    Admin de sólo lectura para los KPIs pre-agregados.
+    """
+    list_display = ['fecha', 'metrica', 'dimension', 'cantidad', 'monto']
+    list_filter = ['metrica']
+    date_hierarchy = 'fecha'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(MarcaKpi)
+class MarcaKpiAdmin(admin.ModelAdmin):
+    """
+    Admin de sólo lectura para las marcas de agua de los KPIs.
+    """
+    list_display = ['fuente', 'ultimo_id', 'fecha_actualizacion']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,174 @@
+"""
+Exportaciones de reportes CSV en segundo plano.
+
+Un reporte completo puede tardar más que el timeout del worker web, así que
+el request sólo crea un ExportJob y lo encola en un pool de threads del
+proceso (EXPORT_WORKERS). El thread escribe el archivo por bloques en
+MEDIA_ROOT/exports, actualiza `filas_procesadas` y el latido
+(`fecha_actualizacion`) después de cada bloque y al terminar deja el archivo
+listo para descargar.
+
+Si el proceso se reinicia con exportaciones en curso, el comando
+`procesar_exportaciones` vuelve a ejecutar las que dejaron de latir y borra
+las vencidas.
+"""
+
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction as db_transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .exports import REPORTES
+from .models import ExportJob
+
+logger = logging.getLogger(__name__)
+
+DIRECTORIO = 'exports'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.EXPORT_WORKERS,
+                thread_name_prefix='exportaciones'
+            )
+        return _executor
+
+
+def solicitar(reporte, usuario):
+    """
+    Crea la exportación y la encola cuando se confirma la transacción.
+
+    Raises:
+        KeyError: si `reporte` no está en REPORTES
+    """
+    if reporte not in REPORTES:
+        raise KeyError(reporte)
+
+    job = ExportJob.objects.create(reporte=reporte, solicitado_por=usuario)
+    db_transaction.on_commit(lambda: encolar(job.pk))
+    return job
+
+
+def encolar(job_id):
+    """Ejecuta la exportación en el pool (o en línea con EXPORT_WORKERS = 0)."""
+    if settings.EXPORT_WORKERS <= 0:
+        ejecutar(job_id)
+    else:
+        _get_executor().submit(_ejecutar_en_thread, job_id)
+
+
+def _ejecutar_en_thread(job_id):
+    close_old_connections()
+    try:
+        ejecutar(job_id)
+    finally:
+        # Cada thread abre su propia conexión: se cierra al terminar
+        connections.close_all()
+
+
+def ejecutar(job_id):
+    """
+    Genera el archivo de una exportación pendiente.
+
+    La toma con un UPDATE condicional, así dos workers nunca procesan la
+    misma exportación. El archivo se escribe con un nombre temporal y se
+    renombra al final: nunca se sirve un CSV a medio escribir.
+
+    Returns:
+        bool: True si esta llamada procesó la exportación
+    """
+    ahora = timezone.now()
+    tomada = ExportJob.objects.filter(pk=job_id, status='PENDIENTE').update(
+        status='EN_PROCESO',
+        fecha_inicio=ahora,
+        fecha_actualizacion=ahora,
+        filas_procesadas=0,
+        error=''
+    )
+    if not tomada:
+        return False
+
+    job = ExportJob.objects.get(pk=job_id)
+    reporte = REPORTES[job.reporte]()
+    nombre_descarga = reporte.nombre_archivo()
+    nombre = f"{DIRECTORIO}/{uuid.uuid4().hex}_{nombre_descarga}"
+
+    ruta = os.path.join(settings.MEDIA_ROOT, nombre)
+    temporal = f"{ruta}.parcial"
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+
+    def al_avanzar(filas):
+        ExportJob.objects.filter(pk=job_id).update(
+            filas_procesadas=filas,
+            fecha_actualizacion=timezone.now()
+        )
+
+    try:
+        with open(temporal, 'wb') as archivo:
+            filas = reporte.escribir(archivo, al_avanzar)
+        os.replace(temporal, ruta)
+    except Exception as e:
+        logger.exception(f"Error al generar la exportación {job_id}")
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        ExportJob.objects.filter(pk=job_id).update(
+            status='ERROR',
+            error=str(e),
+            fecha_fin=timezone.now()
+        )
+        return True
+
+    ExportJob.objects.filter(pk=job_id).update(
+        status='COMPLETADO',
+        archivo=nombre,
+        nombre_descarga=nombre_descarga,
+        filas_procesadas=filas,
+        fecha_fin=timezone.now()
+    )
+    return True
+
+
+def reanudar_colgadas(minutos):
+    """
+    Devuelve a PENDIENTE las exportaciones EN_PROCESO sin latido hace más de
+    `minutos` (el proceso que las tomó se reinició) y retorna los IDs
+    pendientes. Una exportación larga que sigue escribiendo bloques no se
+    toca, por más que haya empezado hace horas.
+    """
+    limite = timezone.now() - timedelta(minutes=minutos)
+    sin_latido = Q(fecha_actualizacion__lt=limite) | Q(fecha_actualizacion__isnull=True, fecha_inicio__lt=limite)
+    ExportJob.objects.filter(sin_latido, status='EN_PROCESO').update(status='PENDIENTE')
+    return list(
+        ExportJob.objects.filter(status='PENDIENTE').order_by('fecha_creacion').values_list('pk', flat=True)
+    )
+
+
+def purgar_vencidas(dias):
+    """
+    Borra las exportaciones terminadas hace más de `dias` días y sus archivos.
+
+    Returns:
+        int: exportaciones borradas
+    """
+    limite = timezone.now() - timedelta(days=dias)
+    vencidas = ExportJob.objects.filter(status__in=['COMPLETADO', 'ERROR'], fecha_fin__lt=limite)
+
+    borradas = 0
+    for job in vencidas.iterator():
+        job.borrar_archivo()
+        job.delete()
+        borradas += 1
+    return borradas
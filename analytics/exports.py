@@ -0,0 +1,439 @@
+"""
+Motor de exportaciones CSV en streaming.
+
+Cada reporte es una subclase de ReporteCSV: define los encabezados y genera
+las filas a partir de querysets proyectados con values_list y leídos con
+.iterator(chunk_size=...). Las líneas se envían en bloques a través de un
+StreamingHttpResponse, así la memoria queda plana y el primer byte sale
+apenas se lee el primer bloque, sin importar el tamaño de la tabla.
+"""
+
+import csv
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import OuterRef, Subquery
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from jobs.models import JobOffer, EscrowTransaction
+from usuarios.models import UserProfile, Transaction, WorkEvent, Proposal
+from usuarios.models import JobOffer as OfertaTrabajo
+
+# Filas que se piden a la base por viaje y líneas CSV por bloque enviado
+CHUNK_SIZE = 2000
+FILAS_POR_BLOQUE = 500
+
+BOM = '\ufeff'.encode('utf-8')
+
+
+class _Eco:
+    """Pseudo-archivo para csv.writer: devuelve la línea en lugar de guardarla."""
+
+    def write(self, valor):
+        return valor
+
+
+def _nombre(first_name, last_name, username):
+    """Equivalente a UserProfile.nombre_completo sobre valores proyectados."""
+    return f"{first_name or ''} {last_name or ''}".strip() or username or ''
+
+
+def _cuenta(username, nombre_cuenta):
+    """Usuario de una wallet, o el nombre de la cuenta si es del sistema."""
+    return username or nombre_cuenta or ''
+
+
+class ReporteCSV:
+    """
+    Base de los reportes CSV.
+
+    Las subclases definen `encabezados`, `prefijo_archivo` y `filas()`.
+    """
+
+    titulo = 'Reporte'
+    prefijo_archivo = 'reporte'
+    formato_fecha_archivo = '%Y%m%d_%H%M%S'
+    delimitador = ';'
+    quoting = csv.QUOTE_ALL
+    encabezados = []
+
+    def nombre_archivo(self):
+        if not self.formato_fecha_archivo:
+            return f"{self.prefijo_archivo}.csv"
+        return f"{self.prefijo_archivo}_{timezone.now().strftime(self.formato_fecha_archivo)}.csv"
+
+    def filas(self):
+        """Genera las filas del reporte (listas de valores)."""
+        raise NotImplementedError
+
+    def bloques(self):
+        """
+        Genera el CSV en bloques de bytes UTF-8 (con BOM al inicio para Excel).
+
+        Yields:
+            tuple: (bytes, filas) - el bloque y cuántas filas de datos contiene
+        """
+        writer = csv.writer(_Eco(), delimiter=self.delimitador, quoting=self.quoting)
+
+        yield BOM + writer.writerow(self.encabezados).encode('utf-8'), 0
+
+        bloque = []
+        for fila in self.filas():
+            bloque.append(writer.writerow(fila))
+            if len(bloque) >= FILAS_POR_BLOQUE:
+                yield ''.join(bloque).encode('utf-8'), len(bloque)
+                bloque = []
+        if bloque:
+            yield ''.join(bloque).encode('utf-8'), len(bloque)
+
+    def lineas(self):
+        for contenido, _ in self.bloques():
+            yield contenido
+
+    def escribir(self, archivo, al_avanzar=None):
+        """
+        Escribe el reporte en un archivo binario abierto.
+
+        Args:
+            archivo: destino (modo 'wb')
+            al_avanzar: callable opcional que recibe el total de filas escritas
+                        después de cada bloque
+
+        Returns:
+            int: filas de datos escritas
+        """
+        total = 0
+        for contenido, filas in self.bloques():
+            archivo.write(contenido)
+            if filas:
+                total += filas
+                if al_avanzar:
+                    al_avanzar(total)
+        return total
+
+    def respuesta(self):
+        """StreamingHttpResponse que descarga el reporte."""
+        response = StreamingHttpResponse(self.lineas(), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{self.nombre_archivo()}"'
+        return response
+
+
+class ReporteTransacciones(ReporteCSV):
+    """Todas las transacciones de escrow, con datos de cliente y profesional."""
+
+    titulo = 'Todas las Transacciones'
+    prefijo_archivo = 'reporte_transacciones'
+    encabezados = [
+        'ID Transacción',
+        'Fecha',
+        'Tipo de Transacción',
+        'Estado',
+        'ID Trabajo',
+        'Título Trabajo',
+        'Cliente',
+        'CUIT/DNI Cliente',
+        'Email Cliente',
+        'Profesional',
+        'CUIT/DNI Profesional',
+        'Email Profesional',
+        'Monto (USDC)',
+        'Comisión Plataforma (USDC)',
+        'Comisión %',
+        'Wallet Origen',
+        'Wallet Destino',
+        'Descripción',
+    ]
+
+    def filas(self):
+        tipos = dict(EscrowTransaction.TRANSACTION_TYPE_CHOICES)
+        estados = dict(EscrowTransaction.STATUS_CHOICES)
+
+        transacciones = EscrowTransaction.objects.order_by('-created_at').values_list(
+            'id', 'created_at', 'transaction_type', 'status', 'job_id', 'job__title',
+            'job__creator__user__first_name', 'job__creator__user__last_name',
+            'job__creator__user__username', 'job__creator__user__email',
+            'bid__professional__user__first_name', 'bid__professional__user__last_name',
+            'bid__professional__user__username', 'bid__professional__user__email',
+            'amount_usdc',
+            'from_wallet_id', 'from_wallet__user__username', 'from_wallet__nombre_cuenta',
+            'to_wallet_id', 'to_wallet__user__username', 'to_wallet__nombre_cuenta',
+            'description',
+        )
+
+        for (tx_id, creada, tipo, estado, job_id, job_titulo,
+             cli_nombre, cli_apellido, cli_usuario, cli_email,
+             pro_nombre, pro_apellido, pro_usuario, pro_email,
+             monto, origen_id, origen_usuario, origen_cuenta,
+             destino_id, destino_usuario, destino_cuenta,
+             descripcion) in transacciones.iterator(chunk_size=CHUNK_SIZE):
+
+            # Comisión (solo para PLATFORM_FEE)
+            if tipo == 'PLATFORM_FEE':
+                comision_monto = monto
+                comision_porcentaje = '5%'
+            else:
+                comision_monto = Decimal('0.00')
+                comision_porcentaje = '0%'
+
+            yield [
+                tx_id,
+                creada.strftime('%Y-%m-%d %H:%M:%S'),
+                tipos.get(tipo, tipo),
+                estados.get(estado, estado),
+                job_id,
+                job_titulo,
+                _nombre(cli_nombre, cli_apellido, cli_usuario),
+                f"Usuario: {cli_usuario}",
+                cli_email,
+                _nombre(pro_nombre, pro_apellido, pro_usuario),
+                f"Usuario: {pro_usuario}",
+                pro_email,
+                f"{monto:.2f}",
+                f"{comision_monto:.2f}",
+                comision_porcentaje,
+                f"{_cuenta(origen_usuario, origen_cuenta)} (ID: {origen_id})" if origen_id else '',
+                f"{_cuenta(destino_usuario, destino_cuenta)} (ID: {destino_id})" if destino_id else '',
+                descripcion or '',
+            ]
+
+
+class ReporteComisiones(ReporteCSV):
+    """Comisiones de la plataforma (PLATFORM_FEE) con información fiscal."""
+
+    titulo = 'Reporte de Comisiones'
+    prefijo_archivo = 'reporte_comisiones'
+    encabezados = [
+        'Fecha de Facturación',
+        'ID Transacción',
+        'ID Trabajo',
+        'Título del Trabajo',
+        'Cliente - Razón Social',
+        'Cliente - CUIT/DNI',
+        'Cliente - Email',
+        'Profesional - Razón Social',
+        'Profesional - CUIT/DNI',
+        'Profesional - Email',
+        'Monto Base del Trabajo (USDC)',
+        'Comisión Plataforma (USDC)',
+        'Comisión %',
+        'Estado de Pago',
+        'Fecha de Pago',
+        'Observaciones',
+    ]
+
+    def filas(self):
+        comisiones = EscrowTransaction.objects.filter(
+            transaction_type='PLATFORM_FEE'
+        ).order_by('-created_at').values_list(
+            'id', 'created_at', 'status', 'released_at', 'amount_usdc', 'description', 'metadata',
+            'job_id', 'job__title',
+            'job__creator__user__first_name', 'job__creator__user__last_name',
+            'job__creator__user__username', 'job__creator__user__email',
+            'bid__professional__user__first_name', 'bid__professional__user__last_name',
+            'bid__professional__user__username', 'bid__professional__user__email',
+        )
+
+        for (tx_id, creada, estado, liberada, monto, descripcion, metadata, job_id, job_titulo,
+             cli_nombre, cli_apellido, cli_usuario, cli_email,
+             pro_nombre, pro_apellido, pro_usuario, pro_email) in comisiones.iterator(chunk_size=CHUNK_SIZE):
+
+            # Monto base del trabajo: el total congelado que guarda la comisión o,
+            # en las anteriores, la comisión sobre su 5% (x 20)
+            total = (metadata or {}).get('total_amount')
+            monto_base = Decimal(total) if total else monto * 20
+
+            yield [
+                creada.strftime('%Y-%m-%d'),
+                tx_id,
+                job_id,
+                job_titulo,
+                _nombre(cli_nombre, cli_apellido, cli_usuario),
+                f"Usuario: {cli_usuario}",
+                cli_email,
+                _nombre(pro_nombre, pro_apellido, pro_usuario),
+                f"Usuario: {pro_usuario}",
+                pro_email,
+                f"{monto_base:.2f}",
+                f"{monto:.2f}",
+                '5%',
+                'PAGADO' if estado == 'RELEASED' else 'PENDIENTE',
+                liberada.strftime('%Y-%m-%d %H:%M:%S') if liberada else '',
+                descripcion or '',
+            ]
+
+
+class ReporteMensual(ReporteCSV):
+    """Actividad del último mes: transacciones escrow, trabajos creados y usuarios registrados."""
+
+    titulo = 'Reporte Mensual'
+    prefijo_archivo = 'reporte_mensual'
+    formato_fecha_archivo = '%Y%m'
+    encabezados = [
+        'Fecha',
+        'Tipo de Actividad',
+        'Usuario',
+        'Detalles',
+        'Monto (USDC)',
+        'Estado',
+    ]
+
+    def filas(self):
+        hace_30_dias = timezone.now() - timedelta(days=30)
+
+        # Transacciones escrow
+        tipos = dict(EscrowTransaction.TRANSACTION_TYPE_CHOICES)
+        estados = dict(EscrowTransaction.STATUS_CHOICES)
+        transacciones = EscrowTransaction.objects.filter(
+            created_at__gte=hace_30_dias
+        ).order_by('-created_at').values_list(
+            'created_at', 'from_wallet__user__username', 'from_wallet__nombre_cuenta',
+            'transaction_type', 'job__title', 'amount_usdc', 'status',
+        )
+        for creada, usuario, cuenta, tipo, job_titulo, monto, estado in transacciones.iterator(chunk_size=CHUNK_SIZE):
+            yield [
+                creada.strftime('%Y-%m-%d %H:%M'),
+                'Transacción Escrow',
+                _cuenta(usuario, cuenta),
+                f"{tipos.get(tipo, tipo)} - {job_titulo or ''}",
+                f"{monto:.2f}",
+                estados.get(estado, estado),
+            ]
+
+        # Trabajos creados
+        estados_trabajo = dict(JobOffer.STATUS_CHOICES)
+        trabajos = JobOffer.objects.filter(
+            created_at__gte=hace_30_dias
+        ).order_by('-created_at').values_list(
+            'created_at', 'creator__user__username', 'title', 'budget_base_ars', 'status',
+        )
+        for creado, usuario, titulo, presupuesto, estado in trabajos.iterator(chunk_size=CHUNK_SIZE):
+            yield [
+                creado.strftime('%Y-%m-%d %H:%M'),
+                'Trabajo Creado',
+                usuario,
+                titulo,
+                f"{presupuesto:.2f}",
+                estados_trabajo.get(estado, estado),
+            ]
+
+        # Usuarios registrados
+        roles = dict(UserProfile.TIPO_ROL_CHOICES)
+        usuarios = UserProfile.objects.filter(
+            fecha_creacion__gte=hace_30_dias
+        ).order_by('-fecha_creacion').values_list(
+            'fecha_creacion', 'user__username', 'tipo_rol', 'user__is_active',
+        )
+        for creado, usuario, rol, activo in usuarios.iterator(chunk_size=CHUNK_SIZE):
+            yield [
+                creado.strftime('%Y-%m-%d %H:%M'),
+                'Usuario Registrado',
+                usuario,
+                roles.get(rol, rol or ''),
+                '0.00',
+                'Activo' if activo else 'Inactivo',
+            ]
+
+
+class ReporteTrabajosTerminados(ReporteCSV):
+    """Trabajos finalizados (usuarios.JobOffer) con sus montos de escrow, pago y comisión."""
+
+    titulo = 'Trabajos Terminados'
+    prefijo_archivo = 'trabajos_terminados'
+    formato_fecha_archivo = None
+    delimitador = ','
+    quoting = csv.QUOTE_MINIMAL
+    encabezados = [
+        'ID Trabajo',
+        'Título',
+        'Cliente',
+        'Email Cliente',
+        'Profesional Asignado',
+        'Email Profesional',
+        'Monto Total (USDC)',
+        'Fecha Creación',
+        'Fecha Límite',
+        'Fecha Finalización',
+        'Estado',
+        'Comisión Kunfido (USDC)',
+        'Pago a Profesional (USDC)',
+    ]
+
+    def filas(self):
+        """
+        Una sola consulta: el profesional de la propuesta votada, el monto de
+        cada tipo de transacción y la fecha de finalización se resuelven como
+        subconsultas correlacionadas, en lugar de 5 consultas por trabajo.
+        """
+        estados = dict(OfertaTrabajo.STATUS_CHOICES)
+
+        # Profesional asignado: el de la propuesta aceptada (votada por el cliente)
+        propuesta_votada = Proposal.objects.filter(
+            oferta=OuterRef('pk'),
+            voto_owner=True
+        ).order_by('-fecha_actualizacion')
+
+        # Monto de la última transacción completada de cada tipo
+        def monto(tipo):
+            return Subquery(
+                Transaction.objects.filter(
+                    oferta_relacionada=OuterRef('pk'),
+                    tipo_transaccion=tipo,
+                    status='COMPLETED'
+                ).order_by('-fecha_creacion').values('monto_usdc')[:1]
+            )
+
+        trabajos = OfertaTrabajo.objects.filter(
+            status='FINALIZADA'
+        ).annotate(
+            pro_nombre=Subquery(propuesta_votada.values('profesional__first_name')[:1]),
+            pro_apellido=Subquery(propuesta_votada.values('profesional__last_name')[:1]),
+            pro_usuario=Subquery(propuesta_votada.values('profesional__username')[:1]),
+            pro_email=Subquery(propuesta_votada.values('profesional__email')[:1]),
+            monto_escrow=monto('ESCROW_DEPOSIT'),
+            monto_pago=monto('RELEASE_PAYMENT'),
+            monto_comision=monto('FEE'),
+            fecha_completado=Subquery(
+                WorkEvent.objects.filter(
+                    oferta=OuterRef('pk'),
+                    tipo_evento='TRABAJO_COMPLETADO'
+                ).order_by('-fecha_evento').values('fecha_evento')[:1]
+            ),
+        ).order_by('-fecha_creacion').values_list(
+            'id', 'titulo', 'status', 'fecha_creacion', 'fecha_actualizacion', 'fecha_entrega_pactada',
+            'creador__first_name', 'creador__last_name', 'creador__username', 'creador__email',
+            'pro_nombre', 'pro_apellido', 'pro_usuario', 'pro_email',
+            'monto_escrow', 'monto_pago', 'monto_comision', 'fecha_completado',
+        )
+
+        for (trabajo_id, titulo, estado, creado, actualizado, entrega_pactada,
+             cli_nombre, cli_apellido, cli_usuario, cli_email,
+             pro_nombre, pro_apellido, pro_usuario, pro_email,
+             monto_escrow, monto_pago, monto_comision,
+             fecha_completado) in trabajos.iterator(chunk_size=CHUNK_SIZE):
+
+            fecha_finalizacion = fecha_completado or actualizado
+
+            yield [
+                trabajo_id,
+                titulo,
+                _nombre(cli_nombre, cli_apellido, cli_usuario),
+                cli_email,
+                _nombre(pro_nombre, pro_apellido, pro_usuario) if pro_usuario else 'N/A',
+                pro_email if pro_usuario else 'N/A',
+                f"{monto_escrow or Decimal('0.00'):.2f}",
+                creado.strftime('%Y-%m-%d %H:%M'),
+                entrega_pactada.strftime('%Y-%m-%d') if entrega_pactada else 'N/A',
+                fecha_finalizacion.strftime('%Y-%m-%d %H:%M'),
+                estados.get(estado, estado),
+                f"{monto_comision or Decimal('0.00'):.2f}",
+                f"{monto_pago or Decimal('0.00'):.2f}",
+            ]
+
+# Reportes disponibles para exportar en segundo plano (analytics.ExportJob.reporte)
+REPORTES = {
+    'transacciones': ReporteTransacciones,
+    'comisiones': ReporteComisiones,
+    'mensual': ReporteMensual,
+    'trabajos_terminados': ReporteTrabajosTerminados,
+}
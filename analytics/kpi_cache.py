@@ -0,0 +1,95 @@
+"""
+Caché de KPIs de los dashboards por métrica y franja de tiempo.
+
+Cada grupo de métricas ('trabajos', 'escrow', 'usuarios') tiene una versión
+en la caché. La clave de un valor incluye la versión y la franja actual
+(ANALYTICS_KPI_CACHE_SECONDS):
+
+    kpi:trabajos:v1718000000000:5726666:kpis_trabajos
+
+Las señales de analytics/signals.py suben la versión del grupo cuando se
+escribe algo que lo afecta, así sólo se recalculan las métricas viejas.
+La franja acota lo que ninguna señal ve (UPDATEs masivos, ventanas de
+fechas que avanzan): a lo sumo un período de datos viejos.
+
+La versión vive en la caché, así que sólo sirve si todos los workers la
+comparten: la caché se activa con ANALYTICS_KPI_CACHE, que por defecto
+requiere CACHE_COMPARTIDA.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+
+METRICAS = ('trabajos', 'escrow', 'usuarios')
+
+
+def _version_key(metrica):
+    return f"kpi:{metrica}:version"
+
+
+def _nueva_version():
+    # Basada en el reloj: si la clave de versión se pierde (desalojo,
+    # reinicio) no se reutiliza una versión con valores viejos en caché
+    return int(time.time() * 1000)
+
+
+def activa():
+    """Indica si los KPIs se cachean (y si hace falta invalidarlos)."""
+    return settings.ANALYTICS_KPI_CACHE and settings.ANALYTICS_KPI_CACHE_SECONDS > 0
+
+
+def version(metrica):
+    """Versión vigente de un grupo de métricas."""
+    actual = cache.get(_version_key(metrica))
+    if actual is None:
+        actual = _nueva_version()
+        if not cache.add(_version_key(metrica), actual, None):
+            actual = cache.get(_version_key(metrica), actual)
+    return actual
+
+
+def obtener(metrica, calcular, **kwargs):
+    """
+    Devuelve `calcular(**kwargs)` desde la caché o lo calcula y lo guarda.
+
+    Args:
+        metrica: grupo de la métrica (ver METRICAS), define qué escrituras la invalidan
+        calcular: función a cachear; su nombre y los kwargs forman parte de la clave
+    """
+    if not activa():
+        return calcular(**kwargs)
+    franja = settings.ANALYTICS_KPI_CACHE_SECONDS
+
+    nombre = calcular.__name__
+    if kwargs:
+        nombre += ':' + ','.join(f"{campo}={valor}" for campo, valor in sorted(kwargs.items()))
+
+    clave = f"kpi:{metrica}:v{version(metrica)}:{int(time.time() // franja)}:{nombre}"
+    valor = cache.get(clave)
+    if valor is None:
+        valor = calcular(**kwargs)
+        cache.set(clave, valor, franja)
+    return valor
+
+
+def invalidar(*metricas):
+    """
+    Sube la versión de los grupos indicados (todos si no se indica ninguno)
+    cuando se confirma la transacción en curso: así nadie cachea con la
+    versión nueva datos que todavía no están confirmados.
+    """
+    if not activa():
+        return
+    metricas = metricas or METRICAS
+
+    def subir_versiones():
+        for metrica in metricas:
+            try:
+                cache.incr(_version_key(metrica))
+            except ValueError:
+                cache.set(_version_key(metrica), _nueva_version(), None)
+
+    db_transaction.on_commit(subir_versiones)
@@ -0,0 +1,194 @@
+"""
+Cálculo de los KPIs de los dashboards de analytics.
+
+Cada función resuelve todos los indicadores de una tabla en una sola
+consulta con agregación condicional (`Count/Sum(..., filter=Q(...))`), en
+lugar de un count() o aggregate() por indicador. El gráfico de crecimiento
+agrupa por semana con TruncWeek en una única consulta.
+
+Con ANALYTICS_KPI_ROLLUPS activo los datos salen de los KPIs pre-agregados
+(analytics/rollups.py) en lugar de las tablas; `en_vivo=True` fuerza el
+cálculo sobre las tablas.
+"""
+
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncWeek
+from django.utils import timezone
+
+from jobs.models import Bid, EscrowTransaction, JobOffer
+from usuarios.currency_service import CurrencyService
+from usuarios.models import UserProfile
+
+from . import rollups
+
+CERO = Decimal('0.00')
+
+
+def _usar_rollups(en_vivo):
+    return settings.ANALYTICS_KPI_ROLLUPS and not en_vivo
+
+
+def _conteos_por_opcion(datos, prefijo, choices, campo):
+    """
+    Convierte los conteos `{prefijo}_{valor}` en la lista [{campo: valor, 'total': n}]
+    que usan las tablas del dashboard (sólo las opciones con registros).
+    """
+    return [
+        {campo: valor, 'total': datos[f'{prefijo}_{valor}']}
+        for valor, _ in choices
+        if datos[f'{prefijo}_{valor}']
+    ]
+
+
+def kpis_trabajos(en_vivo=False):
+    """
+    Indicadores de jobs.JobOffer en una consulta.
+
+    Returns:
+        dict: gmv_ars, finalizados_ars, en_progreso, atrasados,
+              por_estado (dict status -> cantidad) y stats por estado
+    """
+    if _usar_rollups(en_vivo):
+        datos = rollups.datos_trabajos()
+    else:
+        estados = {
+            f'estado_{status}': Count('id', filter=Q(status=status))
+            for status, _ in JobOffer.STATUS_CHOICES
+        }
+        datos = JobOffer.objects.aggregate(
+            gmv_ars=Sum('budget_base_ars', filter=Q(status__in=['IN_PROGRESS', 'CLOSED'])),
+            finalizados_ars=Sum('budget_base_ars', filter=Q(status='CLOSED')),
+            atrasados=Count('id', filter=Q(status='IN_PROGRESS', is_delayed=True)),
+            **estados
+        )
+
+    return {
+        'gmv_ars': datos['gmv_ars'] or CERO,
+        'finalizados_ars': datos['finalizados_ars'] or CERO,
+        'en_progreso': datos['estado_IN_PROGRESS'],
+        'atrasados': datos['atrasados'],
+        'por_estado': {status: datos[f'estado_{status}'] for status, _ in JobOffer.STATUS_CHOICES},
+        'stats': _conteos_por_opcion(datos, 'estado', JobOffer.STATUS_CHOICES, 'status'),
+    }
+
+
+def gmv_usdc(en_vivo=False):
+    """
+    GMV en USDC: pujas ganadoras de trabajos en progreso o cerrados,
+    convertidas con la tasa congelada en el escrow (o la vigente al crearlas).
+    """
+    if _usar_rollups(en_vivo):
+        return rollups.gmv_usdc()
+
+    total = Bid.objects.filter(
+        is_winner=True,
+        job_offer__status__in=['IN_PROGRESS', 'CLOSED']
+    ).annotate(
+        tasa=Coalesce('tasa_usdc_ars', CurrencyService.rate_at_expression('created_at'))
+    ).aggregate(
+        total_usdc=Sum(
+            F('amount_ars') / F('tasa'),
+            output_field=DecimalField(max_digits=14, decimal_places=2)
+        )
+    )['total_usdc']
+
+    return (total or CERO).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def kpis_escrow(en_vivo=False):
+    """
+    Indicadores de jobs.EscrowTransaction en una consulta.
+
+    Returns:
+        dict: comisiones_usdc (PLATFORM_FEE liberadas), fondos_en_escrow
+              (LOCKED) y stats por tipo de transacción
+    """
+    if _usar_rollups(en_vivo):
+        datos = rollups.datos_escrow()
+    else:
+        por_tipo = {}
+        for tipo, _ in EscrowTransaction.TRANSACTION_TYPE_CHOICES:
+            por_tipo[f'total_{tipo}'] = Count('id', filter=Q(transaction_type=tipo))
+            por_tipo[f'monto_{tipo}'] = Sum('amount_usdc', filter=Q(transaction_type=tipo))
+
+        datos = EscrowTransaction.objects.aggregate(
+            comisiones_usdc=Sum('amount_usdc', filter=Q(transaction_type='PLATFORM_FEE', status='RELEASED')),
+            fondos_en_escrow=Sum('amount_usdc', filter=Q(status='LOCKED')),
+            **por_tipo
+        )
+
+    return {
+        'comisiones_usdc': datos['comisiones_usdc'] or CERO,
+        'fondos_en_escrow': datos['fondos_en_escrow'] or CERO,
+        'stats': [
+            {
+                'transaction_type': tipo,
+                'total': datos[f'total_{tipo}'],
+                'monto_total': datos[f'monto_{tipo}'] or CERO,
+            }
+            for tipo, _ in EscrowTransaction.TRANSACTION_TYPE_CHOICES
+            if datos[f'total_{tipo}']
+        ],
+    }
+
+
+def kpis_usuarios(nuevos_desde=None, en_vivo=False):
+    """
+    Indicadores de UserProfile en una consulta.
+
+    Args:
+        nuevos_desde: fecha desde la que se cuentan los usuarios nuevos
+                      (por defecto, últimos 30 días)
+
+    Returns:
+        dict: nuevos, por_rol (dict tipo_rol -> cantidad) y stats por rol
+    """
+    nuevos_desde = nuevos_desde or timezone.now() - timedelta(days=30)
+    if _usar_rollups(en_vivo):
+        datos = rollups.datos_usuarios(nuevos_desde)
+    else:
+        roles = {
+            f'rol_{rol}': Count('id', filter=Q(tipo_rol=rol))
+            for rol, _ in UserProfile.TIPO_ROL_CHOICES
+        }
+        datos = UserProfile.objects.aggregate(
+            nuevos=Count('id', filter=Q(fecha_creacion__gte=nuevos_desde)),
+            **roles
+        )
+
+    return {
+        'nuevos': datos['nuevos'],
+        'por_rol': {rol: datos[f'rol_{rol}'] for rol, _ in UserProfile.TIPO_ROL_CHOICES},
+        'stats': _conteos_por_opcion(datos, 'rol', UserProfile.TIPO_ROL_CHOICES, 'tipo_rol'),
+    }
+
+
+def crecimiento_semanal(semanas=12, en_vivo=False):
+    """
+    Trabajos creados por semana (lunes a domingo) en las últimas `semanas`,
+    incluida la actual, con una sola consulta agrupada por TruncWeek.
+
+    Returns:
+        tuple: (labels, valores) en orden cronológico, con 0 en las semanas sin trabajos
+    """
+    ahora = timezone.localtime()
+    lunes = (ahora - timedelta(days=ahora.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+    inicios = [lunes - timedelta(weeks=i) for i in range(semanas - 1, -1, -1)]
+
+    if _usar_rollups(en_vivo):
+        totales = rollups.trabajos_por_semana(inicios[0])
+    else:
+        por_semana = JobOffer.objects.filter(
+            created_at__gte=inicios[0]
+        ).annotate(
+            semana=TruncWeek('created_at')
+        ).order_by().values('semana').annotate(total=Count('id'))
+        totales = {fila['semana'].date(): fila['total'] for fila in por_semana}
+
+    labels = [f"Semana {numero}" for numero in range(1, semanas + 1)]
+    valores = [totales.get(inicio.date(), 0) for inicio in inicios]
+    return labels, valores
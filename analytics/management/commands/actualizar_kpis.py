@@ -0,0 +1,23 @@
+"""
+Actualiza los KPIs pre-agregados de los dashboards de analytics.
+
+Uso:
+    python manage.py actualizar_kpis    # Pensado para cron (p. ej. cada 5 minutos)
+
+Acumula sólo los trabajos, usuarios y movimientos de escrow posteriores a
+la marca de agua de la corrida anterior y guarda la foto del día de los
+indicadores de estado. Los dashboards leen de estas tablas cuando
+ANALYTICS_KPI_ROLLUPS está activo.
+"""
+
+from django.core.management.base import BaseCommand
+
+from analytics.rollups import actualizar
+
+
+class Command(BaseCommand):
+    help = 'Actualiza los KPIs pre-agregados de analytics desde la última marca de agua.'
+
+    def handle(self, *args, **options):
+        procesados = actualizar()
+        self.stdout.write(self.style.SUCCESS(f'✓ KPIs actualizados ({procesados} registros nuevos acumulados)'))
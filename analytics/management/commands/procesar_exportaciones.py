@@ -0,0 +1,39 @@
+"""
+Retoma exportaciones CSV pendientes y borra las vencidas.
+
+Uso:
+    python manage.py procesar_exportaciones                    # Pensado para cron (p. ej. cada 15 minutos)
+    python manage.py procesar_exportaciones --colgadas 30      # Reintentar las EN_PROCESO sin actividad hace más de 30 minutos
+
+Las exportaciones se generan en el pool de threads del proceso web
+(analytics/export_jobs.py). Si ese proceso se reinicia, las que quedaron
+pendientes o a medio generar (sin latido reciente en fecha_actualizacion) se
+completan acá. Las terminadas hace más de EXPORT_RETENTION_DAYS días se borran
+junto con su archivo.
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from analytics import export_jobs
+
+
+class Command(BaseCommand):
+    help = 'Retoma exportaciones CSV pendientes y borra las vencidas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--colgadas',
+            type=int,
+            default=60,
+            help='Minutos sin actividad tras los cuales una exportación EN_PROCESO se considera abandonada (default: 60)'
+        )
+
+    def handle(self, *args, **options):
+        pendientes = export_jobs.reanudar_colgadas(options['colgadas'])
+        procesadas = sum(1 for job_id in pendientes if export_jobs.ejecutar(job_id))
+        borradas = export_jobs.purgar_vencidas(settings.EXPORT_RETENTION_DAYS)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {procesadas} exportaciones generadas, {borradas} vencidas borradas'
+        ))
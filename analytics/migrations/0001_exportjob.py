@@ -0,0 +1,39 @@
+# Generated by Django 4.2.11 on 2026-10-18 00:59
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reporte', models.CharField(help_text='Clave del reporte en analytics.exports.REPORTES', max_length=30, verbose_name='Reporte')),
+                ('status', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('EN_PROCESO', 'En Proceso'), ('COMPLETADO', 'Completado'), ('ERROR', 'Error')], default='PENDIENTE', max_length=20, verbose_name='Estado')),
+                ('filas_procesadas', models.PositiveIntegerField(default=0, verbose_name='Filas Procesadas')),
+                ('archivo', models.FileField(blank=True, upload_to='exports/', verbose_name='Archivo')),
+                ('nombre_descarga', models.CharField(blank=True, max_length=100, verbose_name='Nombre de Descarga')),
+                ('error', models.TextField(blank=True, verbose_name='Error')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')),
+                ('fecha_inicio', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de Inicio')),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de Finalización')),
+                ('solicitado_por', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exportaciones', to=settings.AUTH_USER_MODEL, verbose_name='Solicitado Por')),
+            ],
+            options={
+                'verbose_name': 'Exportación',
+                'verbose_name_plural': 'Exportaciones',
+                'ordering': ['-fecha_creacion'],
+                'indexes': [models.Index(fields=['solicitado_por', '-fecha_creacion'], name='analytics_e_solicit_252550_idx'), models.Index(fields=['status', 'fecha_creacion'], name='analytics_e_status_0dae89_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.11 on 2026-10-18 01:04
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_exportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarcaKpi',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fuente', models.CharField(max_length=30, unique=True, verbose_name='Fuente')),
+                ('ultimo_id', models.PositiveBigIntegerField(default=0, verbose_name='Último ID Procesado')),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True, verbose_name='Fecha de Actualización')),
+            ],
+            options={
+                'verbose_name': 'Marca de KPI',
+                'verbose_name_plural': 'Marcas de KPIs',
+            },
+        ),
+        migrations.CreateModel(
+            name='KpiDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metrica', models.CharField(choices=[('TRABAJOS_CREADOS', 'Trabajos Creados'), ('USUARIOS_REGISTRADOS', 'Usuarios Registrados'), ('ESCROW', 'Movimientos de Escrow'), ('TRABAJOS_ESTADO', 'Trabajos por Estado'), ('TRABAJOS_ATRASADOS', 'Trabajos Atrasados'), ('USUARIOS_ROL', 'Usuarios por Rol'), ('GMV_USDC', 'GMV en USDC')], max_length=30, verbose_name='Métrica')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('dimension', models.CharField(blank=True, help_text='Estado, tipo de transacción o rol según la métrica', max_length=30, verbose_name='Dimensión')),
+                ('cantidad', models.PositiveIntegerField(default=0, verbose_name='Cantidad')),
+                ('monto', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=18, verbose_name='Monto')),
+            ],
+            options={
+                'verbose_name': 'KPI Diario',
+                'verbose_name_plural': 'KPIs Diarios',
+                'ordering': ['metrica', '-fecha', 'dimension'],
+                'unique_together': {('metrica', 'fecha', 'dimension')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.11 on 2026-10-18 01:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_kpis_diarios'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(blank=True, help_text='Latido del worker: se actualiza al tomarla y con cada bloque escrito', null=True, verbose_name='Última Actividad'),
+        ),
+    ]
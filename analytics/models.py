@@ -1,3 +1,230 @@
+from decimal import Decimal
+
+from django.conf import settings
 from django.db import models
+from django.db.models import F
+
+
+class ExportJob(models.Model):
+    """
+    Exportación de un reporte CSV generada en segundo plano.
+
+    El superusuario la solicita desde el dashboard, un worker
+    (analytics/export_jobs.py) escribe el archivo en MEDIA_ROOT/exports
+    actualizando `filas_procesadas` y `fecha_actualizacion` (el latido que
+    distingue una exportación lenta de una abandonada) y el dashboard
+    consulta el estado hasta que el archivo está listo para descargar.
+    """
+
+    STATUS_CHOICES = [
+        ('PENDIENTE', 'Pendiente'),
+        ('EN_PROCESO', 'En Proceso'),
+        ('COMPLETADO', 'Completado'),
+        ('ERROR', 'Error'),
+    ]
+
+    reporte = models.CharField(
+        max_length=30,
+        verbose_name='Reporte',
+        help_text='Clave del reporte en analytics.exports.REPORTES'
+    )
+
+    solicitado_por = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='exportaciones',
+        verbose_name='Solicitado Por'
+    )
+
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='PENDIENTE',
+        verbose_name='Estado'
+    )
+
+    filas_procesadas = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Filas Procesadas'
+    )
+
+    fecha_actualizacion = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Última Actividad',
+        help_text='Latido del worker: se actualiza al tomarla y con cada bloque escrito'
+    )
+
+    archivo = models.FileField(
+        upload_to='exports/',
+        blank=True,
+        verbose_name='Archivo'
+    )
+
+    nombre_descarga = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name='Nombre de Descarga'
+    )
+
+    error = models.TextField(
+        blank=True,
+        verbose_name='Error'
+    )
+
+    fecha_creacion = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Fecha de Creación'
+    )
+
+    fecha_inicio = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Fecha de Inicio'
+    )
+
+    fecha_fin = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Fecha de Finalización'
+    )
+
+    class Meta:
+        verbose_name = 'Exportación'
+        verbose_name_plural = 'Exportaciones'
+        ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['solicitado_por', '-fecha_creacion']),
+            models.Index(fields=['status', 'fecha_creacion']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_reporte_display()} - {self.get_status_display()}"
+
+    def get_reporte_display(self):
+        from .exports import REPORTES
+        reporte = REPORTES.get(self.reporte)
+        return reporte.titulo if reporte else self.reporte
+
+    @property
+    def terminada(self):
+        return self.status in ('COMPLETADO', 'ERROR')
+
+    def borrar_archivo(self):
+        """Elimina el archivo generado (si existe) sin borrar el registro."""
+        if self.archivo:
+            self.archivo.delete(save=False)
+
+
+class KpiDiario(models.Model):
+    """
+    Hecho diario pre-agregado para los dashboards (analytics/rollups.py).
+
+    Hay dos clases de métricas:
+    - Flujos (trabajos creados, usuarios registrados, movimientos de escrow):
+      se acumulan de forma incremental desde la marca de agua de MarcaKpi,
+      una fila por día y dimensión.
+    - Fotos (trabajos por estado, atrasados, usuarios por rol, GMV): estado
+      de las tablas en el momento de la actualización, una por día (la
+      última corrida del día pisa la anterior).
+    """
+
+    METRICA_CHOICES = [
+        ('TRABAJOS_CREADOS', 'Trabajos Creados'),
+        ('USUARIOS_REGISTRADOS', 'Usuarios Registrados'),
+        ('ESCROW', 'Movimientos de Escrow'),
+        ('TRABAJOS_ESTADO', 'Trabajos por Estado'),
+        ('TRABAJOS_ATRASADOS', 'Trabajos Atrasados'),
+        ('USUARIOS_ROL', 'Usuarios por Rol'),
+        ('GMV_USDC', 'GMV en USDC'),
+    ]
+
+    metrica = models.CharField(
+        max_length=30,
+        choices=METRICA_CHOICES,
+        verbose_name='Métrica'
+    )
+
+    fecha = models.DateField(
+        verbose_name='Fecha'
+    )
+
+    dimension = models.CharField(
+        max_length=30,
+        blank=True,
+        verbose_name='Dimensión',
+        help_text='Estado, tipo de transacción o rol según la métrica'
+    )
+
+    cantidad = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Cantidad'
+    )
+
+    monto = models.DecimalField(
+        max_digits=18,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name='Monto'
+    )
+
+    class Meta:
+        verbose_name = 'KPI Diario'
+        verbose_name_plural = 'KPIs Diarios'
+        ordering = ['metrica', '-fecha', 'dimension']
+        unique_together = ['metrica', 'fecha', 'dimension']
+
+    def __str__(self):
+        dimension = f" [{self.dimension}]" if self.dimension else ''
+        return f"{self.get_metrica_display()}{dimension} {self.fecha}: {self.cantidad} / {self.monto}"
+
+    @classmethod
+    def acumular(cls, metrica, fecha, dimension, cantidad, monto):
+        """Suma `cantidad` y `monto` a la fila del día (la crea si no existe)."""
+        actualizadas = cls.objects.filter(
+            metrica=metrica,
+            fecha=fecha,
+            dimension=dimension
+        ).update(
+            cantidad=F('cantidad') + cantidad,
+            monto=F('monto') + monto
+        )
+        if not actualizadas:
+            cls.objects.create(
+                metrica=metrica,
+                fecha=fecha,
+                dimension=dimension,
+                cantidad=cantidad,
+                monto=monto
+            )
+
+
+class MarcaKpi(models.Model):
+    """
+    Marca de agua de los flujos de KpiDiario: último ID de la tabla de
+    origen ya acumulado. La próxima actualización procesa sólo los
+    registros posteriores.
+    """
+
+    fuente = models.CharField(
+        max_length=30,
+        unique=True,
+        verbose_name='Fuente'
+    )
+
+    ultimo_id = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name='Último ID Procesado'
+    )
+
+    fecha_actualizacion = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Fecha de Actualización'
+    )
+
+    class Meta:
+        verbose_name = 'Marca de KPI'
+        verbose_name_plural = 'Marcas de KPIs'
 
-# Create your models here.
+    def __str__(self):
+        return f"{self.fuente}: {self.ultimo_id}"
@@ -0,0 +1,229 @@
+"""
+KPIs pre-agregados (KpiDiario) para que los dashboards no recorran las
+tablas de trabajos, pujas y escrow en cada carga.
+
+`actualizar()` (comando `actualizar_kpis`, pensado para cron):
+1. Acumula los flujos nuevos desde la marca de agua de cada fuente
+   (MarcaKpi): trabajos creados, usuarios registrados y movimientos de
+   escrow por tipo, agrupados por día.
+2. Guarda la foto del día de las métricas de estado: trabajos por estado,
+   atrasados, usuarios por rol y GMV en USDC.
+
+Con ANALYTICS_KPI_ROLLUPS activo, analytics/kpis.py lee de acá en lugar de
+consultar las tablas. Los fondos en escrow salen sólo de flujos: cada
+depósito bloqueado se cierra con una liberación, comisión o reembolso por
+el mismo monto total, así que lo bloqueado es depósitos menos salidas.
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction as db_transaction
+from django.db.models import Count, Max, Subquery, Sum, Value
+from django.db.models.functions import TruncDate, TruncWeek
+from django.utils import timezone
+
+from jobs.models import EscrowTransaction, JobOffer
+from usuarios.models import UserProfile
+
+from . import kpi_cache
+from .models import KpiDiario, MarcaKpi
+
+CERO = Decimal('0.00')
+
+# Los registros más nuevos que esto se dejan para la próxima corrida: un ID
+# menor todavía sin confirmar no queda salteado por la marca de agua
+MARGEN_SEGUNDOS = 60
+
+DEPOSITOS_ESCROW = ('INITIAL_DEPOSIT', 'REMAINING_DEPOSIT')
+
+METRICAS_FOTO = ('TRABAJOS_ESTADO', 'TRABAJOS_ATRASADOS', 'USUARIOS_ROL', 'GMV_USDC')
+
+
+def actualizar():
+    """
+    Acumula los flujos pendientes y guarda la foto del día.
+
+    Returns:
+        int: registros de origen acumulados en esta corrida
+    """
+    limite = timezone.now() - timedelta(seconds=MARGEN_SEGUNDOS)
+
+    with db_transaction.atomic():
+        for fuente in ('ESCROW', 'TRABAJOS_CREADOS', 'USUARIOS_REGISTRADOS'):
+            MarcaKpi.objects.get_or_create(fuente=fuente)
+        # Bloquea las marcas: dos corridas simultáneas no acumulan dos veces
+        marcas = {marca.fuente: marca for marca in MarcaKpi.objects.select_for_update()}
+
+        procesados = _acumular(
+            marcas['ESCROW'], EscrowTransaction.objects.all(), 'created_at', limite,
+            dimension='transaction_type', monto='amount_usdc'
+        )
+        procesados += _acumular(
+            marcas['TRABAJOS_CREADOS'], JobOffer.objects.all(), 'created_at', limite,
+            monto='budget_base_ars'
+        )
+        procesados += _acumular(
+            marcas['USUARIOS_REGISTRADOS'], UserProfile.objects.all(), 'fecha_creacion', limite
+        )
+
+        _guardar_foto(timezone.localdate())
+        kpi_cache.invalidar()
+
+    return procesados
+
+
+def _acumular(marca, queryset, campo_fecha, limite, dimension=None, monto=None):
+    """Suma a KpiDiario los registros de `queryset` posteriores a la marca."""
+    hasta = queryset.filter(**{f'{campo_fecha}__lt': limite}).aggregate(ultimo=Max('id'))['ultimo']
+    if hasta is None or hasta <= marca.ultimo_id:
+        return 0
+
+    campos = ['dia', dimension] if dimension else ['dia']
+    nuevos = queryset.filter(
+        id__gt=marca.ultimo_id,
+        id__lte=hasta
+    ).annotate(
+        dia=TruncDate(campo_fecha)
+    ).order_by().values(*campos).annotate(
+        cantidad=Count('id'),
+        total=Sum(monto) if monto else Value(CERO)
+    )
+
+    procesados = 0
+    for fila in nuevos:
+        KpiDiario.acumular(
+            marca.fuente,
+            fila['dia'],
+            fila[dimension] if dimension else '',
+            fila['cantidad'],
+            fila['total'] or CERO
+        )
+        procesados += fila['cantidad']
+
+    marca.ultimo_id = hasta
+    marca.save(update_fields=['ultimo_id', 'fecha_actualizacion'])
+    return procesados
+
+
+def _guardar_foto(fecha):
+    """Reemplaza la foto de `fecha` con el estado actual de las tablas."""
+    from . import kpis
+
+    filas = [
+        KpiDiario(
+            metrica='TRABAJOS_ESTADO',
+            fecha=fecha,
+            dimension=fila['status'],
+            cantidad=fila['cantidad'],
+            monto=fila['total'] or CERO
+        )
+        for fila in JobOffer.objects.order_by().values('status').annotate(
+            cantidad=Count('id'),
+            total=Sum('budget_base_ars')
+        )
+    ]
+    filas.append(KpiDiario(
+        metrica='TRABAJOS_ATRASADOS',
+        fecha=fecha,
+        cantidad=JobOffer.objects.filter(status='IN_PROGRESS', is_delayed=True).count()
+    ))
+    filas.extend(
+        KpiDiario(
+            metrica='USUARIOS_ROL',
+            fecha=fecha,
+            dimension=fila['tipo_rol'] or '',
+            cantidad=fila['cantidad']
+        )
+        for fila in UserProfile.objects.order_by().values('tipo_rol').annotate(cantidad=Count('id'))
+    )
+    filas.append(KpiDiario(
+        metrica='GMV_USDC',
+        fecha=fecha,
+        monto=kpis.gmv_usdc(en_vivo=True)
+    ))
+
+    KpiDiario.objects.filter(metrica__in=METRICAS_FOTO, fecha=fecha).delete()
+    KpiDiario.objects.bulk_create(filas)
+
+
+def _ultima_foto(*metricas):
+    """Filas de la foto más reciente de las métricas indicadas (una consulta)."""
+    ultima_fecha = KpiDiario.objects.filter(
+        metrica__in=METRICAS_FOTO
+    ).order_by('-fecha').values('fecha')[:1]
+    return KpiDiario.objects.filter(
+        metrica__in=metricas,
+        fecha=Subquery(ultima_fecha)
+    ).values_list('metrica', 'dimension', 'cantidad', 'monto')
+
+
+# Lectores: devuelven los mismos datos que los aggregate de analytics/kpis.py
+
+def datos_trabajos():
+    datos = {f'estado_{status}': 0 for status, _ in JobOffer.STATUS_CHOICES}
+    datos.update(gmv_ars=CERO, finalizados_ars=CERO, atrasados=0)
+
+    for metrica, dimension, cantidad, monto in _ultima_foto('TRABAJOS_ESTADO', 'TRABAJOS_ATRASADOS'):
+        if metrica == 'TRABAJOS_ATRASADOS':
+            datos['atrasados'] = cantidad
+            continue
+        datos[f'estado_{dimension}'] = cantidad
+        if dimension in ('IN_PROGRESS', 'CLOSED'):
+            datos['gmv_ars'] += monto
+        if dimension == 'CLOSED':
+            datos['finalizados_ars'] = monto
+    return datos
+
+
+def gmv_usdc():
+    return next((monto for _, _, _, monto in _ultima_foto('GMV_USDC')), CERO)
+
+
+def datos_escrow():
+    datos = {}
+    for tipo, _ in EscrowTransaction.TRANSACTION_TYPE_CHOICES:
+        datos[f'total_{tipo}'] = 0
+        datos[f'monto_{tipo}'] = CERO
+
+    por_tipo = KpiDiario.objects.filter(metrica='ESCROW').order_by().values('dimension').annotate(
+        cantidad=Sum('cantidad'),
+        total=Sum('monto')
+    )
+    for fila in por_tipo:
+        datos[f'total_{fila["dimension"]}'] = fila['cantidad']
+        datos[f'monto_{fila["dimension"]}'] = fila['total']
+
+    depositos = sum(datos[f'monto_{tipo}'] for tipo in DEPOSITOS_ESCROW)
+    salidas = sum(
+        datos[f'monto_{tipo}']
+        for tipo, _ in EscrowTransaction.TRANSACTION_TYPE_CHOICES
+        if tipo not in DEPOSITOS_ESCROW
+    )
+    datos['comisiones_usdc'] = datos['monto_PLATFORM_FEE']
+    datos['fondos_en_escrow'] = depositos - salidas
+    return datos
+
+
+def datos_usuarios(nuevos_desde):
+    datos = {f'rol_{rol}': 0 for rol, _ in UserProfile.TIPO_ROL_CHOICES}
+    for _, dimension, cantidad, _ in _ultima_foto('USUARIOS_ROL'):
+        datos[f'rol_{dimension}'] = cantidad
+
+    # Granularidad diaria: cuenta los registrados desde el inicio de ese día
+    datos['nuevos'] = KpiDiario.objects.filter(
+        metrica='USUARIOS_REGISTRADOS',
+        fecha__gte=timezone.localdate(nuevos_desde)
+    ).aggregate(total=Sum('cantidad'))['total'] or 0
+    return datos
+
+
+def trabajos_por_semana(desde):
+    """dict {inicio de semana (date): trabajos creados} desde `desde`."""
+    por_semana = KpiDiario.objects.filter(
+        metrica='TRABAJOS_CREADOS',
+        fecha__gte=timezone.localdate(desde)
+    ).annotate(
+        semana=TruncWeek('fecha')
+    ).order_by().values('semana').annotate(total=Sum('cantidad'))
+    return {fila['semana']: fila['total'] for fila in por_semana}
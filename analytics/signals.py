@@ -0,0 +1,90 @@
+"""
+Invalidación de la caché de KPIs (analytics/kpi_cache.py).
+
+Sólo se invalida cuando cambia algo que entra en un KPI: un usuario que
+inicia sesión guarda User y UserProfile, pero no cambia rol, puntuación
+ni estado, así que no invalida nada. Con la caché de KPIs desactivada
+(kpi_cache.activa()) las señales no consultan nada.
+"""
+
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from jobs.models import Bid, EscrowTransaction, JobOffer
+from usuarios.models import UserProfile
+
+from . import kpi_cache
+
+# Campos de cada modelo que entran en algún KPI
+CAMPOS_KPI = {
+    JobOffer: ('status', 'is_delayed', 'budget_base_ars'),
+    Bid: ('is_winner', 'amount_ars'),
+    UserProfile: ('tipo_rol', 'puntuacion'),
+    User: ('is_active',),
+}
+
+METRICA_POR_MODELO = {
+    JobOffer: 'trabajos',
+    Bid: 'trabajos',
+    UserProfile: 'usuarios',
+    User: 'usuarios',
+}
+
+
+@receiver(pre_save, sender=JobOffer)
+@receiver(pre_save, sender=Bid)
+@receiver(pre_save, sender=UserProfile)
+@receiver(pre_save, sender=User)
+def comparar_valores_kpi(sender, instance, raw, update_fields, **kwargs):
+    """
+    Compara contra la base los campos de KPI que se van a guardar.
+
+    Una sola consulta por guardado, y ninguna si update_fields no incluye
+    campos de KPI (el login guarda User con update_fields=['last_login']).
+    """
+    instance._kpi_cambio = False
+    if raw or instance._state.adding or not kpi_cache.activa():
+        return
+
+    # __dict__: los campos diferidos (only/defer) no se cargaron ni se guardan
+    campos = [campo for campo in CAMPOS_KPI[sender] if campo in instance.__dict__]
+    if update_fields is not None:
+        campos = [campo for campo in campos if campo in update_fields]
+    if not campos:
+        return
+
+    filas = list(sender._base_manager.filter(pk=instance.pk).order_by().values(*campos)[:1])
+    anteriores = filas[0] if filas else None
+    instance._kpi_cambio = anteriores is None or any(
+        anteriores[campo] != sender._meta.get_field(campo).to_python(getattr(instance, campo))
+        for campo in campos
+    )
+
+
+@receiver(post_save, sender=JobOffer)
+@receiver(post_save, sender=Bid)
+@receiver(post_save, sender=UserProfile)
+@receiver(post_save, sender=User)
+def invalidar_si_cambio(sender, instance, created, **kwargs):
+    if created or getattr(instance, '_kpi_cambio', False):
+        kpi_cache.invalidar(METRICA_POR_MODELO[sender])
+    instance._kpi_cambio = False
+
+
+@receiver(post_delete, sender=JobOffer)
+@receiver(post_delete, sender=Bid)
+@receiver(post_delete, sender=UserProfile)
+@receiver(post_delete, sender=User)
+def invalidar_al_borrar(sender, instance, **kwargs):
+    kpi_cache.invalidar(METRICA_POR_MODELO[sender])
+
+
+@receiver(post_save, sender=EscrowTransaction)
+@receiver(post_delete, sender=EscrowTransaction)
+def invalidar_escrow(sender, instance, **kwargs):
+    """
+    Cada bloqueo, liberación o reembolso crea un EscrowTransaction (los
+    depósitos cambian de estado con UPDATE en la misma transacción).
+    """
+    kpi_cache.invalidar('escrow')
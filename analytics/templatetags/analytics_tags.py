@@ -0,0 +1,20 @@
+from django import template
+
+from analytics.models import ExportJob
+
+register = template.Library()
+
+
+@register.inclusion_tag('analytics/_exportaciones.html', takes_context=True)
+def panel_exportaciones(context):
+    """
+    Panel con las últimas exportaciones CSV del usuario. Mientras alguna
+    esté pendiente consulta su estado cada pocos segundos.
+    Uso: {% load analytics_tags %}{% panel_exportaciones %}
+    """
+    request = context['request']
+    exportaciones = list(ExportJob.objects.filter(solicitado_por=request.user)[:10])
+    return {
+        'exportaciones': exportaciones,
+        'en_curso': any(not job.terminada for job in exportaciones),
+    }
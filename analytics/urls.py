@@ -8,7 +8,11 @@ urlpatterns = [
     path('admin/', views.admin_dashboard, name='admin_dashboard'),
     path('admin/banear/<int:user_id>/', views.banear_usuario, name='banear_usuario'),
     path('admin/verificar/<int:user_id>/', views.verificar_cuit, name='verificar_cuit'),
+    path('cotizaciones/estado/', views.estado_cotizaciones, name='estado_cotizaciones'),
     path('reporte/transacciones/csv/', views.generar_reporte_csv, name='reporte_csv'),
     path('reporte/comisiones/csv/', views.generar_reporte_comisiones_csv, name='reporte_comisiones_csv'),
     path('reporte/mensual/csv/', views.generar_reporte_mensual_csv, name='reporte_mensual_csv'),
+    path('exportaciones/estado/', views.estado_exportaciones, name='estado_exportaciones'),
+    path('exportaciones/<str:reporte>/solicitar/', views.solicitar_exportacion, name='solicitar_exportacion'),
+    path('exportaciones/<int:job_id>/descargar/', views.descargar_exportacion, name='descargar_exportacion'),
 ]
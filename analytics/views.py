@@ -1,17 +1,24 @@
-import csv
-from datetime import datetime, timedelta
 from decimal import Decimal, ROUND_HALF_UP
-from django.shortcuts import render, redirect
-from django.http import HttpResponse, JsonResponse
+from django.shortcuts import render, redirect, get_object_or_404
+from django.http import FileResponse, Http404, JsonResponse
+from django.urls import reverse
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views.decorators.http import require_POST
 from django.contrib.auth.decorators import user_passes_test
-from django.db.models import Sum, Q, Count, F
+from django.db.models import Prefetch, Q
 from django.utils import timezone
 from django.contrib import messages
 from jobs.models import JobOffer, Bid, EscrowTransaction
-from usuarios.models import UserProfile, Wallet, Transaction
+from usuarios.models import UserProfile, Wallet
+from usuarios.currency_service import CurrencyService
+from usuarios.query_budget import query_budget
+from . import export_jobs, kpi_cache, kpis
+from .exports import REPORTES, ReporteComisiones, ReporteMensual, ReporteTransacciones
+from .models import ExportJob
 
 
 @user_passes_test(lambda u: u.is_superuser)
+@query_budget(15)
 def superuser_dashboard(request):
     """
     Dashboard exclusivo para superusuarios con KPIs del negocio.
@@ -23,72 +30,43 @@ def superuser_dashboard(request):
     - Tasa_de_Atraso: Porcentaje de trabajos con retrasos
     """
     
-    # ========== KPI 1: GMV TOTAL ==========
-    # Suma de todos los presupuestos de trabajos IN_PROGRESS y CLOSED (FINISHED)
-    gmv_data = JobOffer.objects.filter(
-        Q(status='IN_PROGRESS') | Q(status='CLOSED')
-    ).aggregate(
-        total_ars=Sum('budget_base_ars')
-    )
-    
-    gmv_total_ars = gmv_data['total_ars'] or Decimal('0.00')
-    
-    # Para USDC: necesitamos sumar los montos de las pujas ganadoras
-    gmv_usdc_data = Bid.objects.filter(
-        is_winner=True,
-        job_offer__status__in=['IN_PROGRESS', 'CLOSED']
-    ).aggregate(
-        total_usdc=Sum('amount_ars')  # Nota: si tienes amount_usdc, usar ese campo
-    )
+    trabajos = kpi_cache.obtener('trabajos', kpis.kpis_trabajos)
+    escrow = kpi_cache.obtener('escrow', kpis.kpis_escrow)
+    usuarios = kpi_cache.obtener('usuarios', kpis.kpis_usuarios)
     
-    # Simulación: dividir por tipo de cambio aproximado (ej: 1000 ARS = 1 USDC)
-    gmv_total_usdc = (gmv_usdc_data['total_usdc'] or Decimal('0.00')) / Decimal('1000.00')
+    # ========== KPI 1: GMV TOTAL ==========
+    # Presupuestos de trabajos IN_PROGRESS y CLOSED (FINISHED); en USDC, pujas
+    # ganadoras convertidas con la cotización vigente al crearlas
+    gmv_total_ars = trabajos['gmv_ars']
+    gmv_total_usdc = kpi_cache.obtener('trabajos', kpis.gmv_usdc)
     
     
     # ========== KPI 2: COMISIONES ACUMULADAS ==========
     # 5% de todos los trabajos CLOSED (finalizados)
-    comisiones_data = JobOffer.objects.filter(
-        status='CLOSED'
-    ).aggregate(
-        total_finalizados_ars=Sum('budget_base_ars')
-    )
-    
-    total_finalizados_ars = comisiones_data['total_finalizados_ars'] or Decimal('0.00')
     comision_tasa = Decimal('0.05')  # 5%
-    comisiones_ars = (total_finalizados_ars * comision_tasa).quantize(
+    comisiones_ars = (trabajos['finalizados_ars'] * comision_tasa).quantize(
         Decimal('0.01'), 
         rounding=ROUND_HALF_UP
     )
     
     # Comisiones en USDC (desde EscrowTransaction con tipo PLATFORM_FEE)
-    comisiones_usdc_data = EscrowTransaction.objects.filter(
-        transaction_type='PLATFORM_FEE',
-        status='RELEASED'
-    ).aggregate(
-        total_comision_usdc=Sum('amount_usdc')
-    )
-    
-    comisiones_usdc = comisiones_usdc_data['total_comision_usdc'] or Decimal('0.00')
+    comisiones_usdc = escrow['comisiones_usdc']
     
     
     # ========== KPI 3: FONDOS EN ESCROW ==========
     # Suma de todas las transacciones LOCKED (bloqueadas) actualmente
-    fondos_escrow_data = EscrowTransaction.objects.filter(
-        status='LOCKED'
-    ).aggregate(
-        total_bloqueado=Sum('amount_usdc')
-    )
-    
-    fondos_en_escrow = fondos_escrow_data['total_bloqueado'] or Decimal('0.00')
+    fondos_en_escrow = escrow['fondos_en_escrow']
+    # Control: saldo real de las sub-cuentas de escrow (ESCROW_SHARDS); la
+    # plataforma retiene ahí las comisiones, así que debe ser lo bloqueado
+    # más las comisiones cobradas
+    saldo_cuentas_escrow = kpi_cache.obtener('escrow', Wallet.get_escrow_balance)
+    diferencia_escrow = saldo_cuentas_escrow - fondos_en_escrow - comisiones_usdc
     
     
     # ========== KPI 4: TASA DE ATRASO ==========
     # Porcentaje de trabajos IN_PROGRESS con is_delayed=True
-    trabajos_en_progreso = JobOffer.objects.filter(status='IN_PROGRESS').count()
-    trabajos_atrasados = JobOffer.objects.filter(
-        status='IN_PROGRESS',
-        is_delayed=True
-    ).count()
+    trabajos_en_progreso = trabajos['en_progreso']
+    trabajos_atrasados = trabajos['atrasados']
     
     if trabajos_en_progreso > 0:
         tasa_atraso = (trabajos_atrasados / trabajos_en_progreso) * 100
@@ -97,21 +75,10 @@ def superuser_dashboard(request):
     
     
     # ========== MÉTRICAS ADICIONALES ==========
-    # Total de usuarios por tipo de rol
-    usuarios_stats = UserProfile.objects.values('tipo_rol').annotate(
-        total=Count('id')
-    )
-    
-    # Total de trabajos por estado
-    trabajos_stats = JobOffer.objects.values('status').annotate(
-        total=Count('id')
-    )
-    
-    # Total de transacciones escrow por tipo
-    escrow_stats = EscrowTransaction.objects.values('transaction_type').annotate(
-        total=Count('id'),
-        monto_total=Sum('amount_usdc')
-    )
+    # Usuarios por tipo de rol, trabajos por estado y transacciones escrow por tipo
+    usuarios_stats = usuarios['stats']
+    trabajos_stats = trabajos['stats']
+    escrow_stats = escrow['stats']
     
     # Últimas 10 transacciones de escrow
     ultimas_transacciones = EscrowTransaction.objects.select_related(
@@ -126,6 +93,8 @@ def superuser_dashboard(request):
         'comisiones_ars': comisiones_ars,
         'comisiones_usdc': comisiones_usdc,
         'fondos_en_escrow': fondos_en_escrow,
+        'saldo_cuentas_escrow': saldo_cuentas_escrow,
+        'diferencia_escrow': diferencia_escrow,
         'tasa_atraso': round(tasa_atraso, 2),
         'trabajos_en_progreso': trabajos_en_progreso,
         'trabajos_atrasados': trabajos_atrasados,
@@ -144,6 +113,7 @@ def superuser_dashboard(request):
 
 
 @user_passes_test(lambda u: u.is_superuser)
+@query_budget(15)
 def admin_dashboard(request):
     """
     Dashboard administrativo avanzado con Bootstrap 5.
@@ -157,50 +127,29 @@ def admin_dashboard(request):
     """
     
     # ========== INDICADORES (CARDS) ==========
+    trabajos = kpi_cache.obtener('trabajos', kpis.kpis_trabajos)
+    usuarios = kpi_cache.obtener('usuarios', kpis.kpis_usuarios)
     
     # 1. Ingresos Totales
-    ingresos_totales = EscrowTransaction.objects.filter(
-        transaction_type='PLATFORM_FEE',
-        status='RELEASED'
-    ).aggregate(total=Sum('amount_usdc'))['total'] or Decimal('0.00')
+    ingresos_totales = kpi_cache.obtener('escrow', kpis.kpis_escrow)['comisiones_usdc']
     
     # 2. Usuarios Nuevos (últimos 30 días)
-    hace_30_dias = timezone.now() - timedelta(days=30)
-    usuarios_nuevos = UserProfile.objects.filter(
-        fecha_creacion__gte=hace_30_dias
-    ).count()
+    usuarios_nuevos = usuarios['nuevos']
     
     # 3. Trabajos Activos
-    trabajos_activos = JobOffer.objects.filter(status='IN_PROGRESS').count()
+    trabajos_activos = trabajos['en_progreso']
     
     # 4. % de Conflictos (trabajos con atrasos)
-    total_trabajos = JobOffer.objects.filter(status='IN_PROGRESS').count()
-    trabajos_conflicto = JobOffer.objects.filter(
-        status='IN_PROGRESS',
-        is_delayed=True
-    ).count()
+    trabajos_conflicto = trabajos['atrasados']
     
-    if total_trabajos > 0:
-        porcentaje_conflictos = (trabajos_conflicto / total_trabajos) * 100
+    if trabajos_activos > 0:
+        porcentaje_conflictos = (trabajos_conflicto / trabajos_activos) * 100
     else:
         porcentaje_conflictos = 0.0
     
     
     # ========== GRÁFICO DE CRECIMIENTO (últimas 12 semanas) ==========
-    semanas_labels = []
-    semanas_valores = []
-    
-    for i in range(11, -1, -1):  # Últimas 12 semanas
-        fecha_inicio = timezone.now() - timedelta(weeks=i+1)
-        fecha_fin = timezone.now() - timedelta(weeks=i)
-        
-        trabajos_semana = JobOffer.objects.filter(
-            created_at__gte=fecha_inicio,
-            created_at__lt=fecha_fin
-        ).count()
-        
-        semanas_labels.append(f"Semana {12-i}")
-        semanas_valores.append(trabajos_semana)
+    semanas_labels, semanas_valores = kpi_cache.obtener('trabajos', kpis.crecimiento_semanal, semanas=12)
     
     
     # ========== LISTA DE ALERTA (trabajos con más de 3 días de atraso) ==========
@@ -209,14 +158,20 @@ def admin_dashboard(request):
     trabajos_atrasados = JobOffer.objects.filter(
         status='IN_PROGRESS',
         is_delayed=True
-    ).select_related('creator').prefetch_related('bids')
+    ).select_related('creator__user').prefetch_related(
+        Prefetch(
+            'bids',
+            queryset=Bid.objects.filter(is_winner=True).select_related('professional__user'),
+            to_attr='bids_ganadoras'
+        )
+    )
     
     for job in trabajos_atrasados:
         dias_atraso = job.get_days_delayed()
         
         if dias_atraso > 3:
             # Obtener el profesional (oficio) asignado
-            bid_ganadora = job.bids.filter(is_winner=True).select_related('professional').first()
+            bid_ganadora = job.bids_ganadoras[0] if job.bids_ganadoras else None
             
             trabajos_criticos.append({
                 'job': job,
@@ -244,16 +199,10 @@ def admin_dashboard(request):
     
     # ========== ESTADÍSTICAS ADICIONALES ==========
     # Total de usuarios por rol
-    usuarios_por_rol = {}
-    for rol in ['PERSONA', 'CONSORCIO', 'OFICIO']:
-        usuarios_por_rol[rol] = UserProfile.objects.filter(tipo_rol=rol).count()
+    usuarios_por_rol = usuarios['por_rol']
     
     # Total de trabajos por estado
-    trabajos_por_estado = {
-        'OPEN': JobOffer.objects.filter(status='OPEN').count(),
-        'IN_PROGRESS': JobOffer.objects.filter(status='IN_PROGRESS').count(),
-        'CLOSED': JobOffer.objects.filter(status='CLOSED').count(),
-    }
+    trabajos_por_estado = trabajos['por_estado']
     
     
     context = {
@@ -315,78 +264,33 @@ def verificar_cuit(request, user_id):
     return redirect('analytics:admin_dashboard')
 
 
+@user_passes_test(lambda u: u.is_superuser)
+def estado_cotizaciones(request):
+    """
+    Estado del servicio de cotizaciones en JSON: tasas actuales con su
+    antigüedad y estado de los circuit breakers de las APIs externas.
+    """
+    tasas = {}
+    for tipo_cambio in CurrencyService.TIPOS_CAMBIO:
+        snapshot = CurrencyService.get_rate_snapshot(tipo_cambio)
+        tasas[tipo_cambio] = {
+            'tasa': str(snapshot['tasa']),
+            'edad_segundos': snapshot['edad_segundos'],
+            'fresca': snapshot['fresca'],
+        }
+    
+    return JsonResponse({
+        'tasas': tasas,
+        **CurrencyService.get_breaker_metrics(),
+    })
+
+
 @user_passes_test(lambda u: u.is_superuser)
 def generar_reporte_mensual_csv(request):
     """
     Genera un reporte CSV con todas las actividades del último mes.
     """
-    response = HttpResponse(content_type='text/csv; charset=utf-8-sig')
-    timestamp = timezone.now().strftime('%Y%m')
-    response['Content-Disposition'] = f'attachment; filename="reporte_mensual_{timestamp}.csv"'
-    
-    response.write('\ufeff')
-    
-    writer = csv.writer(response, delimiter=';', quoting=csv.QUOTE_ALL)
-    
-    # Encabezados
-    writer.writerow([
-        'Fecha',
-        'Tipo de Actividad',
-        'Usuario',
-        'Detalles',
-        'Monto (USDC)',
-        'Estado',
-    ])
-    
-    # Obtener datos del último mes
-    hace_30_dias = timezone.now() - timedelta(days=30)
-    
-    # Transacciones escrow
-    transacciones = EscrowTransaction.objects.filter(
-        created_at__gte=hace_30_dias
-    ).select_related('job', 'from_wallet', 'to_wallet').order_by('-created_at')
-    
-    for tx in transacciones:
-        writer.writerow([
-            tx.created_at.strftime('%Y-%m-%d %H:%M'),
-            'Transacción Escrow',
-            tx.from_wallet.user.username if tx.from_wallet else '',
-            f"{tx.get_transaction_type_display()} - {tx.job.title if tx.job else ''}",
-            f"{tx.amount_usdc:.2f}",
-            tx.get_status_display(),
-        ])
-    
-    # Trabajos creados
-    trabajos = JobOffer.objects.filter(
-        created_at__gte=hace_30_dias
-    ).select_related('creator').order_by('-created_at')
-    
-    for job in trabajos:
-        writer.writerow([
-            job.created_at.strftime('%Y-%m-%d %H:%M'),
-            'Trabajo Creado',
-            job.creator.user.username,
-            job.title,
-            f"{job.budget_base_ars:.2f}",
-            job.get_status_display(),
-        ])
-    
-    # Usuarios registrados
-    usuarios = UserProfile.objects.filter(
-        fecha_creacion__gte=hace_30_dias
-    ).select_related('user').order_by('-fecha_creacion')
-    
-    for profile in usuarios:
-        writer.writerow([
-            profile.fecha_creacion.strftime('%Y-%m-%d %H:%M'),
-            'Usuario Registrado',
-            profile.user.username,
-            f"{profile.get_tipo_rol_display()}",
-            '0.00',
-            'Activo' if profile.user.is_active else 'Inactivo',
-        ])
-    
-    return response
+    return ReporteMensual().respuesta()
 
 
 @user_passes_test(lambda u: u.is_superuser)
@@ -405,115 +309,7 @@ def generar_reporte_csv(request):
     - Monto de comisión (5% para PLATFORM_FEE)
     - Estado
     """
-    
-    # Crear respuesta HTTP con tipo CSV
-    response = HttpResponse(content_type='text/csv; charset=utf-8-sig')
-    timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
-    response['Content-Disposition'] = f'attachment; filename="reporte_transacciones_{timestamp}.csv"'
-    
-    # BOM para Excel (soporte UTF-8)
-    response.write('\ufeff')
-    
-    # Crear writer CSV
-    writer = csv.writer(response, delimiter=';', quoting=csv.QUOTE_ALL)
-    
-    # Encabezados
-    writer.writerow([
-        'ID Transacción',
-        'Fecha',
-        'Tipo de Transacción',
-        'Estado',
-        'ID Trabajo',
-        'Título Trabajo',
-        'Cliente',
-        'CUIT/DNI Cliente',
-        'Email Cliente',
-        'Profesional',
-        'CUIT/DNI Profesional',
-        'Email Profesional',
-        'Monto (USDC)',
-        'Comisión Plataforma (USDC)',
-        'Comisión %',
-        'Wallet Origen',
-        'Wallet Destino',
-        'Descripción',
-    ])
-    
-    # Obtener todas las transacciones de escrow
-    transacciones = EscrowTransaction.objects.select_related(
-        'job',
-        'job__creator',
-        'job__creator__user',
-        'bid',
-        'bid__professional',
-        'bid__professional__user',
-        'from_wallet',
-        'from_wallet__user',
-        'to_wallet',
-        'to_wallet__user'
-    ).order_by('-created_at')
-    
-    # Escribir filas
-    for tx in transacciones:
-        # Calcular comisión (solo para PLATFORM_FEE)
-        if tx.transaction_type == 'PLATFORM_FEE':
-            comision_monto = tx.amount_usdc
-            comision_porcentaje = '5%'
-        else:
-            comision_monto = Decimal('0.00')
-            comision_porcentaje = '0%'
-        
-        # Obtener información del cliente
-        cliente_nombre = ''
-        cliente_cuit = 'N/A'
-        cliente_email = ''
-        if tx.job and tx.job.creator:
-            cliente_nombre = tx.job.creator.nombre_completo
-            cliente_email = tx.job.creator.email
-            # CUIT/DNI: buscar en el username o campos adicionales
-            # (Nota: si tienes un campo específico para CUIT, úsalo aquí)
-            cliente_cuit = f"Usuario: {tx.job.creator.user.username}"
-        
-        # Obtener información del profesional
-        profesional_nombre = ''
-        profesional_cuit = 'N/A'
-        profesional_email = ''
-        if tx.bid and tx.bid.professional:
-            profesional_nombre = tx.bid.professional.nombre_completo
-            profesional_email = tx.bid.professional.email
-            profesional_cuit = f"Usuario: {tx.bid.professional.user.username}"
-        
-        # Información de wallets
-        wallet_origen = ''
-        if tx.from_wallet:
-            wallet_origen = f"{tx.from_wallet.user.username} (ID: {tx.from_wallet.id})"
-        
-        wallet_destino = ''
-        if tx.to_wallet:
-            wallet_destino = f"{tx.to_wallet.user.username} (ID: {tx.to_wallet.id})"
-        
-        writer.writerow([
-            tx.id,
-            tx.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            tx.get_transaction_type_display(),
-            tx.get_status_display(),
-            tx.job.id if tx.job else '',
-            tx.job.title if tx.job else '',
-            cliente_nombre,
-            cliente_cuit,
-            cliente_email,
-            profesional_nombre,
-            profesional_cuit,
-            profesional_email,
-            f"{tx.amount_usdc:.2f}",
-            f"{comision_monto:.2f}",
-            comision_porcentaje,
-            wallet_origen,
-            wallet_destino,
-            tx.description or '',
-        ])
-    
-    return response
+    return ReporteTransacciones().respuesta()
 
 
 @user_passes_test(lambda u: u.is_superuser)
@@ -523,79 +319,74 @@ def generar_reporte_comisiones_csv(request):
     
     Incluye solo las transacciones de tipo PLATFORM_FEE con información fiscal.
     """
-    
-    response = HttpResponse(content_type='text/csv; charset=utf-8-sig')
-    timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
-    response['Content-Disposition'] = f'attachment; filename="reporte_comisiones_{timestamp}.csv"'
-    
-    response.write('\ufeff')
-    
-    writer = csv.writer(response, delimiter=';', quoting=csv.QUOTE_ALL)
-    
-    # Encabezados para facturación
-    writer.writerow([
-        'Fecha de Facturación',
-        'ID Transacción',
-        'ID Trabajo',
-        'Título del Trabajo',
-        'Cliente - Razón Social',
-        'Cliente - CUIT/DNI',
-        'Cliente - Email',
-        'Profesional - Razón Social',
-        'Profesional - CUIT/DNI',
-        'Profesional - Email',
-        'Monto Base del Trabajo (USDC)',
-        'Comisión Plataforma (USDC)',
-        'Comisión %',
-        'Estado de Pago',
-        'Fecha de Pago',
-        'Observaciones',
-    ])
-    
-    # Obtener solo comisiones
-    comisiones = EscrowTransaction.objects.filter(
-        transaction_type='PLATFORM_FEE'
-    ).select_related(
-        'job',
-        'job__creator',
-        'job__creator__user',
-        'bid',
-        'bid__professional',
-        'bid__professional__user'
-    ).order_by('-created_at')
-    
-    for comision in comisiones:
-        # Obtener el monto base del trabajo (70% del total, ya que la comisión es 5% de eso)
-        monto_base = comision.amount_usdc * Decimal('14')  # 5% -> 100%, entonces multiplicar por 20
-        
-        cliente_nombre = comision.job.creator.nombre_completo if comision.job else ''
-        cliente_cuit = f"Usuario: {comision.job.creator.user.username}" if comision.job else 'N/A'
-        cliente_email = comision.job.creator.email if comision.job else ''
-        
-        profesional_nombre = comision.bid.professional.nombre_completo if comision.bid else ''
-        profesional_cuit = f"Usuario: {comision.bid.professional.user.username}" if comision.bid else 'N/A'
-        profesional_email = comision.bid.professional.email if comision.bid else ''
-        
-        estado_pago = 'PAGADO' if comision.status == 'RELEASED' else 'PENDIENTE'
-        fecha_pago = comision.released_at.strftime('%Y-%m-%d %H:%M:%S') if comision.released_at else ''
-        
-        writer.writerow([
-            comision.created_at.strftime('%Y-%m-%d'),
-            comision.id,
-            comision.job.id if comision.job else '',
-            comision.job.title if comision.job else '',
-            cliente_nombre,
-            cliente_cuit,
-            cliente_email,
-            profesional_nombre,
-            profesional_cuit,
-            profesional_email,
-            f"{monto_base:.2f}",
-            f"{comision.amount_usdc:.2f}",
-            '5%',
-            estado_pago,
-            fecha_pago,
-            comision.description or '',
-        ])
-    
-    return response
+    return ReporteComisiones().respuesta()
+
+
+@user_passes_test(lambda u: u.is_superuser)
+@require_POST
+def solicitar_exportacion(request, reporte):
+    """
+    Encola la generación de un reporte CSV en segundo plano y vuelve al dashboard.
+    El avance se consulta con `estado_exportaciones`.
+    """
+    if reporte not in REPORTES:
+        raise Http404('Reporte inexistente')
+
+    export_jobs.solicitar(reporte, request.user)
+    messages.success(
+        request,
+        f'Generando "{REPORTES[reporte].titulo}". La descarga aparecerá en Exportaciones cuando esté lista.'
+    )
+
+    volver = request.POST.get('next', '')
+    if url_has_allowed_host_and_scheme(volver, allowed_hosts={request.get_host()}, require_https=request.is_secure()):
+        return redirect(volver)
+    return redirect('analytics:superuser_dashboard')
+
+
+@user_passes_test(lambda u: u.is_superuser)
+@query_budget(8)
+def estado_exportaciones(request):
+    """
+    Estado de las últimas exportaciones del usuario en JSON (lo consulta el
+    panel de Exportaciones mientras haya alguna sin terminar).
+    """
+    exportaciones = ExportJob.objects.filter(solicitado_por=request.user)[:10]
+
+    return JsonResponse({
+        'exportaciones': [
+            {
+                'id': job.pk,
+                'reporte': job.get_reporte_display(),
+                'status': job.status,
+                'status_display': job.get_status_display(),
+                'filas_procesadas': job.filas_procesadas,
+                'terminada': job.terminada,
+                'error': job.error,
+                'fecha_creacion': job.fecha_creacion.isoformat(),
+                'url_descarga': (
+                    reverse('analytics:descargar_exportacion', args=[job.pk])
+                    if job.status == 'COMPLETADO' else None
+                ),
+            }
+            for job in exportaciones
+        ]
+    })
+
+
+@user_passes_test(lambda u: u.is_superuser)
+def descargar_exportacion(request, job_id):
+    """Descarga el archivo de una exportación terminada (lectura directa del disco)."""
+    job = get_object_or_404(ExportJob, pk=job_id, status='COMPLETADO')
+
+    try:
+        archivo = job.archivo.open('rb')
+    except FileNotFoundError:
+        raise Http404('El archivo de la exportación ya no existe')
+
+    return FileResponse(
+        archivo,
+        as_attachment=True,
+        filename=job.nombre_descarga,
+        content_type='text/csv; charset=utf-8'
+    )
@@ -49,9 +49,11 @@ if not winning_bid:
 
 print(f"\n💼 PROPUESTA ACEPTADA:")
 print(f"   Profesional: {winning_bid.professional.nombre_completo}")
-print(f"   Monto total: ${winning_bid.amount_usdc} USDC")
-print(f"   30% inicial: ${winning_bid.amount_usdc * Decimal('0.30')} USDC")
-print(f"   70% final: ${winning_bid.amount_usdc * Decimal('0.70')} USDC")
+total = winning_bid.amount_usdc_referencia
+estimado = ' (estimado, cotización actual)' if winning_bid.amount_usdc_estimado else ''
+print(f"   Monto total: ${total} USDC{estimado}")
+print(f"   30% inicial: ${total * Decimal('0.30')} USDC")
+print(f"   70% final: ${total * Decimal('0.70')} USDC")
 
 # Obtener transacciones de escrow
 escrow_txs = EscrowTransaction.objects.filter(job=job).order_by('created_at')
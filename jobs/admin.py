@@ -62,7 +62,8 @@ class JobOfferAdmin(admin.ModelAdmin):
     
     def budget_base_usdc(self, obj):
         """Muestra el presupuesto en USDC."""
-        return f"${obj.budget_base_usdc} USDC"
+        estimado = ' (estimado, cotización actual)' if obj.budget_base_usdc_estimado else ''
+        return f"${obj.budget_base_usdc_referencia} USDC{estimado}"
     budget_base_usdc.short_description = 'Presupuesto Base (USDC)'
 
 
@@ -124,7 +125,8 @@ class BidAdmin(admin.ModelAdmin):
     
     def amount_usdc_display(self, obj):
         """Muestra el monto en USDC."""
-        return f"${obj.amount_usdc} USDC"
+        estimado = ' (estimado, cotización actual)' if obj.amount_usdc_estimado else ''
+        return f"${obj.amount_usdc_referencia} USDC{estimado}"
     amount_usdc_display.short_description = 'Monto (USDC)'
     
     def mark_as_winner(self, request, queryset):
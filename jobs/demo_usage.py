@@ -117,7 +117,7 @@ print(f"✓ Oferta creada: {offer.title}")
 print(f"  - ID: {offer.id}")
 print(f"  - Cliente: {offer.creator.user.get_full_name()}")
 print(f"  - Presupuesto: ${offer.budget_base_ars:,.2f} ARS")
-print(f"  - Presupuesto USDC: ${offer.budget_base_usdc} USDC")
+print(f"  - Presupuesto USDC: ${offer.budget_base_usdc_referencia} USDC")
 print(f"  - Tasa de conversión: 1 USDC = 1200 ARS")
 print(f"  - Estado: {offer.get_status_display()}")
 print(f"  - ¿Puede recibir pujas? {'Sí' if offer.can_receive_bids() else 'No'}")
@@ -139,7 +139,7 @@ bid1 = Bid.objects.create(
 )
 
 print(f"✓ Puja #1 - {prof1_user.get_full_name()}")
-print(f"  - Monto: ${bid1.amount_ars:,.2f} ARS = ${bid1.amount_usdc} USDC")
+print(f"  - Monto: ${bid1.amount_ars:,.2f} ARS = ${bid1.amount_usdc_referencia} USDC")
 print(f"  - Días estimados: {bid1.estimated_days}")
 print(f"  - Propuesta: {bid1.pitch_text[:70]}...")
 
@@ -154,7 +154,7 @@ bid2 = Bid.objects.create(
 )
 
 print(f"\n✓ Puja #2 - {prof2_user.get_full_name()}")
-print(f"  - Monto: ${bid2.amount_ars:,.2f} ARS = ${bid2.amount_usdc} USDC")
+print(f"  - Monto: ${bid2.amount_ars:,.2f} ARS = ${bid2.amount_usdc_referencia} USDC")
 print(f"  - Días estimados: {bid2.estimated_days}")
 print(f"  - Propuesta: {bid2.pitch_text[:70]}...")
 
@@ -198,7 +198,7 @@ winning_bid = offer.get_active_bids().annotate(
 
 print(f"Puja ganadora: Puja #{winning_bid.id}")
 print(f"  - Profesional: {winning_bid.professional.user.get_full_name()}")
-print(f"  - Monto: ${winning_bid.amount_ars:,.2f} ARS (${winning_bid.amount_usdc} USDC)")
+print(f"  - Monto: ${winning_bid.amount_ars:,.2f} ARS (${winning_bid.amount_usdc_referencia} USDC)")
 print(f"  - Votos: {winning_bid.total_votes}")
 
 # Marcar como ganadora
@@ -222,14 +222,14 @@ print("="*80 + "\n")
 
 print(f"Oferta: {offer.title}")
 print(f"  - Estado: {offer.get_status_display()}")
-print(f"  - Presupuesto cliente: ${offer.budget_base_ars:,.2f} ARS (${offer.budget_base_usdc} USDC)")
+print(f"  - Presupuesto cliente: ${offer.budget_base_ars:,.2f} ARS (${offer.budget_base_usdc_referencia} USDC)")
 print(f"  - Total de pujas: {offer.bids.count()}")
 
 print(f"\nPuja ganadora:")
 final_winner = offer.get_winning_bid()
 if final_winner:
     print(f"  - Profesional: {final_winner.professional.user.get_full_name()}")
-    print(f"  - Monto acordado: ${final_winner.amount_ars:,.2f} ARS (${final_winner.amount_usdc} USDC)")
+    print(f"  - Monto acordado: ${final_winner.amount_ars:,.2f} ARS (${final_winner.amount_usdc_referencia} USDC)")
     print(f"  - Ahorro para el cliente: ${offer.budget_base_ars - final_winner.amount_ars:,.2f} ARS")
     print(f"  - Días de trabajo: {final_winner.estimated_days}")
     print(f"  - Total de votos: {final_winner.total_votes}")
@@ -243,5 +243,5 @@ print("   JobOffer.objects.all()")
 print("   Bid.objects.filter(is_winner=True)")
 print("   Vote.objects.count()")
 print("   offer.get_active_bids()")
-print("   bid.amount_usdc  # Ver conversión ARS → USDC")
+print("   bid.amount_usdc_referencia  # Ver conversión ARS → USDC (estimada si aún no hay tasa)")
 print()
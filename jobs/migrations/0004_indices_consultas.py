@@ -0,0 +1,25 @@
+# Generated by Django 4.2.11 on 2026-10-18 00:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0003_escrowtransaction'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='escrowtransaction',
+            index=models.Index(fields=['job', 'transaction_type', 'status'], name='jobs_escrow_job_id_eadd85_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='escrowtransaction',
+            index=models.Index(fields=['from_wallet', 'status'], name='jobs_escrow_from_wa_f3fced_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='escrowtransaction',
+            index=models.Index(fields=['bid', 'status'], name='jobs_escrow_bid_id_45ebb1_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.11 on 2026-10-18 01:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0004_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bid',
+            name='tasa_usdc_ars',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, help_text='Cotización congelada al bloquear la seña: fija el total en USDC del escrow', max_digits=12, null=True, verbose_name='Tasa USDC/ARS'),
+        ),
+    ]
@@ -1,9 +1,43 @@
-from django.db import models
+from django.db import models, transaction as db_transaction
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 from decimal import Decimal, ROUND_HALF_UP
 
+from usuarios.currency_service import CurrencyService
+
+
+def _tasa_al_crear(instancia):
+    """
+    Tasa USDC/ARS de la instancia: la congelada en `tasa_usdc_ars` (si el
+    modelo la tiene) o la del historial vigente en `created_at`.
+    No consulta la tasa en vivo: sin historial devuelve None.
+    Se guarda en el objeto para no repetir la búsqueda.
+    """
+    tasa = getattr(instancia, 'tasa_usdc_ars', None)
+    if tasa is not None:
+        return tasa
+    if getattr(instancia, '_tasa_usdc_ars', None) is None:
+        instancia._tasa_usdc_ars = CurrencyService.get_rate_at(
+            instancia.created_at or timezone.now(),
+            usar_tasa_actual=False
+        )
+    return instancia._tasa_usdc_ars
+
+
+def _a_usdc(monto_ars, tasa):
+    if tasa is None:
+        return None
+    return (monto_ars / tasa).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def _a_usdc_referencia(monto_ars, tasa):
+    """
+    Monto en USDC sólo para mostrar: con `tasa` o, si todavía no hay, con la
+    cotización actual (estimado). Nunca para mover dinero.
+    """
+    return _a_usdc(monto_ars, tasa if tasa is not None else CurrencyService.get_usdc_to_ars_rate())
+
 
 class JobOffer(models.Model):
     """
@@ -103,14 +137,24 @@ class JobOffer(models.Model):
     @property
     def budget_base_usdc(self):
         """
-        Convierte el presupuesto base de ARS a USDC usando cotización mockeada.
-        1 USDC = 1200 ARS
+        Convierte el presupuesto base de ARS a USDC con la cotización
+        vigente al publicar la oferta (ver CotizacionHistorica).
+        None si no hay historial de cotizaciones.
         """
-        EXCHANGE_RATE = Decimal('1200.00')  # 1 USDC = 1200 ARS
-        return (self.budget_base_ars / EXCHANGE_RATE).quantize(
-            Decimal('0.01'),
-            rounding=ROUND_HALF_UP
-        )
+        return _a_usdc(self.budget_base_ars, _tasa_al_crear(self))
+    
+    @property
+    def budget_base_usdc_referencia(self):
+        """
+        Presupuesto en USDC para mostrar: budget_base_usdc o, sin historial,
+        el estimado con la cotización actual (ver budget_base_usdc_estimado).
+        """
+        return _a_usdc_referencia(self.budget_base_ars, _tasa_al_crear(self))
+    
+    @property
+    def budget_base_usdc_estimado(self):
+        """True si budget_base_usdc_referencia usa la cotización actual."""
+        return _tasa_al_crear(self) is None
     
     def get_active_bids(self):
         """Retorna todas las pujas activas para esta oferta."""
@@ -220,6 +264,16 @@ class Bid(models.Model):
         help_text='Indica si esta puja fue seleccionada como ganadora'
     )
     
+    tasa_usdc_ars = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Tasa USDC/ARS',
+        help_text='Cotización congelada al bloquear la seña: fija el total en USDC del escrow'
+    )
+    
     created_at = models.DateTimeField(
         auto_now_add=True,
         verbose_name='Fecha de Creación'
@@ -253,14 +307,41 @@ class Bid(models.Model):
     @property
     def amount_usdc(self):
         """
-        Convierte el monto de la puja de ARS a USDC usando cotización mockeada.
-        1 USDC = 1200 ARS
+        Convierte el monto de la puja de ARS a USDC con la tasa congelada al
+        bloquear la seña o, antes de eso, con la vigente al crear la puja
+        (ver CotizacionHistorica). None si todavía no hay tasa.
         """
-        EXCHANGE_RATE = Decimal('1200.00')  # 1 USDC = 1200 ARS
-        return (self.amount_ars / EXCHANGE_RATE).quantize(
-            Decimal('0.01'),
-            rounding=ROUND_HALF_UP
-        )
+        return _a_usdc(self.amount_ars, _tasa_al_crear(self))
+    
+    @property
+    def amount_usdc_referencia(self):
+        """
+        Monto en USDC para mostrar: amount_usdc o, sin tasa todavía, el
+        estimado con la cotización actual (ver amount_usdc_estimado).
+        Los pasos del escrow usan amount_usdc / total_congelado.
+        """
+        return _a_usdc_referencia(self.amount_ars, _tasa_al_crear(self))
+    
+    @property
+    def amount_usdc_estimado(self):
+        """True si amount_usdc_referencia usa la cotización actual."""
+        return _tasa_al_crear(self) is None
+    
+    def congelar_tasa(self):
+        """
+        Fija `tasa_usdc_ars` (la vigente al crear la puja) la primera vez que
+        se bloquea dinero: todos los pasos del escrow usan el mismo total
+        aunque después cambie la cotización.
+        
+        Returns:
+            Decimal: la tasa congelada
+        """
+        if self.tasa_usdc_ars is None:
+            tasa = CurrencyService.get_rate_at(self.created_at or timezone.now())
+            # Condicional: si otro request la congeló antes, se respeta la suya
+            Bid.objects.filter(pk=self.pk, tasa_usdc_ars__isnull=True).update(tasa_usdc_ars=tasa)
+            self.tasa_usdc_ars = Bid.objects.filter(pk=self.pk).values_list('tasa_usdc_ars', flat=True).first() or tasa
+        return self.tasa_usdc_ars
     
     @property
     def total_votes(self):
@@ -662,11 +743,35 @@ class EscrowTransaction(models.Model):
             models.Index(fields=['job', '-created_at']),
             models.Index(fields=['status', '-created_at']),
             models.Index(fields=['transaction_type']),
+            # Depósitos de un trabajo por tipo y estado (release_*, refund_to_client, job_detail)
+            models.Index(fields=['job', 'transaction_type', 'status']),
+            # Fondos bloqueados de un cliente (wallet_escrow)
+            models.Index(fields=['from_wallet', 'status']),
+            # Fondos bloqueados de un profesional, vía sus bids (wallet_escrow)
+            models.Index(fields=['bid', 'status']),
         ]
     
     def __str__(self):
         return f"{self.get_transaction_type_display()} - ${self.amount_usdc} USDC - {self.get_status_display()}"
     
+    @classmethod
+    def total_congelado(cls, job, bid):
+        """
+        Total en USDC del trabajo tal como se fijó al bloquear la seña
+        (metadata del INITIAL_DEPOSIT). El 70% y la comisión se calculan
+        sobre este total, no sobre la cotización del momento.
+        """
+        metadata = cls.objects.filter(
+            job=job,
+            bid=bid,
+            transaction_type='INITIAL_DEPOSIT'
+        ).order_by('created_at').values_list('metadata', flat=True).first()
+        
+        if metadata and metadata.get('total_amount'):
+            return Decimal(metadata['total_amount'])
+        bid.congelar_tasa()
+        return bid.amount_usdc
+    
     @classmethod
     def lock_initial_deposit(cls, job, bid, client_wallet):
         """
@@ -680,6 +785,7 @@ class EscrowTransaction(models.Model):
         Returns:
             (EscrowTransaction, success: bool, error_msg: str)
         """
+        bid.congelar_tasa()
         total_amount = bid.amount_usdc
         initial_deposit = (total_amount * Decimal('0.30')).quantize(
             Decimal('0.01'),
@@ -690,35 +796,42 @@ class EscrowTransaction(models.Model):
         if not client_wallet.tiene_saldo_suficiente(initial_deposit):
             return None, False, "Saldo insuficiente. Por favor, cargue fondos en su wallet."
         
-        # Obtener wallet de escrow de la plataforma
-        from usuarios.models import Wallet
-        escrow_wallet = Wallet.get_escrow_account()
+        # Obtener la sub-cuenta de escrow del trabajo
+        from usuarios.models import Wallet, SaldoInsuficienteError
+        escrow_wallet = Wallet.get_escrow_account(job.id)
         
         try:
-            # Transferir fondos del cliente al escrow
-            client_wallet.restar_saldo(initial_deposit)
-            escrow_wallet.sumar_saldo(initial_deposit)
-            
-            # Crear registro de transacción
-            transaction = cls.objects.create(
-                job=job,
-                bid=bid,
-                amount_usdc=initial_deposit,
-                transaction_type='INITIAL_DEPOSIT',
-                status='LOCKED',
-                from_wallet=client_wallet,
-                to_wallet=escrow_wallet,
-                description=f"Depósito inicial del 30% (${initial_deposit} USDC) bloqueado en escrow para '{job.title}'",
-                metadata={
-                    'total_amount': str(total_amount),
-                    'percentage': '30',
-                    'professional_id': bid.professional.id,
-                    'client_id': client_wallet.user.id
-                }
-            )
+            with db_transaction.atomic():
+                # Transferir fondos del cliente al escrow (UPDATE condicional)
+                Wallet.transferir_saldo(
+                    client_wallet, escrow_wallet, initial_deposit,
+                    tipo='DEPOSITO_ESCROW', referencia=f'job:{job.id}'
+                )
+                
+                # Crear registro de transacción
+                transaction = cls.objects.create(
+                    job=job,
+                    bid=bid,
+                    amount_usdc=initial_deposit,
+                    transaction_type='INITIAL_DEPOSIT',
+                    status='LOCKED',
+                    from_wallet=client_wallet,
+                    to_wallet=escrow_wallet,
+                    description=f"Depósito inicial del 30% (${initial_deposit} USDC) bloqueado en escrow para '{job.title}'",
+                    metadata={
+                        'total_amount': str(total_amount),
+                        'percentage': '30',
+                        'professional_id': bid.professional.id,
+                        'client_id': client_wallet.user.id
+                    }
+                )
+                
+                Wallet.ajustar_saldo_bloqueado(client_wallet.pk, bid.professional.user_id, transaction.amount_usdc)
             
             return transaction, True, ""
             
+        except SaldoInsuficienteError:
+            return None, False, "Saldo insuficiente. Por favor, cargue fondos en su wallet."
         except Exception as e:
             return None, False, f"Error al procesar transacción: {str(e)}"
     
@@ -745,42 +858,45 @@ class EscrowTransaction(models.Model):
         if not initial_deposit:
             return None, False, "No se encontró depósito inicial bloqueado."
         
-        # Obtener wallets
+        # Obtener wallets: los fondos están en la sub-cuenta donde se depositaron
         from usuarios.models import Wallet
-        escrow_wallet = Wallet.get_escrow_account()
+        escrow_wallet = initial_deposit.to_wallet or Wallet.get_escrow_account(job.id)
         professional_wallet, _ = Wallet.objects.get_or_create(
             user=bid.professional.user,
             defaults={'tipo_cuenta': 'USER', 'balance_usdc': Decimal('0.00')}
         )
         
         try:
-            # Transferir del escrow al profesional
-            amount = initial_deposit.amount_usdc
-            escrow_wallet.restar_saldo(amount)
-            professional_wallet.sumar_saldo(amount)
-            
-            # Actualizar transacción original
-            initial_deposit.status = 'RELEASED'
-            initial_deposit.released_at = timezone.now()
-            initial_deposit.to_wallet = professional_wallet
-            initial_deposit.save()
-            
-            # Crear registro de liberación
-            release_transaction = cls.objects.create(
-                job=job,
-                bid=bid,
-                amount_usdc=amount,
-                transaction_type='INITIAL_RELEASE',
-                status='RELEASED',
-                from_wallet=escrow_wallet,
-                to_wallet=professional_wallet,
-                description=f"Liberación del 30% inicial (${amount} USDC) a {bid.professional.nombre_completo} por '{job.title}'",
-                released_at=timezone.now(),
-                metadata={
-                    'original_deposit_id': initial_deposit.id,
-                    'percentage': '30'
-                }
-            )
+            with db_transaction.atomic():
+                # Marcar el depósito como liberado sólo si sigue bloqueado,
+                # así dos confirmaciones simultáneas no pagan dos veces
+                if not cls._marcar_liberado(initial_deposit, 'RELEASED', to_wallet=professional_wallet):
+                    return None, False, "El depósito inicial ya fue liberado."
+                cls._desbloquear(initial_deposit, bid)
+                
+                # Transferir del escrow al profesional
+                amount = initial_deposit.amount_usdc
+                Wallet.transferir_saldo(
+                    escrow_wallet, professional_wallet, amount,
+                    tipo='LIBERACION', referencia=f'job:{job.id}'
+                )
+                
+                # Crear registro de liberación
+                release_transaction = cls.objects.create(
+                    job=job,
+                    bid=bid,
+                    amount_usdc=amount,
+                    transaction_type='INITIAL_RELEASE',
+                    status='RELEASED',
+                    from_wallet=escrow_wallet,
+                    to_wallet=professional_wallet,
+                    description=f"Liberación del 30% inicial (${amount} USDC) a {bid.professional.nombre_completo} por '{job.title}'",
+                    released_at=timezone.now(),
+                    metadata={
+                        'original_deposit_id': initial_deposit.id,
+                        'percentage': '30'
+                    }
+                )
             
             return release_transaction, True, ""
             
@@ -800,7 +916,7 @@ class EscrowTransaction(models.Model):
         Returns:
             (EscrowTransaction, success: bool, error_msg: str)
         """
-        total_amount = bid.amount_usdc
+        total_amount = cls.total_congelado(job, bid)
         remaining_amount = (total_amount * Decimal('0.70')).quantize(
             Decimal('0.01'),
             rounding=ROUND_HALF_UP
@@ -810,33 +926,40 @@ class EscrowTransaction(models.Model):
         if not client_wallet.tiene_saldo_suficiente(remaining_amount):
             return None, False, "Saldo insuficiente para bloquear el 70% restante."
         
-        from usuarios.models import Wallet
-        escrow_wallet = Wallet.get_escrow_account()
+        from usuarios.models import Wallet, SaldoInsuficienteError
+        escrow_wallet = Wallet.get_escrow_account(job.id)
         
         try:
-            # Transferir fondos del cliente al escrow
-            client_wallet.restar_saldo(remaining_amount)
-            escrow_wallet.sumar_saldo(remaining_amount)
-            
-            # Crear registro de transacción
-            transaction = cls.objects.create(
-                job=job,
-                bid=bid,
-                amount_usdc=remaining_amount,
-                transaction_type='REMAINING_DEPOSIT',
-                status='LOCKED',
-                from_wallet=client_wallet,
-                to_wallet=escrow_wallet,
-                description=f"Depósito del 70% restante (${remaining_amount} USDC) bloqueado en escrow para '{job.title}'",
-                metadata={
-                    'total_amount': str(total_amount),
-                    'percentage': '70',
-                    'professional_id': bid.professional.id
-                }
-            )
+            with db_transaction.atomic():
+                # Transferir fondos del cliente al escrow (UPDATE condicional)
+                Wallet.transferir_saldo(
+                    client_wallet, escrow_wallet, remaining_amount,
+                    tipo='DEPOSITO_ESCROW', referencia=f'job:{job.id}'
+                )
+                
+                # Crear registro de transacción
+                transaction = cls.objects.create(
+                    job=job,
+                    bid=bid,
+                    amount_usdc=remaining_amount,
+                    transaction_type='REMAINING_DEPOSIT',
+                    status='LOCKED',
+                    from_wallet=client_wallet,
+                    to_wallet=escrow_wallet,
+                    description=f"Depósito del 70% restante (${remaining_amount} USDC) bloqueado en escrow para '{job.title}'",
+                    metadata={
+                        'total_amount': str(total_amount),
+                        'percentage': '70',
+                        'professional_id': bid.professional.id
+                    }
+                )
+                
+                Wallet.ajustar_saldo_bloqueado(client_wallet.pk, bid.professional.user_id, transaction.amount_usdc)
             
             return transaction, True, ""
             
+        except SaldoInsuficienteError:
+            return None, False, "Saldo insuficiente para bloquear el 70% restante."
         except Exception as e:
             return None, False, f"Error al bloquear monto restante: {str(e)}"
     
@@ -864,7 +987,7 @@ class EscrowTransaction(models.Model):
             return None, None, False, "No se encontró depósito restante bloqueado."
         
         # Calcular comisión del 5% sobre el monto total
-        total_amount = bid.amount_usdc
+        total_amount = cls.total_congelado(job, bid)
         platform_fee = (total_amount * Decimal('0.05')).quantize(
             Decimal('0.01'),
             rounding=ROUND_HALF_UP
@@ -873,61 +996,61 @@ class EscrowTransaction(models.Model):
         # Monto neto que recibe el profesional = 70% - 5% del total
         amount_to_professional = remaining_deposit.amount_usdc - platform_fee
         
-        # Obtener wallets
+        # Obtener wallets: los fondos están en la sub-cuenta donde se depositaron
         from usuarios.models import Wallet
-        escrow_wallet = Wallet.get_escrow_account()
+        escrow_wallet = remaining_deposit.to_wallet or Wallet.get_escrow_account(job.id)
         professional_wallet, _ = Wallet.objects.get_or_create(
             user=bid.professional.user,
             defaults={'tipo_cuenta': 'USER', 'balance_usdc': Decimal('0.00')}
         )
         
         try:
-            # Transferir del escrow al profesional (70% - 5%)
-            escrow_wallet.restar_saldo(remaining_deposit.amount_usdc)
-            professional_wallet.sumar_saldo(amount_to_professional)
-            # La comisión (5%) queda en el escrow como ganancia de la plataforma
-            escrow_wallet.sumar_saldo(platform_fee)
-            
-            # Actualizar transacción original
-            remaining_deposit.status = 'RELEASED'
-            remaining_deposit.released_at = timezone.now()
-            remaining_deposit.to_wallet = professional_wallet
-            remaining_deposit.save()
-            
-            # Crear registro de liberación final
-            release_transaction = cls.objects.create(
-                job=job,
-                bid=bid,
-                amount_usdc=amount_to_professional,
-                transaction_type='FINAL_RELEASE',
-                status='RELEASED',
-                from_wallet=escrow_wallet,
-                to_wallet=professional_wallet,
-                description=f"Liberación final del 70% (${amount_to_professional} USDC) a {bid.professional.nombre_completo} por '{job.title}'",
-                released_at=timezone.now(),
-                metadata={
-                    'original_deposit_id': remaining_deposit.id,
-                    'percentage': '65',  # 70% - 5% = 65%
-                    'fee_deducted': str(platform_fee)
-                }
-            )
-            
-            # Crear registro de comisión
-            fee_transaction = cls.objects.create(
-                job=job,
-                bid=bid,
-                amount_usdc=platform_fee,
-                transaction_type='PLATFORM_FEE',
-                status='RELEASED',
-                from_wallet=escrow_wallet,
-                to_wallet=escrow_wallet,  # La plataforma retiene la comisión
-                description=f"Comisión de plataforma del 5% (${platform_fee} USDC) por '{job.title}'",
-                released_at=timezone.now(),
-                metadata={
-                    'total_amount': str(total_amount),
-                    'percentage': '5'
-                }
-            )
+            with db_transaction.atomic():
+                if not cls._marcar_liberado(remaining_deposit, 'RELEASED', to_wallet=professional_wallet):
+                    return None, None, False, "El depósito restante ya fue liberado."
+                cls._desbloquear(remaining_deposit, bid)
+                
+                # Transferir del escrow al profesional (70% - 5%): un único débito neto,
+                # la comisión (5%) queda en el escrow como ganancia de la plataforma
+                Wallet.transferir_saldo(
+                    escrow_wallet, professional_wallet, amount_to_professional,
+                    tipo='LIBERACION', referencia=f'job:{job.id}'
+                )
+                
+                # Crear registro de liberación final
+                release_transaction = cls.objects.create(
+                    job=job,
+                    bid=bid,
+                    amount_usdc=amount_to_professional,
+                    transaction_type='FINAL_RELEASE',
+                    status='RELEASED',
+                    from_wallet=escrow_wallet,
+                    to_wallet=professional_wallet,
+                    description=f"Liberación final del 70% (${amount_to_professional} USDC) a {bid.professional.nombre_completo} por '{job.title}'",
+                    released_at=timezone.now(),
+                    metadata={
+                        'original_deposit_id': remaining_deposit.id,
+                        'percentage': '65',  # 70% - 5% = 65%
+                        'fee_deducted': str(platform_fee)
+                    }
+                )
+                
+                # Crear registro de comisión
+                fee_transaction = cls.objects.create(
+                    job=job,
+                    bid=bid,
+                    amount_usdc=platform_fee,
+                    transaction_type='PLATFORM_FEE',
+                    status='RELEASED',
+                    from_wallet=escrow_wallet,
+                    to_wallet=escrow_wallet,  # La plataforma retiene la comisión
+                    description=f"Comisión de plataforma del 5% (${platform_fee} USDC) por '{job.title}'",
+                    released_at=timezone.now(),
+                    metadata={
+                        'total_amount': str(total_amount),
+                        'percentage': '5'
+                    }
+                )
             
             return release_transaction, fee_transaction, True, ""
             
@@ -952,13 +1075,12 @@ class EscrowTransaction(models.Model):
             job=job,
             bid=bid,
             status='LOCKED'
-        )
+        ).select_related('to_wallet')
         
         if not locked_deposits.exists():
             return [], False, "No hay fondos bloqueados para reembolsar."
         
         from usuarios.models import Wallet
-        escrow_wallet = Wallet.get_escrow_account()
         client_wallet = Wallet.objects.filter(user=job.creator.user).first()
         
         if not client_wallet:
@@ -967,37 +1089,69 @@ class EscrowTransaction(models.Model):
         refund_transactions = []
         
         try:
-            for deposit in locked_deposits:
-                # Reembolsar del escrow al cliente
-                escrow_wallet.restar_saldo(deposit.amount_usdc)
-                client_wallet.sumar_saldo(deposit.amount_usdc)
-                
-                # Actualizar transacción original
-                deposit.status = 'REFUNDED'
-                deposit.released_at = timezone.now()
-                deposit.save()
-                
-                # Crear registro de reembolso
-                refund = cls.objects.create(
-                    job=job,
-                    bid=bid,
-                    amount_usdc=deposit.amount_usdc,
-                    transaction_type='REFUND',
-                    status='RELEASED',
-                    from_wallet=escrow_wallet,
-                    to_wallet=client_wallet,
-                    description=f"Reembolso de ${deposit.amount_usdc} USDC a {client_wallet.user.get_full_name() or client_wallet.user.username}. Motivo: {reason}",
-                    released_at=timezone.now(),
-                    metadata={
-                        'original_deposit_id': deposit.id,
-                        'reason': reason
-                    }
-                )
-                
-                refund_transactions.append(refund)
+            with db_transaction.atomic():
+                for deposit in locked_deposits:
+                    # Sólo se reembolsa si el depósito sigue bloqueado
+                    if not cls._marcar_liberado(deposit, 'REFUNDED'):
+                        continue
+                    cls._desbloquear(deposit, bid)
+                    
+                    # Reembolsar al cliente desde la sub-cuenta donde se depositó
+                    escrow_wallet = deposit.to_wallet or Wallet.get_escrow_account(job.id)
+                    Wallet.transferir_saldo(
+                        escrow_wallet, client_wallet, deposit.amount_usdc,
+                        tipo='REEMBOLSO', referencia=f'job:{job.id}'
+                    )
+                    
+                    # Crear registro de reembolso
+                    refund = cls.objects.create(
+                        job=job,
+                        bid=bid,
+                        amount_usdc=deposit.amount_usdc,
+                        transaction_type='REFUND',
+                        status='RELEASED',
+                        from_wallet=escrow_wallet,
+                        to_wallet=client_wallet,
+                        description=f"Reembolso de ${deposit.amount_usdc} USDC a {client_wallet.user.get_full_name() or client_wallet.user.username}. Motivo: {reason}",
+                        released_at=timezone.now(),
+                        metadata={
+                            'original_deposit_id': deposit.id,
+                            'reason': reason
+                        }
+                    )
+                    
+                    refund_transactions.append(refund)
             
             return refund_transactions, True, ""
             
         except Exception as e:
             return [], False, f"Error al procesar reembolso: {str(e)}"
-
+    
+    @classmethod
+    def _marcar_liberado(cls, deposit, status, **campos):
+        """
+        Pasa un depósito de LOCKED a `status` con un UPDATE condicional.
+        
+        Returns:
+            bool: False si otro proceso ya lo había liberado o reembolsado
+        """
+        now = timezone.now()
+        actualizados = cls.objects.filter(pk=deposit.pk, status='LOCKED').update(
+            status=status,
+            released_at=now,
+            updated_at=now,
+            **campos
+        )
+        
+        if actualizados:
+            deposit.status = status
+            deposit.released_at = now
+            for campo, valor in campos.items():
+                setattr(deposit, campo, valor)
+        return actualizados == 1
+    
+    @classmethod
+    def _desbloquear(cls, deposit, bid):
+        """Descuenta de los contadores de escrow un depósito que dejó de estar LOCKED."""
+        from usuarios.models import Wallet
+        Wallet.ajustar_saldo_bloqueado(deposit.from_wallet_id, bid.professional.user_id, -deposit.amount_usdc)
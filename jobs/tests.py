@@ -1,3 +1,251 @@
-from django.test import TestCase
+import re
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from usuarios.currency_service import CurrencyService
+from usuarios.models import Wallet
+from .models import Bid, EscrowTransaction, JobOffer
+
+
+class EscrowTestMixin:
+    """Cliente, profesional, trabajo y puja ganadora de ARS 100.000 a 1000 ARS/USDC."""
+
+    tasa = Decimal('1000')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = User.objects.create_user('cliente', password='x')
+        cls.profesional = User.objects.create_user('profesional', password='x')
+        cls.trabajo = JobOffer.objects.create(
+            creator=cls.cliente.profile,
+            title='Pintura',
+            description='Pintar living',
+            budget_base_ars=Decimal('100000'),
+        )
+        cls.bid = Bid.objects.create(
+            job_offer=cls.trabajo,
+            professional=cls.profesional.profile,
+            amount_ars=Decimal('100000'),
+            estimated_days=5,
+            pitch_text='Presupuesto',
+            is_winner=True,
+        )
+
+    def setUp(self):
+        # Sin historial de cotizaciones: la tasa "en vivo" es self.tasa
+        patcher = mock.patch.object(
+            CurrencyService, 'get_usdc_to_ars_rate', side_effect=lambda *args, **kwargs: self.tasa
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.wallet_cliente = Wallet.objects.get(user=self.cliente)
+
+
+class EscrowTotalCongeladoTest(EscrowTestMixin, TestCase):
+    """
+    El total en USDC se congela al bloquear la seña: si después cambia la
+    cotización, el 70% y la comisión se calculan sobre el mismo total.
+    """
+
+    def test_pasos_usan_el_total_de_la_sena(self):
+        deposito, ok, _ = EscrowTransaction.lock_initial_deposit(self.trabajo, self.bid, self.wallet_cliente)
+        self.assertTrue(ok)
+        self.assertEqual(deposito.amount_usdc, Decimal('30.00'))
+
+        self.tasa = Decimal('2000')
+        bid = Bid.objects.get(pk=self.bid.pk)
+        self.assertEqual(bid.amount_usdc, Decimal('100.00'))
+
+        EscrowTransaction.release_initial_payment(self.trabajo, bid)
+        restante, ok, _ = EscrowTransaction.lock_remaining_amount(self.trabajo, bid, self.wallet_cliente)
+        self.assertTrue(ok)
+        self.assertEqual(restante.amount_usdc, Decimal('70.00'))
+
+        liberacion, comision, ok, _ = EscrowTransaction.release_final_payment(self.trabajo, bid)
+        self.assertTrue(ok)
+        self.assertEqual(comision.amount_usdc, Decimal('5.00'))
+        self.assertEqual(liberacion.amount_usdc, Decimal('65.00'))
+
+    def test_monto_sin_tasa_no_consulta_la_api(self):
+        self.assertIsNone(Bid.objects.get(pk=self.bid.pk).amount_usdc)
+        CurrencyService.get_usdc_to_ars_rate.assert_not_called()
+
+    def test_referencia_estimada_con_la_cotizacion_actual(self):
+        bid = Bid.objects.get(pk=self.bid.pk)
+        self.assertTrue(bid.amount_usdc_estimado)
+        self.assertEqual(bid.amount_usdc_referencia, Decimal('100.00'))
+        self.assertTrue(self.trabajo.budget_base_usdc_estimado)
+        self.assertEqual(self.trabajo.budget_base_usdc_referencia, Decimal('100.00'))
+
+        bid.congelar_tasa()
+        self.tasa = Decimal('2000')
+        self.assertFalse(bid.amount_usdc_estimado)
+        self.assertEqual(bid.amount_usdc_referencia, Decimal('100.00'))
+
+
+class LiberacionUnicaTest(EscrowTestMixin, TestCase):
+    """La seña se libera una sola vez aunque lleguen dos confirmaciones."""
+
+    def setUp(self):
+        super().setUp()
+        self.deposito, ok, _ = EscrowTransaction.lock_initial_deposit(self.trabajo, self.bid, self.wallet_cliente)
+        self.assertTrue(ok)
+        self.wallet_profesional = Wallet.objects.get(user=self.profesional)
+
+    def test_segunda_liberacion_rechazada(self):
+        _, ok, _ = EscrowTransaction.release_initial_payment(self.trabajo, self.bid)
+        self.assertTrue(ok)
+        _, ok, error = EscrowTransaction.release_initial_payment(self.trabajo, self.bid)
+
+        self.assertFalse(ok)
+        self.assertTrue(error)
+        self.wallet_profesional.refresh_from_db()
+        self.assertEqual(self.wallet_profesional.balance_usdc, Decimal('1030.00'))
+        self.assertEqual(
+            EscrowTransaction.objects.filter(transaction_type='INITIAL_RELEASE').count(), 1
+        )
+
+    def test_confirmacion_concurrente_no_cambia_el_deposito(self):
+        # Otra confirmación leyó el depósito como LOCKED antes de que se liberara
+        leido_antes = EscrowTransaction.objects.get(pk=self.deposito.pk)
+        EscrowTransaction.release_initial_payment(self.trabajo, self.bid)
+
+        self.assertFalse(EscrowTransaction._marcar_liberado(leido_antes, 'REFUNDED'))
+        self.assertEqual(leido_antes.status, 'LOCKED')
+        self.deposito.refresh_from_db()
+        self.assertEqual(self.deposito.status, 'RELEASED')
+        self.assertEqual(self.deposito.to_wallet, self.wallet_profesional)
+
+
+class AceptarPropuestaIdempotenteTest(EscrowTestMixin, TestCase):
+    """El formulario de aceptar propuesta lleva su clave: el doble envío bloquea una sola seña."""
+
+    def test_formulario_con_clave_y_doble_envio(self):
+        self.client.force_login(self.cliente)
+
+        response = self.client.get(reverse('job_detail', args=[self.trabajo.id]))
+        clave = re.search(r'name="idempotency_key" value="(\w+)"', response.content.decode()).group(1)
+
+        url = reverse('accept_bid', args=[self.bid.id])
+        primera = self.client.post(url, {'idempotency_key': clave})
+        segunda = self.client.post(url, {'idempotency_key': clave})
+
+        self.assertEqual(segunda['Location'], primera['Location'])
+        self.assertEqual(
+            EscrowTransaction.objects.filter(transaction_type='INITIAL_DEPOSIT').count(), 1
+        )
+
+
+class ContadoresEscrowTest(EscrowTestMixin, TestCase):
+    """
+    saldo_bloqueado_usdc (cliente) y saldo_por_recibir_usdc (profesional)
+    son siempre la suma de los depósitos LOCKED, en cada paso del escrow.
+    """
+
+    def assertContadoresCoinciden(self):
+        bloqueado = EscrowTransaction.objects.filter(status='LOCKED').aggregate(
+            total=Sum('amount_usdc')
+        )['total'] or Decimal('0.00')
+        cliente = Wallet.objects.get(user=self.cliente)
+        profesional = Wallet.objects.get(user=self.profesional)
+
+        self.assertEqual(cliente.saldo_bloqueado_usdc, bloqueado)
+        self.assertEqual(profesional.saldo_por_recibir_usdc, bloqueado)
+        return bloqueado
+
+    def test_bloqueo_liberacion_y_finalizacion(self):
+        EscrowTransaction.lock_initial_deposit(self.trabajo, self.bid, self.wallet_cliente)
+        self.assertEqual(self.assertContadoresCoinciden(), Decimal('30.00'))
+
+        EscrowTransaction.release_initial_payment(self.trabajo, self.bid)
+        self.assertEqual(self.assertContadoresCoinciden(), Decimal('0.00'))
+
+        EscrowTransaction.lock_remaining_amount(self.trabajo, self.bid, self.wallet_cliente)
+        self.assertEqual(self.assertContadoresCoinciden(), Decimal('70.00'))
+
+        EscrowTransaction.release_final_payment(self.trabajo, self.bid)
+        self.assertEqual(self.assertContadoresCoinciden(), Decimal('0.00'))
+
+    def test_reembolso(self):
+        EscrowTransaction.lock_initial_deposit(self.trabajo, self.bid, self.wallet_cliente)
+        self.assertEqual(self.assertContadoresCoinciden(), Decimal('30.00'))
+
+        _, ok, _ = EscrowTransaction.refund_to_client(self.trabajo, self.bid, reason='Cancelado')
+        self.assertTrue(ok)
+        self.assertEqual(self.assertContadoresCoinciden(), Decimal('0.00'))
+
+        # Un segundo reembolso no descuenta otra vez
+        EscrowTransaction.refund_to_client(self.trabajo, self.bid, reason='Cancelado')
+        self.assertEqual(self.assertContadoresCoinciden(), Decimal('0.00'))
+
+
+@override_settings(ESCROW_SHARDS=8)
+class SubcuentasEscrowTest(EscrowTestMixin, TestCase):
+    """
+    Cada trabajo deposita en su sub-cuenta de escrow y la suma de las
+    sub-cuentas es lo bloqueado en depósitos LOCKED más las comisiones
+    que retiene la plataforma.
+    """
+
+    def setUp(self):
+        super().setUp()
+        Wallet.clear_escrow_cache()
+        self.addCleanup(Wallet.clear_escrow_cache)
+        self.otro_trabajo = JobOffer.objects.create(
+            creator=self.cliente.profile,
+            title='Plomería',
+            description='Cambiar canilla',
+            budget_base_ars=Decimal('50000'),
+        )
+        self.otra_bid = Bid.objects.create(
+            job_offer=self.otro_trabajo,
+            professional=self.profesional.profile,
+            amount_ars=Decimal('50000'),
+            estimated_days=2,
+            pitch_text='Presupuesto',
+            is_winner=True,
+        )
+
+    def _bloqueado(self):
+        return EscrowTransaction.objects.filter(status='LOCKED').aggregate(
+            total=Sum('amount_usdc')
+        )['total'] or Decimal('0.00')
+
+    def _comisiones(self):
+        return EscrowTransaction.objects.filter(transaction_type='PLATFORM_FEE').aggregate(
+            total=Sum('amount_usdc')
+        )['total'] or Decimal('0.00')
+
+    def test_trabajos_distintos_van_a_subcuentas_distintas(self):
+        self.assertNotEqual(
+            Wallet.escrow_shard_for(self.trabajo.id), Wallet.escrow_shard_for(self.otro_trabajo.id)
+        )
+        uno, _, _ = EscrowTransaction.lock_initial_deposit(self.trabajo, self.bid, self.wallet_cliente)
+        otro, _, _ = EscrowTransaction.lock_initial_deposit(self.otro_trabajo, self.otra_bid, self.wallet_cliente)
+
+        self.assertNotEqual(uno.to_wallet_id, otro.to_wallet_id)
+        self.assertEqual(Wallet.objects.get(pk=uno.to_wallet_id).shard, Wallet.escrow_shard_for(self.trabajo.id))
+        self.assertEqual(
+            Wallet.objects.get(pk=otro.to_wallet_id).shard, Wallet.escrow_shard_for(self.otro_trabajo.id)
+        )
+
+    def test_suma_de_subcuentas_igual_a_lo_bloqueado(self):
+        EscrowTransaction.lock_initial_deposit(self.trabajo, self.bid, self.wallet_cliente)
+        EscrowTransaction.lock_initial_deposit(self.otro_trabajo, self.otra_bid, self.wallet_cliente)
+        self.assertEqual(Wallet.get_escrow_balance(), self._bloqueado())
+        self.assertEqual(self._bloqueado(), Decimal('45.00'))
+
+        EscrowTransaction.release_initial_payment(self.trabajo, self.bid)
+        EscrowTransaction.lock_remaining_amount(self.trabajo, self.bid, self.wallet_cliente)
+        self.assertEqual(Wallet.get_escrow_balance(), self._bloqueado())
+
+        EscrowTransaction.release_final_payment(self.trabajo, self.bid)
+        EscrowTransaction.refund_to_client(self.otro_trabajo, self.otra_bid, reason='Cancelado')
+        self.assertEqual(self._bloqueado(), Decimal('0.00'))
+        self.assertEqual(Wallet.get_escrow_balance(), self._comisiones())
+        self.assertEqual(self._comisiones(), Decimal('5.00'))
@@ -6,6 +6,7 @@ from django.core.paginator import Paginator
 from django.utils import timezone
 from .models import JobOffer, Bid, Vote, DelayRegistry, EscrowTransaction
 from usuarios.models import Wallet
+from usuarios.idempotency import idempotente
 from decimal import Decimal
 
 
@@ -167,6 +168,7 @@ def submit_bid(request, job_id):
 
 
 @login_required
+@idempotente
 def accept_bid(request, bid_id):
     """Vista para aceptar una propuesta con verificación de saldo y bloqueo de fondos."""
     if request.method != 'POST':
@@ -202,7 +204,7 @@ def accept_bid(request, bid_id):
         # Si no tiene saldo suficiente, redirigir a cargar fondos
         messages.error(
             request,
-            f'{error_msg} Necesita ${bid.amount_usdc * Decimal("0.30")} USDC para aceptar esta propuesta.'
+            f'{error_msg} Necesita ${bid.amount_usdc_referencia * Decimal("0.30")} USDC para aceptar esta propuesta.'
         )
         # Redirigir a la página de wallet para cargar fondos
         return redirect('wallet')  # Asumiendo que tienes una vista 'wallet'
@@ -505,6 +507,7 @@ def job_tracking(request, job_id):
 
 
 @login_required
+@idempotente
 def confirm_work_start(request, job_id):
     """
     Vista para que el cliente confirme el inicio de obra.
@@ -580,6 +583,7 @@ def confirm_work_start(request, job_id):
 
 
 @login_required
+@idempotente
 def complete_work(request, job_id):
     """
     Vista para que el cliente confirme la finalización de obra.
@@ -54,6 +54,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'usuarios.middleware.QueryBudgetMiddleware',  # Consultas por request (opt-in, QUERY_BUDGET_ENABLED)
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -62,6 +63,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',
+    'usuarios.middleware.ExchangeRateMiddleware',  # Cotización única por request
     'usuarios.middleware.OnboardingMiddleware',  # Middleware de onboarding
 ]
 
@@ -139,6 +141,74 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Caché
+# LocMemCache es por proceso: para `manage.py actualizar_cotizaciones` y la marca
+# de onboarding usar un backend compartido (p. ej. django.core.cache.backends.redis.RedisCache).
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default=''),
+    }
+}
+
+# LocMemCache y DummyCache no se comparten entre procesos (cada worker tiene la suya)
+CACHE_COMPARTIDA = CACHES['default']['BACKEND'] not in (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# Marca de onboarding completo en la sesión (usuarios/user_context.py): su versión
+# vive en la caché, así que sólo se activa por defecto con una caché compartida
+ONBOARDING_SESSION_MARKER = config('ONBOARDING_SESSION_MARKER', default=CACHE_COMPARTIDA, cast=bool)
+
+# Cotizaciones USDC/ARS (usuarios.currency_service)
+# Con refresco en segundo plano una tasa vencida se sirve mientras un hilo del
+# proceso la renueva; sin ninguna tasa en caché se sirve la última del historial
+# (o la tasa por defecto) marcada como vieja. Ningún request espera a la API.
+CURRENCY_BACKGROUND_REFRESH = config('CURRENCY_BACKGROUND_REFRESH', default=True, cast=bool)
+# Intervalo de `manage.py actualizar_cotizaciones` (requiere CACHE_COMPARTIDA): menor
+# que la frescura de la tasa (CurrencyService.CACHE_TIMEOUT, 300 s) para que no llegue a vencer
+CURRENCY_REFRESH_INTERVAL = config('CURRENCY_REFRESH_INTERVAL', default=240, cast=int)
+
+# Circuit breaker de las APIs de cotización: tras N fallas seguidas la API no se
+# consulta durante RESET segundos; un fallo total se recuerda NEGATIVE_CACHE segundos.
+CURRENCY_BREAKER_FAILURE_THRESHOLD = config('CURRENCY_BREAKER_FAILURE_THRESHOLD', default=3, cast=int)
+CURRENCY_BREAKER_RESET_TIMEOUT = config('CURRENCY_BREAKER_RESET_TIMEOUT', default=60, cast=int)
+CURRENCY_NEGATIVE_CACHE_TIMEOUT = config('CURRENCY_NEGATIVE_CACHE_TIMEOUT', default=30, cast=int)
+
+# Escrow de la plataforma repartido en N sub-cuentas (job_id % ESCROW_SHARDS)
+# para que operaciones sobre trabajos distintos no compitan por la misma fila.
+# Cambiarlo es seguro: liberaciones y reembolsos usan la sub-cuenta del depósito.
+ESCROW_SHARDS = config('ESCROW_SHARDS', default=8, cast=int)
+
+# Idempotencia de los POST que mueven dinero (usuarios/idempotency.py):
+# vigencia de las claves enviadas por el cliente y ventana de las derivadas
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=86400, cast=int)
+IDEMPOTENCY_WINDOW = config('IDEMPOTENCY_WINDOW', default=10, cast=int)
+
+# Exportaciones CSV en segundo plano (analytics/export_jobs.py): threads del
+# pool por proceso (0 = generar en el mismo request) y días que se conservan
+EXPORT_WORKERS = config('EXPORT_WORKERS', default=2, cast=int)
+EXPORT_RETENTION_DAYS = config('EXPORT_RETENTION_DAYS', default=7, cast=int)
+
+# Dashboards de analytics desde KPIs pre-agregados (analytics/rollups.py) en
+# lugar de recorrer las tablas; requiere correr `manage.py actualizar_kpis` por cron
+ANALYTICS_KPI_ROLLUPS = config('ANALYTICS_KPI_ROLLUPS', default=False, cast=bool)
+
+# Caché de KPIs (analytics/kpi_cache.py): las escrituras relevantes suben una
+# versión en la caché, así que sólo se activa por defecto con una caché
+# compartida (si no, cada worker vería sólo sus propias invalidaciones).
+# Segundos de cada franja; 0 = sin caché
+ANALYTICS_KPI_CACHE = config('ANALYTICS_KPI_CACHE', default=CACHE_COMPARTIDA, cast=bool)
+ANALYTICS_KPI_CACHE_SECONDS = config('ANALYTICS_KPI_CACHE_SECONDS', default=300, cast=int)
+
+# Presupuesto de consultas por request (usuarios/query_budget.py): header
+# Server-Timing y log por vista; presupuesto de las vistas sin @query_budget y
+# repeticiones de una misma consulta a partir de las cuales se reporta un N+1
+QUERY_BUDGET_ENABLED = config('QUERY_BUDGET_ENABLED', default=False, cast=bool)
+QUERY_BUDGET_DEFAULT = config('QUERY_BUDGET_DEFAULT', default=30, cast=int)
+QUERY_BUDGET_REPEAT_THRESHOLD = config('QUERY_BUDGET_REPEAT_THRESHOLD', default=5, cast=int)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -149,10 +219,11 @@ SITE_ID = 1
 
 AUTHENTICATION_BACKENDS = [
     # Needed to login by username in Django admin, regardless of `allauth`
-    'django.contrib.auth.backends.ModelBackend',
+    # (ModelBackend de Django que carga perfil y wallet con el usuario)
+    'usuarios.backends.ModelBackend',
     
     # `allauth` specific authentication methods, such as login by email
-    'allauth.account.auth_backends.AuthenticationBackend',
+    'usuarios.backends.AuthenticationBackend',
 ]
 
 # Allauth configuration
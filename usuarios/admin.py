@@ -4,7 +4,12 @@ from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.db.models import Count, Q
 from django.urls import reverse
 from django.utils.html import format_html
-from .models import UserProfile, JobOffer, Proposal, DelayJustification, Wallet, Transaction, WorkEvent
+from .models import (
+    UserProfile, JobOffer, Proposal, DelayJustification, Wallet, Transaction, WorkEvent, CotizacionHistorica,
+    LedgerEntry, LedgerCheckpoint, ConciliacionLedger
+)
+from .currency_service import CurrencyService
+from analytics import kpi_cache
 
 
 class UserProfileInline(admin.StackedInline):
@@ -73,6 +78,57 @@ class UserProfileAdmin(admin.ModelAdmin):
     )
 
 
+def estadisticas_usuarios():
+    """
+    Estadísticas de usuarios del índice del admin (se cachean con
+    analytics.kpi_cache; las invalidan los cambios de rol, puntuación o estado).
+    """
+    # Obtener estadísticas de usuarios
+    total_usuarios = User.objects.count()
+    usuarios_activos = User.objects.filter(is_active=True).count()
+    
+    # Estadísticas por tipo de rol
+    usuarios_por_rol = UserProfile.objects.values('tipo_rol').annotate(
+        total=Count('id')
+    ).order_by('tipo_rol')
+    
+    # Crear diccionario de estadísticas
+    stats_rol = {
+        'PERSONA': 0,
+        'CONSORCIO': 0,
+        'OFICIO': 0
+    }
+    
+    for item in usuarios_por_rol:
+        stats_rol[item['tipo_rol']] = item['total']
+    
+    # Puntuación promedio por rol
+    from django.db.models import Avg
+    puntuacion_promedio = UserProfile.objects.aggregate(
+        promedio_general=Avg('puntuacion'),
+        promedio_persona=Avg('puntuacion', filter=Q(tipo_rol='PERSONA')),
+        promedio_consorcio=Avg('puntuacion', filter=Q(tipo_rol='CONSORCIO')),
+        promedio_oficio=Avg('puntuacion', filter=Q(tipo_rol='OFICIO'))
+    )
+    
+    return {
+        'total_usuarios': total_usuarios,
+        'usuarios_activos': usuarios_activos,
+        'usuarios_inactivos': total_usuarios - usuarios_activos,
+        'por_rol': {
+            'persona': stats_rol['PERSONA'],
+            'consorcio': stats_rol['CONSORCIO'],
+            'oficio': stats_rol['OFICIO'],
+        },
+        'puntuaciones': {
+            'promedio_general': round(puntuacion_promedio['promedio_general'] or 0, 2),
+            'promedio_persona': round(puntuacion_promedio['promedio_persona'] or 0, 2),
+            'promedio_consorcio': round(puntuacion_promedio['promedio_consorcio'] or 0, 2),
+            'promedio_oficio': round(puntuacion_promedio['promedio_oficio'] or 0, 2),
+        }
+    }
+
+
 # Personalizar el índice del admin
 class KunfidoAdminSite(admin.AdminSite):
     """
@@ -87,52 +143,7 @@ class KunfidoAdminSite(admin.AdminSite):
         Sobrescribe el método index para agregar estadísticas personalizadas.
         """
         extra_context = extra_context or {}
-        
-        # Obtener estadísticas de usuarios
-        total_usuarios = User.objects.count()
-        usuarios_activos = User.objects.filter(is_active=True).count()
-        
-        # Estadísticas por tipo de rol
-        usuarios_por_rol = UserProfile.objects.values('tipo_rol').annotate(
-            total=Count('id')
-        ).order_by('tipo_rol')
-        
-        # Crear diccionario de estadísticas
-        stats_rol = {
-            'PERSONA': 0,
-            'CONSORCIO': 0,
-            'OFICIO': 0
-        }
-        
-        for item in usuarios_por_rol:
-            stats_rol[item['tipo_rol']] = item['total']
-        
-        # Puntuación promedio por rol
-        from django.db.models import Avg
-        puntuacion_promedio = UserProfile.objects.aggregate(
-            promedio_general=Avg('puntuacion'),
-            promedio_persona=Avg('puntuacion', filter=Q(tipo_rol='PERSONA')),
-            promedio_consorcio=Avg('puntuacion', filter=Q(tipo_rol='CONSORCIO')),
-            promedio_oficio=Avg('puntuacion', filter=Q(tipo_rol='OFICIO'))
-        )
-        
-        # Agregar estadísticas al contexto
-        extra_context['estadisticas_usuarios'] = {
-            'total_usuarios': total_usuarios,
-            'usuarios_activos': usuarios_activos,
-            'usuarios_inactivos': total_usuarios - usuarios_activos,
-            'por_rol': {
-                'persona': stats_rol['PERSONA'],
-                'consorcio': stats_rol['CONSORCIO'],
-                'oficio': stats_rol['OFICIO'],
-            },
-            'puntuaciones': {
-                'promedio_general': round(puntuacion_promedio['promedio_general'] or 0, 2),
-                'promedio_persona': round(puntuacion_promedio['promedio_persona'] or 0, 2),
-                'promedio_consorcio': round(puntuacion_promedio['promedio_consorcio'] or 0, 2),
-                'promedio_oficio': round(puntuacion_promedio['promedio_oficio'] or 0, 2),
-            }
-        }
+        extra_context['estadisticas_usuarios'] = kpi_cache.obtener('usuarios', estadisticas_usuarios)
         
         return super().index(request, extra_context=extra_context)
 
@@ -263,18 +274,19 @@ class WalletAdmin(admin.ModelAdmin):
     """
     Admin para el modelo Wallet.
     """
-    list_display = ('id', 'get_user_display', 'tipo_cuenta', 'balance_usdc', 'fecha_creacion', 'fecha_actualizacion')
+    list_display = ('id', 'get_user_display', 'tipo_cuenta', 'shard', 'balance_usdc', 'get_balance_ars_display', 'fecha_creacion', 'fecha_actualizacion')
     list_filter = ('tipo_cuenta', 'fecha_creacion')
     search_fields = ('user__username', 'user__email', 'user__first_name', 'user__last_name')
-    readonly_fields = ('fecha_creacion', 'fecha_actualizacion')
+    # Los saldos sólo cambian con movimientos registrados en el libro mayor
+    readonly_fields = ('balance_usdc', 'saldo_bloqueado_usdc', 'saldo_por_recibir_usdc', 'fecha_creacion', 'fecha_actualizacion')
     ordering = ('-fecha_creacion',)
     
     fieldsets = (
         ('Información del Usuario', {
-            'fields': ('user', 'tipo_cuenta')
+            'fields': ('user', 'tipo_cuenta', 'shard')
         }),
         ('Saldo', {
-            'fields': ('balance_usdc',)
+            'fields': ('balance_usdc', 'saldo_bloqueado_usdc', 'saldo_por_recibir_usdc')
         }),
         ('Fechas', {
             'fields': ('fecha_creacion', 'fecha_actualizacion'),
@@ -285,10 +297,21 @@ class WalletAdmin(admin.ModelAdmin):
     def get_user_display(self, obj):
         """Muestra el nombre del usuario o 'Sistema' si es cuenta ESCROW."""
         if obj.tipo_cuenta == 'ESCROW':
-            return '🏦 Plataforma Escrow'
+            return f'🏦 Plataforma Escrow #{obj.shard}'
         return obj.user.get_full_name() or obj.user.username
     get_user_display.short_description = 'Usuario'
     get_user_display.admin_order_field = 'user__username'
+    
+    def get_queryset(self, request):
+        """Convierte el saldo a ARS en la misma consulta del listado."""
+        qs = super().get_queryset(request).select_related('user')
+        return CurrencyService.annotate_ars(qs)
+    
+    def get_balance_ars_display(self, obj):
+        """Saldo equivalente en ARS (cotización blue)."""
+        return f"$ {obj.balance_ars:,.2f}"
+    get_balance_ars_display.short_description = 'Saldo (ARS)'
+    get_balance_ars_display.admin_order_field = 'balance_ars'
 
 
 @admin.register(Transaction)
@@ -322,6 +345,8 @@ class TransactionAdmin(admin.ModelAdmin):
     
     def get_from_wallet_display(self, obj):
         """Muestra información de la wallet origen."""
+        if obj.from_wallet is None:
+            return '💳 Externo'
         if obj.from_wallet.tipo_cuenta == 'ESCROW':
             return '🏦 Escrow'
         return obj.from_wallet.user.username
@@ -371,6 +396,76 @@ class WorkEventAdmin(admin.ModelAdmin):
     get_oferta_titulo.admin_order_field = 'oferta__titulo'
 
 
+@admin.register(CotizacionHistorica)
+class CotizacionHistoricaAdmin(admin.ModelAdmin):
+    """
+    Admin de sólo lectura para el historial de cotizaciones.
+    Las filas las escribe CurrencyService al actualizar la tasa.
+    """
+    list_display = ('tipo_cambio', 'tasa', 'vigente_desde')
+    list_filter = ('tipo_cambio',)
+    date_hierarchy = 'vigente_desde'
+    ordering = ('tipo_cambio', '-vigente_desde')
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(LedgerEntry)
+class LedgerEntryAdmin(admin.ModelAdmin):
+    """
+    Admin de sólo lectura para el libro mayor (los asientos no se modifican).
+    """
+    list_display = ('id', 'fecha', 'tipo', 'wallet', 'monto_usdc', 'referencia', 'movimiento')
+    list_filter = ('tipo', 'fecha')
+    search_fields = ('referencia', 'movimiento', 'wallet__user__username')
+    raw_id_fields = ('wallet',)
+    ordering = ('-id',)
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(LedgerCheckpoint)
+class LedgerCheckpointAdmin(admin.ModelAdmin):
+    """
+    Admin de sólo lectura para los checkpoints de saldo.
+    """
+    list_display = ('wallet', 'saldo_usdc', 'hasta_asiento_id', 'fecha', 'fecha_creacion')
+    raw_id_fields = ('wallet',)
+    ordering = ('-hasta_asiento_id',)
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ConciliacionLedger)
+class ConciliacionLedgerAdmin(admin.ModelAdmin):
+    """
+    Admin de sólo lectura para las corridas de conciliación.
+    """
+    list_display = ('fecha_inicio', 'completa', 'wallets_revisadas', 'diferencias', 'hasta_asiento_id')
+    list_filter = ('completa',)
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 # Crear instancia del admin site personalizado
 admin_site = KunfidoAdminSite(name='kunfido_admin')
 
@@ -387,3 +482,8 @@ admin_site.register(DelayJustification, DelayJustificationAdmin)
 admin_site.register(Wallet, WalletAdmin)
 admin_site.register(Transaction, TransactionAdmin)
 admin_site.register(WorkEvent, WorkEventAdmin)
+admin_site.register(CotizacionHistorica, CotizacionHistoricaAdmin)
+admin_site.register(LedgerEntry, LedgerEntryAdmin)
+admin_site.register(LedgerCheckpoint, LedgerCheckpointAdmin)
+admin_site.register(ConciliacionLedger, ConciliacionLedgerAdmin)
+
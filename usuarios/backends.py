@@ -0,0 +1,36 @@
+"""
+Backends de autenticación que cargan el usuario con perfil y wallet.
+
+AuthenticationMiddleware resuelve `request.user` con `backend.get_user()`.
+Estos backends hacen esa consulta con `select_related('profile', 'wallet')`,
+así el usuario, su perfil y su wallet salen de una sola consulta por request
+y `request.user.profile` / `request.user.wallet` no vuelven a la base.
+"""
+
+from allauth.account.auth_backends import AuthenticationBackend as AllauthAuthenticationBackend
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend as DjangoModelBackend
+
+# Sesiones abiertas con los backends estándar: usuarios/user_context.py las
+# pasa al equivalente de este módulo sin cerrar la sesión
+BACKENDS_ANTERIORES = {
+    'django.contrib.auth.backends.ModelBackend': 'usuarios.backends.ModelBackend',
+    'allauth.account.auth_backends.AuthenticationBackend': 'usuarios.backends.AuthenticationBackend',
+}
+
+
+class PerfilYWalletMixin:
+
+    def get_user(self, user_id):
+        user = get_user_model()._default_manager.select_related(
+            'profile', 'wallet'
+        ).filter(pk=user_id).first()
+        return user if user and self.user_can_authenticate(user) else None
+
+
+class ModelBackend(PerfilYWalletMixin, DjangoModelBackend):
+    """ModelBackend de Django (login por username en el admin)."""
+
+
+class AuthenticationBackend(PerfilYWalletMixin, AllauthAuthenticationBackend):
+    """Backend de allauth (login por email)."""
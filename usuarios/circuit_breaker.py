@@ -0,0 +1,149 @@
+"""
+Circuit breaker para APIs externas, con el estado guardado en la caché.
+
+Estados:
+- cerrado: las llamadas pasan normalmente; se cuentan las fallas seguidas.
+- abierto: tras `umbral_fallas` fallas seguidas no se llama a la API
+  durante `tiempo_reapertura` segundos.
+- semiabierto: vencido ese tiempo, un único worker (cache.add) hace una
+  llamada de prueba. Si responde el circuito se cierra; si falla vuelve
+  a abrirse por otro intervalo.
+
+Como el estado vive en la caché compartida, una caída cuesta una sola
+prueba por intervalo para todos los procesos, no una por request.
+"""
+
+import logging
+import time
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitoAbiertoError(Exception):
+    """Se intentó llamar a un servicio con el circuito abierto."""
+
+
+class CircuitBreaker:
+    """
+    Uso:
+        breaker = CircuitBreaker("dolarapi")
+        tasa = breaker.llamar(consultar_api, "blue")
+    """
+
+    CERRADO = "cerrado"
+    ABIERTO = "abierto"
+    SEMIABIERTO = "semiabierto"
+
+    def __init__(self, nombre, umbral_fallas=3, tiempo_reapertura=60):
+        self.nombre = nombre
+        self.umbral_fallas = umbral_fallas
+        self.tiempo_reapertura = tiempo_reapertura
+        self.cache_key = f"circuit_breaker_{nombre}"
+        self.sonda_key = f"{self.cache_key}_sonda"
+
+    def llamar(self, funcion, *args, **kwargs):
+        """
+        Ejecuta `funcion` si el circuito lo permite.
+
+        Raises:
+            CircuitoAbiertoError: si el circuito está abierto (o otro worker
+                está haciendo la llamada de prueba)
+        """
+        if not self.permitir():
+            raise CircuitoAbiertoError(f"Circuito '{self.nombre}' abierto")
+
+        try:
+            resultado = funcion(*args, **kwargs)
+        except Exception:
+            self.registrar_falla()
+            raise
+
+        self.registrar_exito()
+        return resultado
+
+    def permitir(self):
+        """Indica si se puede llamar al servicio en este momento."""
+        datos = self._leer()
+
+        if datos["estado"] == self.CERRADO:
+            return True
+
+        if time.time() - datos["abierto_en"] < self.tiempo_reapertura:
+            return False
+
+        # Semiabierto: sólo el worker que obtiene la sonda prueba el servicio
+        return cache.add(self.sonda_key, True, self.tiempo_reapertura)
+
+    def registrar_exito(self):
+        datos = self._leer()
+        if datos["estado"] != self.CERRADO:
+            logger.info(f"Circuito '{self.nombre}' cerrado: el servicio volvió a responder")
+
+        datos.update(estado=self.CERRADO, fallas=0, abierto_en=None)
+        self._guardar(datos)
+        cache.delete(self.sonda_key)
+
+    def registrar_falla(self):
+        datos = self._leer()
+        datos["fallas"] += 1
+        datos["ultima_falla"] = time.time()
+
+        if datos["estado"] != self.CERRADO or datos["fallas"] >= self.umbral_fallas:
+            if datos["estado"] == self.CERRADO:
+                datos["aperturas"] += 1
+                logger.warning(
+                    f"Circuito '{self.nombre}' abierto tras {datos['fallas']} fallas; "
+                    f"próxima prueba en {self.tiempo_reapertura}s"
+                )
+            datos.update(estado=self.ABIERTO, abierto_en=time.time())
+            cache.delete(self.sonda_key)
+
+        self._guardar(datos)
+
+    def estado(self):
+        """Estado actual: cerrado, abierto o semiabierto."""
+        datos = self._leer()
+        if datos["estado"] == self.ABIERTO and time.time() - datos["abierto_en"] >= self.tiempo_reapertura:
+            return self.SEMIABIERTO
+        return datos["estado"]
+
+    def metricas(self):
+        """
+        Returns:
+            dict: {"estado", "fallas", "aperturas", "abierto_en", "ultima_falla",
+                   "reintento_en_segundos"}
+        """
+        datos = self._leer()
+        reintento = None
+        if datos["estado"] == self.ABIERTO:
+            reintento = max(0, int(datos["abierto_en"] + self.tiempo_reapertura - time.time()))
+
+        return {
+            "estado": self.estado(),
+            "fallas": datos["fallas"],
+            "aperturas": datos["aperturas"],
+            "abierto_en": datos["abierto_en"],
+            "ultima_falla": datos["ultima_falla"],
+            "reintento_en_segundos": reintento,
+        }
+
+    def reset(self):
+        """Cierra el circuito manualmente."""
+        cache.delete_many([self.cache_key, self.sonda_key])
+
+    def _leer(self):
+        datos = cache.get(self.cache_key)
+        if datos is None:
+            datos = {
+                "estado": self.CERRADO,
+                "fallas": 0,
+                "aperturas": 0,
+                "abierto_en": None,
+                "ultima_falla": None,
+            }
+        return datos
+
+    def _guardar(self, datos):
+        cache.set(self.cache_key, datos, None)
@@ -2,26 +2,39 @@
 Context processors para agregar información global a todos los templates.
 """
 
+from django.utils.functional import SimpleLazyObject, new_method_proxy
+
 from .currency_service import CurrencyService
 from decimal import Decimal
 
 
+class MontoPerezoso(SimpleLazyObject):
+    """
+    SimpleLazyObject que además se puede formatear: {{ valor }} sin filtro
+    pasa por localize(), que usa "{:f}".format() con los Decimal.
+    """
+    __format__ = new_method_proxy(format)
+
+
 def currency_context(request):
     """
     Agrega información de cotización a todos los templates.
+
+    Los valores son perezosos: la cotización (caché de CurrencyService) y el
+    saldo de la wallet se resuelven la primera vez que un template los usa.
+    Las páginas que no muestran montos (admin, redirects) no pagan nada.
     """
-    if request.user.is_authenticated and hasattr(request.user, 'profile'):
-        wallet = getattr(request.user.profile, 'wallet', None)
-        if wallet:
-            tasa = CurrencyService.get_usdc_to_ars_rate(tipo_cambio="blue")
-            balance_ars = wallet.get_balance_ars(tipo_cambio="blue")
-            
-            return {
-                'exchange_rate_blue': tasa,
-                'wallet_balance_ars': balance_ars,
-            }
+    def tasa_blue():
+        return CurrencyService.get_usdc_to_ars_rate(tipo_cambio="blue")
+    
+    def balance_ars():
+        if request.user.is_authenticated and hasattr(request.user, 'profile'):
+            wallet = getattr(request.user.profile, 'wallet', None)
+            if wallet:
+                return wallet.get_balance_ars(tipo_cambio="blue")
+        return Decimal('0.00')
     
     return {
-        'exchange_rate_blue': CurrencyService.get_usdc_to_ars_rate(tipo_cambio="blue"),
-        'wallet_balance_ars': Decimal('0.00'),
+        'exchange_rate_blue': MontoPerezoso(tasa_blue),
+        'wallet_balance_ars': MontoPerezoso(balance_ars),
     }
@@ -3,14 +3,32 @@ Servicio para obtener cotizaciones de divisas en tiempo real.
 Consume API externa para convertir USDC a ARS.
 """
 
+import bisect
+import math
+import random
 import requests
-from decimal import Decimal
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone as dt_timezone
+from decimal import ROUND_HALF_UP, Decimal
 from django.core.cache import cache
 from django.conf import settings
+from django.db import DatabaseError, connections
+from django.db.models import DecimalField, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Round
 import logging
 
+from .circuit_breaker import CircuitBreaker, CircuitoAbiertoError
+
 logger = logging.getLogger(__name__)
 
+# Tasas ya resueltas en el request actual ({tipo_cambio: snapshot}).
+# Sólo tiene valor dentro de CurrencyService.request_snapshot().
+_tasas_del_request = ContextVar("tasas_del_request", default=None)
+
 
 class CurrencyService:
     """
@@ -24,10 +42,32 @@ class CurrencyService:
     BACKUP_API_URL = "https://api.exchangerate-api.com/v4/latest/USD"
     
     CACHE_KEY = "usdc_to_ars_rate"
-    CACHE_TIMEOUT = 300  # 5 minutos
+    CACHE_TIMEOUT = 300  # 5 minutos (antigüedad máxima de una tasa "fresca")
+    
+    # La última tasa válida se conserva mucho más tiempo que su frescura,
+    # para poder servirla (con su antigüedad) mientras se revalida.
+    STALE_CACHE_TIMEOUT = 60 * 60 * 24  # 24 horas
+    
+    TIPOS_CAMBIO = ("blue", "oficial")
+    
+    # Single-flight: un solo worker consulta la API por cada vencimiento
+    LOCK_TIMEOUT = 15  # Cubre los dos timeouts de 5s (API principal + respaldo)
+    LOCK_WAIT = 10  # Espera máxima cuando no hay ninguna tasa previa
+    LOCK_POLL_INTERVAL = 0.1
+    
+    # Expiración anticipada probabilística (XFetch): cuanto más cerca del
+    # vencimiento y más lenta la API, más probable que un request refresque antes.
+    EARLY_EXPIRATION_BETA = 1.0
+    
+    # Circuit breaker por API externa y caché negativa: durante una caída
+    # se prueba la API una vez por intervalo en lugar de en cada request.
+    BREAKER_FAILURE_THRESHOLD = 3
+    BREAKER_RESET_TIMEOUT = 60
+    NEGATIVE_CACHE_TIMEOUT = 30
     
     # Tasa de respaldo en caso de fallo de API
     DEFAULT_RATE = Decimal("1000.00")
+    CENTAVOS = Decimal("0.01")
     
     @classmethod
     def get_usdc_to_ars_rate(cls, tipo_cambio="blue"):
@@ -40,52 +80,344 @@ class CurrencyService:
         Returns:
             Decimal: Tasa de conversión USDC a ARS
         """
-        # Intentar obtener de caché
-        cache_key = f"{cls.CACHE_KEY}_{tipo_cambio}"
-        cached_rate = cache.get(cache_key)
+        return cls.get_rate_snapshot(tipo_cambio)["tasa"]
+    
+    @classmethod
+    @contextmanager
+    def request_snapshot(cls):
+        """
+        Memoiza las tasas durante un request (ver ExchangeRateMiddleware).
+        
+        Dentro del bloque, la primera consulta de cada tipo de cambio lee la
+        caché y las siguientes (context processor, template tags, Wallet)
+        reutilizan el mismo valor: una sola lectura por página y todos los
+        montos calculados con la misma tasa.
+        """
+        token = _tasas_del_request.set({})
+        try:
+            yield
+        finally:
+            _tasas_del_request.reset(token)
+    
+    @classmethod
+    def get_rate_snapshot(cls, tipo_cambio="blue"):
+        """
+        Obtiene la última tasa conocida junto con su antigüedad.
+        Dentro de un request se reutiliza la tasa ya resuelta.
+        
+        Si la tasa en caché está vencida:
+        - Con CURRENCY_BACKGROUND_REFRESH activo (default), se devuelve la
+          última tasa válida tal cual y un hilo de este proceso la renueva
+          (stale-while-revalidate); el request no espera a la API. Sin
+          ninguna tasa en caché (arranque en frío) se sirve la última del
+          historial o la tasa por defecto con fresca=False.
+        - Si no, se consulta la API y, si falla, se devuelve la última tasa
+          válida conocida antes que la tasa por defecto.
+        
+        Returns:
+            dict: {
+                "tasa": Decimal,
+                "tipo": str,
+                "timestamp": datetime o None (momento en que se obtuvo),
+                "edad_segundos": int o None,
+                "fresca": bool
+            }
+        """
+        tasas_request = _tasas_del_request.get()
+        if tasas_request is not None and tipo_cambio in tasas_request:
+            return tasas_request[tipo_cambio]
+        
+        snapshot = cls._resolver_snapshot(tipo_cambio)
+        
+        if tasas_request is not None:
+            tasas_request[tipo_cambio] = snapshot
+        return snapshot
+    
+    @classmethod
+    def _resolver_snapshot(cls, tipo_cambio):
+        entrada = cls._leer_cache(tipo_cambio)
+        
+        if entrada and not cls._debe_refrescar(entrada):
+            logger.debug(f"Tasa de cambio obtenida de caché: {entrada['tasa']} ARS/USDC")
+            return cls._armar_snapshot(tipo_cambio, entrada)
+        
+        if cls.background_refresh_enabled():
+            # Stale-while-revalidate: se sirve la última tasa y otro hilo la
+            # renueva. En frío (caché vacía) tampoco se espera a la API: se usa
+            # la última del historial o la tasa por defecto, marcada como vieja
+            cls._revalidar_en_segundo_plano(tipo_cambio)
+            if entrada:
+                return cls._armar_snapshot(tipo_cambio, entrada)
+            snapshot = cls._armar_snapshot(tipo_cambio, cls._ultima_entrada_historica(tipo_cambio))
+            snapshot["fresca"] = False
+            return snapshot
+        
+        if cache.get(cls._fallo_key(tipo_cambio)):
+            # Falló hace instantes: no reintentar hasta que venza la caché negativa
+            return cls._armar_snapshot(tipo_cambio, entrada)
+        
+        lock_key = cls._lock_key(tipo_cambio)
+        token = uuid.uuid4().hex
+        
+        if cache.add(lock_key, token, cls.LOCK_TIMEOUT):
+            # Este worker es el único que consulta la API
+            entrada = cls._refrescar_con_lock(tipo_cambio, lock_key, token) or entrada
+            return cls._armar_snapshot(tipo_cambio, entrada)
+        
+        # Otro worker está refrescando: usar el valor previo o esperar su resultado
+        if not entrada:
+            entrada = cls._esperar_refresco(tipo_cambio, lock_key)
+        
+        return cls._armar_snapshot(tipo_cambio, entrada)
+    
+    @classmethod
+    def _ultima_entrada_historica(cls, tipo_cambio):
+        """Última tasa de CotizacionHistorica con el formato de la caché, o None."""
+        from .models import CotizacionHistorica
+        
+        try:
+            ultima = CotizacionHistorica.objects.filter(
+                tipo_cambio=tipo_cambio
+            ).order_by('-vigente_desde').values_list('tasa', 'vigente_desde').first()
+        except DatabaseError as e:
+            logger.warning(f"No se pudo leer el historial de cotización '{tipo_cambio}': {e}")
+            return None
+        
+        if ultima is None:
+            return None
+        tasa, vigente_desde = ultima
+        return {"tasa": str(tasa), "obtenida_en": vigente_desde.timestamp(), "duracion": 0}
+    
+    @classmethod
+    def _revalidar_en_segundo_plano(cls, tipo_cambio):
+        """
+        Renueva la tasa en un hilo daemon. El lock de single-flight evita que
+        varios requests (o workers, con caché compartida) lancen el mismo
+        refresco, y la caché negativa espacia los reintentos si la API cae.
+        """
+        if cache.get(cls._fallo_key(tipo_cambio)):
+            return
         
-        if cached_rate:
-            logger.info(f"Tasa de cambio obtenida de caché: {cached_rate} ARS/USDC")
-            return Decimal(str(cached_rate))
+        lock_key = cls._lock_key(tipo_cambio)
+        token = uuid.uuid4().hex
+        if not cache.add(lock_key, token, cls.LOCK_TIMEOUT):
+            return
         
-        # Obtener de API
+        threading.Thread(
+            target=cls._refrescar_en_hilo,
+            args=(tipo_cambio, lock_key, token),
+            name=f"cotizacion-{tipo_cambio}",
+            daemon=True,
+        ).start()
+    
+    @classmethod
+    def _refrescar_en_hilo(cls, tipo_cambio, lock_key, token):
         try:
-            rate = cls._fetch_rate_from_api(tipo_cambio)
-            
-            # Guardar en caché
-            cache.set(cache_key, float(rate), cls.CACHE_TIMEOUT)
-            logger.info(f"Tasa de cambio obtenida de API: {rate} ARS/USDC")
-            
-            return rate
-            
+            cls._refrescar_con_lock(tipo_cambio, lock_key, token)
+        finally:
+            # El historial abre una conexión propia del hilo
+            connections.close_all()
+    
+    @classmethod
+    def _refrescar_con_lock(cls, tipo_cambio, lock_key, token):
+        """
+        Consulta la API con el lock tomado y lo libera al terminar.
+        Retorna la entrada nueva o None si falló (queda en la caché negativa).
+        """
+        try:
+            return cls.refresh_rate(tipo_cambio)
         except Exception as e:
             logger.error(f"Error al obtener tasa de cambio: {e}")
-            return cls.DEFAULT_RATE
+            cache.set(
+                cls._fallo_key(tipo_cambio),
+                time.time(),
+                cls._setting("CURRENCY_NEGATIVE_CACHE_TIMEOUT", cls.NEGATIVE_CACHE_TIMEOUT),
+            )
+            return None
+        finally:
+            if cache.get(lock_key) == token:
+                cache.delete(lock_key)
+    
+    @classmethod
+    def refresh_rate(cls, tipo_cambio="blue"):
+        """
+        Consulta la API y guarda la tasa como última tasa válida conocida.
+        Lanza excepción si ninguna API responde (la tasa anterior se conserva).
+        
+        Returns:
+            dict: Entrada guardada en caché {"tasa": str, "obtenida_en": float, "duracion": float}
+        """
+        inicio = time.time()
+        rate = cls._fetch_rate_from_api(tipo_cambio)
+        fin = time.time()
+        
+        entrada = {
+            "tasa": str(rate),
+            "obtenida_en": fin,
+            "duracion": fin - inicio,  # Costo de recálculo, usado por XFetch
+        }
+        cache.set(cls._cache_key(tipo_cambio), entrada, cls.STALE_CACHE_TIMEOUT)
+        logger.info(f"Tasa de cambio obtenida de API: {rate} ARS/USDC ({tipo_cambio})")
+        
+        cls._registrar_historial(tipo_cambio, rate)
+        
+        return entrada
+    
+    @classmethod
+    def _registrar_historial(cls, tipo_cambio, rate):
+        """Guarda la tasa en CotizacionHistorica; un error de base no invalida la caché."""
+        from .models import CotizacionHistorica
+        
+        try:
+            CotizacionHistorica.registrar(tipo_cambio, Decimal(rate).quantize(cls.CENTAVOS))
+        except DatabaseError as e:
+            logger.warning(f"No se pudo guardar el historial de cotización '{tipo_cambio}': {e}")
+    
+    @classmethod
+    def refresh_rates(cls):
+        """
+        Actualiza todas las cotizaciones (blue y oficial).
+        Pensado para ejecutarse periódicamente fuera del ciclo de request.
+        
+        Returns:
+            dict: {tipo_cambio: Decimal o None si falló}
+        """
+        resultados = {}
+        for tipo_cambio in cls.TIPOS_CAMBIO:
+            try:
+                entrada = cls.refresh_rate(tipo_cambio)
+                resultados[tipo_cambio] = Decimal(entrada["tasa"])
+            except Exception as e:
+                logger.error(f"No se pudo actualizar la tasa '{tipo_cambio}': {e}")
+                resultados[tipo_cambio] = None
+        return resultados
+    
+    @classmethod
+    def breakers(cls):
+        """
+        Circuit breakers de las APIs externas.
+        
+        Returns:
+            dict: {"dolarapi": CircuitBreaker, "exchangerate": CircuitBreaker}
+        """
+        umbral = cls._setting("CURRENCY_BREAKER_FAILURE_THRESHOLD", cls.BREAKER_FAILURE_THRESHOLD)
+        reapertura = cls._setting("CURRENCY_BREAKER_RESET_TIMEOUT", cls.BREAKER_RESET_TIMEOUT)
+        return {
+            nombre: CircuitBreaker(nombre, umbral, reapertura)
+            for nombre in ("dolarapi", "exchangerate")
+        }
+    
+    @classmethod
+    def get_breaker_metrics(cls):
+        """
+        Estado de los circuit breakers y de la caché negativa, para monitoreo.
+        
+        Returns:
+            dict: {"apis": {nombre: metricas}, "fallo_reciente": {tipo_cambio: bool}}
+        """
+        return {
+            "apis": {nombre: breaker.metricas() for nombre, breaker in cls.breakers().items()},
+            "fallo_reciente": {
+                tipo_cambio: bool(cache.get(cls._fallo_key(tipo_cambio)))
+                for tipo_cambio in cls.TIPOS_CAMBIO
+            },
+        }
+    
+    @staticmethod
+    def _setting(nombre, default):
+        return getattr(settings, nombre, default)
+    
+    @classmethod
+    def background_refresh_enabled(cls):
+        """Indica si las tasas vencidas se sirven mientras se renuevan en segundo plano."""
+        return getattr(settings, "CURRENCY_BACKGROUND_REFRESH", True)
+    
+    @classmethod
+    def _cache_key(cls, tipo_cambio):
+        return f"{cls.CACHE_KEY}_{tipo_cambio}"
+    
+    @classmethod
+    def _lock_key(cls, tipo_cambio):
+        return f"{cls._cache_key(tipo_cambio)}_lock"
+    
+    @classmethod
+    def _fallo_key(cls, tipo_cambio):
+        return f"{cls._cache_key(tipo_cambio)}_fallo"
+    
+    @classmethod
+    def _leer_cache(cls, tipo_cambio):
+        """Retorna la última entrada válida en caché o None."""
+        entrada = cache.get(cls._cache_key(tipo_cambio))
+        if isinstance(entrada, dict) and "tasa" in entrada:
+            return entrada
+        return None
+    
+    @staticmethod
+    def _edad(entrada):
+        return time.time() - entrada["obtenida_en"]
+    
+    @classmethod
+    def _debe_refrescar(cls, entrada):
+        """
+        Decide si la entrada debe recalcularse (XFetch).
+        Vencida siempre se refresca; antes de vencer, se adelanta con una
+        probabilidad que crece al acercarse al vencimiento, de modo que la
+        clave nunca expira para todos los workers al mismo tiempo.
+        """
+        duracion = entrada.get("duracion", 0)
+        adelanto = -duracion * cls.EARLY_EXPIRATION_BETA * math.log(1.0 - random.random())
+        return cls._edad(entrada) + adelanto >= cls.CACHE_TIMEOUT
+    
+    @classmethod
+    def _esperar_refresco(cls, tipo_cambio, lock_key):
+        """
+        Espera a que el worker que tiene el lock termine de consultar la API.
+        Retorna la entrada nueva o None si no llegó a tiempo.
+        """
+        limite = time.time() + cls.LOCK_WAIT
+        while time.time() < limite:
+            time.sleep(cls.LOCK_POLL_INTERVAL)
+            entrada = cls._leer_cache(tipo_cambio)
+            if entrada:
+                return entrada
+            if cache.get(lock_key) is None:
+                # El otro worker terminó sin obtener tasa
+                break
+        return None
+    
+    @classmethod
+    def _armar_snapshot(cls, tipo_cambio, entrada):
+        if entrada is None:
+            return {
+                "tasa": cls.DEFAULT_RATE,
+                "tipo": tipo_cambio,
+                "timestamp": None,
+                "edad_segundos": None,
+                "fresca": False,
+            }
+        
+        edad = cls._edad(entrada)
+        return {
+            "tasa": Decimal(entrada["tasa"]),
+            "tipo": tipo_cambio,
+            "timestamp": datetime.fromtimestamp(entrada["obtenida_en"], tz=dt_timezone.utc),
+            "edad_segundos": int(edad),
+            "fresca": edad < cls.CACHE_TIMEOUT,
+        }
     
     @classmethod
     def _fetch_rate_from_api(cls, tipo_cambio="blue"):
         """
         Obtiene la tasa desde la API de DolarAPI.
         Usa dólar blue por defecto (más relevante para crypto).
+        Con el circuito abierto se pasa directo a la API de respaldo.
         """
         try:
-            # Seleccionar URL según tipo de cambio
-            url = cls.DOLAR_API_URL if tipo_cambio == "blue" else cls.DOLAR_API_OFICIAL_URL
-            
-            response = requests.get(url, timeout=5)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            # DolarAPI retorna { "venta": 1050.0, "compra": 1030.0 }
-            # Usamos el precio de venta (lo que pagarías por 1 USD)
-            tasa = Decimal(str(data.get("venta", data.get("compra", cls.DEFAULT_RATE))))
-            
-            if tasa <= 0:
-                raise ValueError("Tasa inválida recibida de la API")
-            
-            return tasa
-            
+            return cls.breakers()["dolarapi"].llamar(cls._consultar_dolarapi, tipo_cambio)
+        
+        except CircuitoAbiertoError:
+            logger.debug("Circuito de DolarAPI abierto, usando API de respaldo")
+            return cls._fetch_from_backup_api()
         except requests.RequestException as e:
             logger.warning(f"Error en DolarAPI, intentando API de respaldo: {e}")
             return cls._fetch_from_backup_api()
@@ -93,26 +425,57 @@ class CurrencyService:
             logger.error(f"Error al parsear respuesta de API: {e}")
             return cls._fetch_from_backup_api()
     
+    @classmethod
+    def _consultar_dolarapi(cls, tipo_cambio):
+        # Seleccionar URL según tipo de cambio
+        url = cls.DOLAR_API_URL if tipo_cambio == "blue" else cls.DOLAR_API_OFICIAL_URL
+        
+        response = requests.get(url, timeout=5)
+        response.raise_for_status()
+        
+        data = response.json()
+        
+        # DolarAPI retorna { "venta": 1050.0, "compra": 1030.0 }
+        # Usamos el precio de venta (lo que pagarías por 1 USD)
+        valor = data.get("venta", data.get("compra"))
+        if valor is None:
+            raise KeyError("venta")
+        tasa = Decimal(str(valor))
+        
+        if tasa <= 0:
+            raise ValueError("Tasa inválida recibida de la API")
+        
+        return tasa
+    
     @classmethod
     def _fetch_from_backup_api(cls):
         """
         API de respaldo usando ExchangeRate-API.
         """
         try:
-            response = requests.get(cls.BACKUP_API_URL, timeout=5)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            # Esta API retorna rates["ARS"] que es cuántos ARS por 1 USD
-            usd_to_ars = Decimal(str(data["rates"]["ARS"]))
-            
+            usd_to_ars = cls.breakers()["exchangerate"].llamar(cls._consultar_exchangerate)
             logger.info(f"Tasa obtenida de API de respaldo: {usd_to_ars}")
             return usd_to_ars
             
         except Exception as e:
-            logger.error(f"Error en API de respaldo: {e}, usando tasa por defecto")
-            return cls.DEFAULT_RATE
+            # Se propaga para no confundir la tasa por defecto con una tasa válida
+            logger.error(f"Error en API de respaldo: {e}")
+            raise
+    
+    @classmethod
+    def _consultar_exchangerate(cls):
+        response = requests.get(cls.BACKUP_API_URL, timeout=5)
+        response.raise_for_status()
+        
+        data = response.json()
+        
+        # Esta API retorna rates["ARS"] que es cuántos ARS por 1 USD
+        usd_to_ars = Decimal(str(data["rates"]["ARS"]))
+        
+        if usd_to_ars <= 0:
+            raise ValueError("Tasa inválida recibida de la API de respaldo")
+        
+        return usd_to_ars
     
     @classmethod
     def convert_usdc_to_ars(cls, monto_usdc, tipo_cambio="blue"):
@@ -129,10 +492,7 @@ class CurrencyService:
         if not monto_usdc:
             return Decimal("0.00")
         
-        monto = Decimal(str(monto_usdc))
-        tasa = cls.get_usdc_to_ars_rate(tipo_cambio)
-        
-        return (monto * tasa).quantize(Decimal("0.01"))
+        return cls.convert_many_usdc_to_ars([monto_usdc], tipo_cambio)[0]
     
     @classmethod
     def convert_ars_to_usdc(cls, monto_ars, tipo_cambio="blue"):
@@ -149,13 +509,159 @@ class CurrencyService:
         if not monto_ars:
             return Decimal("0.00")
         
-        monto = Decimal(str(monto_ars))
-        tasa = cls.get_usdc_to_ars_rate(tipo_cambio)
+        return cls.convert_many_ars_to_usdc([monto_ars], tipo_cambio)[0]
+    
+    @classmethod
+    def convert_many_usdc_to_ars(cls, montos_usdc, tipo_cambio="blue", tasa=None):
+        """
+        Convierte una serie de montos USDC a ARS con una única tasa.
+        
+        La tasa se resuelve una sola vez (o se usa la recibida), por lo que
+        todos los montos de un listado o export quedan convertidos con el
+        mismo valor y sin una lectura de caché por fila.
+        
+        Args:
+            montos_usdc: Iterable de Decimal/float/str (None cuenta como 0)
+            tipo_cambio: "blue" o "oficial"
+            tasa: Decimal opcional (p. ej. de get_rate_snapshot)
+        
+        Returns:
+            list[Decimal]: Montos en ARS, en el mismo orden
+        """
+        if tasa is None:
+            tasa = cls.get_usdc_to_ars_rate(tipo_cambio)
+        
+        # Mitad hacia arriba, como ROUND() en la base (usdc_to_ars_expression)
+        a_decimal = cls._a_decimal
+        centavos = cls.CENTAVOS
+        return [(a_decimal(monto) * tasa).quantize(centavos, rounding=ROUND_HALF_UP) for monto in montos_usdc]
+    
+    @classmethod
+    def convert_many_ars_to_usdc(cls, montos_ars, tipo_cambio="blue", tasa=None):
+        """
+        Convierte una serie de montos ARS a USDC con una única tasa.
+        
+        Returns:
+            list[Decimal]: Montos en USDC, en el mismo orden
+        """
+        if tasa is None:
+            tasa = cls.get_usdc_to_ars_rate(tipo_cambio)
         
         if tasa == 0:
+            return [Decimal("0.00") for _ in montos_ars]
+        
+        a_decimal = cls._a_decimal
+        centavos = cls.CENTAVOS
+        return [(a_decimal(monto) / tasa).quantize(centavos, rounding=ROUND_HALF_UP) for monto in montos_ars]
+    
+    @classmethod
+    def usdc_to_ars_expression(cls, campo, tipo_cambio="blue", tasa=None):
+        """
+        Expresión ORM que convierte una columna USDC a ARS en la base de datos.
+        
+        Uso:
+            Wallet.objects.annotate(
+                balance_ars=CurrencyService.usdc_to_ars_expression('balance_usdc')
+            )
+        """
+        if tasa is None:
+            tasa = cls.get_usdc_to_ars_rate(tipo_cambio)
+        
+        return Round(
+            F(campo) * Value(tasa, output_field=DecimalField(max_digits=16, decimal_places=6)),
+            2,
+            output_field=DecimalField(max_digits=20, decimal_places=2),
+        )
+    
+    @classmethod
+    def annotate_ars(cls, queryset, campo="balance_usdc", alias="balance_ars", tipo_cambio="blue", tasa=None):
+        """
+        Anota en el queryset el equivalente ARS de la columna `campo`.
+        
+        Returns:
+            QuerySet: con el atributo `alias` en cada fila
+        """
+        return queryset.annotate(**{
+            alias: cls.usdc_to_ars_expression(campo, tipo_cambio, tasa)
+        })
+    
+    @staticmethod
+    def _a_decimal(monto):
+        if isinstance(monto, Decimal):
+            return monto
+        if not monto:
             return Decimal("0.00")
+        return Decimal(str(monto))
+    
+    @classmethod
+    def get_rate_at(cls, fecha, tipo_cambio="blue", usar_tasa_actual=True):
+        """
+        Tasa vigente en un momento dado según CotizacionHistorica.
         
-        return (monto / tasa).quantize(Decimal("0.01"))
+        Dentro de un request (request_snapshot) el historial se carga una sola
+        vez y las consultas siguientes se resuelven con bisect en memoria;
+        fuera de él cada consulta es una búsqueda por índice.
+        Sin historial se usa la tasa actual (o None con usar_tasa_actual=False,
+        para no depender de la API).
+        """
+        from .models import CotizacionHistorica
+        
+        tasas_request = _tasas_del_request.get()
+        if tasas_request is not None:
+            clave = ("historial", tipo_cambio)
+            if clave not in tasas_request:
+                tasas_request[clave] = cls.get_rate_history(tipo_cambio)
+            tasa = tasas_request[clave].tasa_en(fecha)
+        else:
+            tasa = CotizacionHistorica.tasa_en(fecha, tipo_cambio)
+        
+        if tasa is None and usar_tasa_actual:
+            tasa = cls.get_usdc_to_ars_rate(tipo_cambio)
+        return tasa
+    
+    @classmethod
+    def get_rate_history(cls, tipo_cambio="blue", desde=None, hasta=None):
+        """
+        Carga el historial (o un rango) para conversiones masivas en memoria.
+        
+        Se incluye la última fila anterior a `desde` para que los montos del
+        inicio del rango tengan tasa.
+        
+        Returns:
+            HistorialCotizaciones
+        """
+        from .models import CotizacionHistorica
+        
+        filas = CotizacionHistorica.objects.filter(tipo_cambio=tipo_cambio)
+        if hasta is not None:
+            filas = filas.filter(vigente_desde__lte=hasta)
+        if desde is not None:
+            inicio = filas.filter(vigente_desde__lte=desde).order_by('-vigente_desde').values_list('vigente_desde', flat=True).first()
+            if inicio is not None:
+                filas = filas.filter(vigente_desde__gte=inicio)
+        
+        return HistorialCotizaciones(filas.order_by('vigente_desde').values_list('vigente_desde', 'tasa'))
+    
+    @classmethod
+    def rate_at_expression(cls, campo_fecha, tipo_cambio="blue"):
+        """
+        Expresión ORM con la tasa vigente en la fecha de cada fila.
+        
+        Uso:
+            Bid.objects.annotate(tasa=CurrencyService.rate_at_expression('created_at'))
+        """
+        from .models import CotizacionHistorica
+        
+        tasa_historica = CotizacionHistorica.objects.filter(
+            tipo_cambio=tipo_cambio,
+            vigente_desde__lte=OuterRef(campo_fecha),
+        ).order_by('-vigente_desde').values('tasa')[:1]
+        
+        return Coalesce(
+            Subquery(tasa_historica),
+            Value(cls.get_usdc_to_ars_rate(tipo_cambio)),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        )
     
     @classmethod
     def get_rate_info(cls, tipo_cambio="blue"):
@@ -166,16 +672,17 @@ class CurrencyService:
             dict: {
                 "tasa": Decimal,
                 "tipo": str ("blue" o "oficial"),
-                "timestamp": datetime
+                "timestamp": datetime (momento en que se obtuvo la tasa),
+                "edad_segundos": int o None,
+                "fresca": bool
             }
         """
         from django.utils import timezone
         
-        return {
-            "tasa": cls.get_usdc_to_ars_rate(tipo_cambio),
-            "tipo": tipo_cambio,
-            "timestamp": timezone.now()
-        }
+        info = dict(cls.get_rate_snapshot(tipo_cambio))
+        if info["timestamp"] is None:
+            info["timestamp"] = timezone.now()
+        return info
     
     @classmethod
     def clear_cache(cls):
@@ -183,6 +690,34 @@ class CurrencyService:
         Limpia el caché de tasas de cambio.
         Útil para forzar actualización.
         """
-        cache.delete(f"{cls.CACHE_KEY}_blue")
-        cache.delete(f"{cls.CACHE_KEY}_oficial")
+        for tipo_cambio in cls.TIPOS_CAMBIO:
+            cache.delete(cls._cache_key(tipo_cambio))
+            cache.delete(cls._fallo_key(tipo_cambio))
         logger.info("Caché de tasas de cambio limpiado")
+
+
+class HistorialCotizaciones:
+    """
+    Serie de cotizaciones ordenada por fecha, con búsqueda O(log n).
+    
+    Uso:
+        historial = CurrencyService.get_rate_history("blue", desde=inicio_mes)
+        for monto_ars, fecha in filas:
+            total += monto_ars / historial.tasa_en(fecha)
+    """
+    
+    def __init__(self, filas):
+        filas = list(filas)
+        self.fechas = [fecha for fecha, _ in filas]
+        self.tasas = [tasa for _, tasa in filas]
+    
+    def __len__(self):
+        return len(self.fechas)
+    
+    def tasa_en(self, fecha):
+        """Tasa vigente en `fecha`; la primera si es anterior al historial, None si está vacío."""
+        if not self.fechas:
+            return None
+        
+        posicion = bisect.bisect_right(self.fechas, fecha) - 1
+        return self.tasas[max(posicion, 0)]
@@ -0,0 +1,113 @@
+"""
+Idempotencia para los POST que mueven dinero (votar propuesta, aceptar bid,
+confirmar inicio, finalizar obra, cargar fondos).
+
+La clave se toma del header `Idempotency-Key` o del campo oculto
+`idempotency_key` (tag {% idempotency_field %}). Si el request no trae
+ninguna se deriva de usuario + ruta + datos del POST y vale por una ventana
+corta (IDEMPOTENCY_WINDOW), lo que cubre el doble click en formularios viejos.
+
+El primer request reserva la clave (IdempotencyKey) y ejecuta la vista; los
+reintentos reciben la respuesta guardada (redirección, o código, cuerpo y
+content type) sin volver a tocar wallets ni escrow. Si la vista falla, la reserva se borra y se puede reintentar.
+"""
+
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.http import HttpResponse, HttpResponseRedirect
+from django.utils.http import url_has_allowed_host_and_scheme
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_FIELD = 'idempotency_key'
+
+# Campos que no forman parte de la huella del request
+CAMPOS_IGNORADOS = {'csrfmiddlewaretoken', IDEMPOTENCY_FIELD}
+
+
+def idempotente(vista):
+    """
+    Decorador para vistas POST con efectos sobre saldos.
+    Debe ir debajo de @login_required.
+    """
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        if request.method != 'POST' or not request.user.is_authenticated:
+            return vista(request, *args, **kwargs)
+
+        huella = _huella(request)
+        clave_enviada = request.headers.get(IDEMPOTENCY_HEADER) or request.POST.get(IDEMPOTENCY_FIELD)
+        if clave_enviada:
+            vigencia = settings.IDEMPOTENCY_KEY_TTL
+        else:
+            # Derivada: la misma clave para cada envío idéntico, vigente
+            # IDEMPOTENCY_WINDOW segundos desde el que se ejecutó (ventana
+            # deslizante: dos clicks seguidos nunca caen en franjas distintas)
+            vigencia = settings.IDEMPOTENCY_WINDOW
+            clave_enviada = f"auto:{huella}"
+
+        clave = _sha256(f"{request.user.pk}|{vista.__module__}.{vista.__name__}|{clave_enviada}")
+        registro, es_nuevo = IdempotencyKey.reclamar(clave, huella, vigencia)
+
+        if not es_nuevo:
+            return _repetir(request, registro, huella)
+
+        try:
+            respuesta = vista(request, *args, **kwargs)
+        except Exception:
+            registro.liberar()
+            raise
+
+        if respuesta.status_code >= 500:
+            registro.liberar()
+        else:
+            registro.guardar_respuesta(respuesta)
+        return respuesta
+
+    return envoltura
+
+
+def _repetir(request, registro, huella):
+    """Respuesta para un request cuya clave ya fue usada."""
+    if registro.huella != huella:
+        return HttpResponse(
+            'La clave de idempotencia ya se usó con otros datos.',
+            status=422,
+            content_type='text/plain; charset=utf-8'
+        )
+
+    if registro.status_code is None:
+        messages.info(request, 'La operación ya se está procesando.')
+        volver = request.META.get('HTTP_REFERER', '')
+        if url_has_allowed_host_and_scheme(volver, allowed_hosts={request.get_host()}, require_https=request.is_secure()):
+            return HttpResponseRedirect(volver)
+        return HttpResponse('La operación ya se está procesando.', status=409, content_type='text/plain; charset=utf-8')
+
+    messages.info(request, 'Esta operación ya fue procesada.')
+    if registro.location:
+        return HttpResponseRedirect(registro.location)
+    if registro.content_type:
+        return HttpResponse(bytes(registro.contenido), status=registro.status_code, content_type=registro.content_type)
+    # Respuesta sin cuerpo guardado (streaming o demasiado grande)
+    return HttpResponse(
+        'Esta operación ya fue procesada.',
+        status=registro.status_code,
+        content_type='text/plain; charset=utf-8'
+    )
+
+
+def _huella(request):
+    datos = sorted(
+        (campo, valores)
+        for campo, valores in request.POST.lists()
+        if campo not in CAMPOS_IGNORADOS
+    )
+    return _sha256(f"{request.path}|{datos!r}")
+
+
+def _sha256(texto):
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
@@ -0,0 +1,265 @@
+"""
+Libro mayor de partida doble detrás de los saldos de las wallets.
+
+Cada movimiento de dinero:
+1. Actualiza la proyección materializada (Wallet.balance_usdc) con UPDATEs
+   condicionales (ver Wallet.restar_saldo / sumar_saldo).
+2. Inserta en un solo bulk_create los asientos balanceados (débito y
+   crédito) en LedgerEntry, que nunca se modifican ni se borran.
+
+Los checkpoints (LedgerCheckpoint, comando `generar_checkpoints_ledger`)
+permiten calcular el saldo de una wallet en cualquier momento sin recorrer
+todo su historial: último checkpoint + un rango corto de asientos.
+
+La conciliación (comando `conciliar_wallets`) compara la proyección con el
+libro mayor para todas las wallets con dos consultas agrupadas.
+"""
+
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction as db_transaction
+from django.db.models import Max, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+from .models import LedgerCheckpoint, LedgerEntry, SaldoInsuficienteError, Wallet
+
+# Los asientos más nuevos que esto se dejan para la próxima corrida: un ID
+# menor todavía sin confirmar no queda salteado por la marca de agua
+MARGEN_SEGUNDOS = 60
+
+
+def transferir(origen, destino, monto, tipo='TRANSFERENCIA', referencia=''):
+    """
+    Mueve `monto` de `origen` a `destino` y registra los asientos.
+    origen/destino None representa la cuenta externa (no tiene saldo propio).
+
+    Raises:
+        SaldoInsuficienteError: si el origen no tiene saldo (no se modifica nada)
+
+    Returns:
+        uuid.UUID o None: identificador del movimiento (None si no hubo movimiento)
+    """
+    monto = Decimal(str(monto))
+    if origen is not None and destino is not None and origen.pk == destino.pk:
+        return None
+
+    with db_transaction.atomic():
+        if origen is not None and not origen.restar_saldo(monto):
+            raise SaldoInsuficienteError(f"Saldo insuficiente en la wallet {origen.pk} para debitar {monto} USDC")
+        if destino is not None:
+            destino.sumar_saldo(monto)
+
+        return registrar_asientos(origen, destino, monto, tipo, referencia)
+
+
+def registrar_asientos(origen, destino, monto, tipo, referencia=''):
+    """
+    Inserta el par de asientos de un movimiento ya aplicado a los saldos.
+    Debe llamarse dentro de la misma transacción que actualizó los saldos.
+    """
+    movimiento = uuid.uuid4()
+    fecha = timezone.now()
+
+    LedgerEntry.objects.bulk_create([
+        LedgerEntry(
+            movimiento=movimiento,
+            wallet=origen,
+            monto_usdc=-monto,
+            tipo=tipo,
+            referencia=referencia,
+            fecha=fecha,
+        ),
+        LedgerEntry(
+            movimiento=movimiento,
+            wallet=destino,
+            monto_usdc=monto,
+            tipo=tipo,
+            referencia=referencia,
+            fecha=fecha,
+        ),
+    ])
+    return movimiento
+
+
+def saldo_en(wallet, fecha=None):
+    """
+    Saldo de una wallet en `fecha` (por defecto, ahora) según el libro mayor.
+    Usa el último checkpoint anterior a `fecha` y suma los asientos siguientes.
+    """
+    fecha = fecha or timezone.now()
+
+    checkpoint = LedgerCheckpoint.objects.filter(
+        wallet=wallet,
+        fecha__lte=fecha
+    ).order_by('-hasta_asiento_id').first()
+
+    asientos = LedgerEntry.objects.filter(wallet=wallet, fecha__lte=fecha)
+    saldo = Decimal('0.00')
+    if checkpoint:
+        asientos = asientos.filter(id__gt=checkpoint.hasta_asiento_id)
+        saldo = checkpoint.saldo_usdc
+
+    return saldo + (asientos.aggregate(total=Sum('monto_usdc'))['total'] or Decimal('0.00'))
+
+
+def marca_de_agua():
+    """
+    Último asiento que una corrida puede dar por cerrado: el mayor ID con más
+    de MARGEN_SEGUNDOS de antigüedad. Recorre la PK desde el final, así que
+    sólo lee los asientos del margen.
+
+    Returns:
+        int o None: ID del asiento (None si todavía no hay ninguno)
+    """
+    limite = timezone.now() - timedelta(seconds=MARGEN_SEGUNDOS)
+    return LedgerEntry.objects.filter(fecha__lte=limite).order_by('-id').values_list('id', flat=True).first()
+
+
+def generar_checkpoints():
+    """
+    Crea un checkpoint por cada wallet con asientos nuevos desde el corte anterior.
+
+    Todos los checkpoints de una corrida comparten el mismo hasta_asiento_id,
+    que funciona como marca de agua para la corrida siguiente (ver marca_de_agua).
+
+    Returns:
+        int: cantidad de checkpoints creados
+    """
+    hasta = marca_de_agua()
+    if hasta is None:
+        return 0
+    desde = LedgerCheckpoint.objects.aggregate(ultimo=Max('hasta_asiento_id'))['ultimo'] or 0
+    if hasta <= desde:
+        return 0
+
+    nuevos = LedgerEntry.objects.filter(
+        wallet__isnull=False,
+        id__gt=desde,
+        id__lte=hasta
+    ).order_by().values('wallet').annotate(
+        total=Sum('monto_usdc'),
+        ultima_fecha=Max('fecha')
+    )
+    nuevos = {fila['wallet']: fila for fila in nuevos}
+
+    # Último checkpoint de cada wallet (puede ser de una corrida anterior a `desde`)
+    ultimo_corte = LedgerCheckpoint.objects.filter(
+        wallet=OuterRef('wallet')
+    ).order_by('-hasta_asiento_id').values('hasta_asiento_id')[:1]
+    saldos_previos = dict(
+        LedgerCheckpoint.objects.filter(
+            wallet_id__in=nuevos.keys(),
+            hasta_asiento_id=Subquery(ultimo_corte)
+        ).values_list('wallet_id', 'saldo_usdc')
+    )
+
+    LedgerCheckpoint.objects.bulk_create([
+        LedgerCheckpoint(
+            wallet_id=wallet_id,
+            saldo_usdc=saldos_previos.get(wallet_id, Decimal('0.00')) + fila['total'],
+            hasta_asiento_id=hasta,
+            fecha=fila['ultima_fecha'],
+        )
+        for wallet_id, fila in nuevos.items()
+    ])
+    return len(nuevos)
+
+
+def wallets_a_conciliar(desde=None, hasta=None):
+    """
+    Wallets a revisar en una conciliación.
+
+    Args:
+        desde: ConciliacionLedger anterior. Si se pasa, sólo se incluyen las
+               wallets con asientos posteriores a su marca de agua o con el
+               saldo modificado desde su inicio (cambios fuera del libro mayor)
+        hasta: último asiento a considerar
+    """
+    wallets = Wallet.objects.order_by('pk')
+    if desde is None:
+        return wallets
+
+    asientos = LedgerEntry.objects.filter(id__gt=desde.hasta_asiento_id, wallet__isnull=False)
+    if hasta is not None:
+        asientos = asientos.filter(id__lte=hasta)
+    return wallets.filter(
+        Q(pk__in=asientos.values('wallet')) |
+        Q(fecha_actualizacion__gte=desde.fecha_inicio)
+    )
+
+
+def conciliar(wallets, hasta):
+    """
+    Compara balance_usdc con el saldo según el libro mayor hasta el asiento `hasta`.
+
+    El saldo esperado es el último checkpoint de cada wallet más la suma de
+    los asientos posteriores al último corte, calculada con un único
+    aggregate agrupado por wallet. Las diferencias se vuelven a verificar
+    con la wallet bloqueada, para descartar movimientos concurrentes a la corrida.
+
+    Yields:
+        dict: {"wallet_id", "cuenta", "balance_usdc", "saldo_ledger", "diferencia"}
+    """
+    corte = LedgerCheckpoint.objects.filter(
+        hasta_asiento_id__lte=hasta
+    ).aggregate(ultimo=Max('hasta_asiento_id'))['ultimo'] or 0
+    ids = wallets.values('pk')
+
+    ultimo_corte = LedgerCheckpoint.objects.filter(
+        wallet=OuterRef('wallet'),
+        hasta_asiento_id__lte=corte
+    ).order_by('-hasta_asiento_id').values('hasta_asiento_id')[:1]
+    saldos_corte = dict(
+        LedgerCheckpoint.objects.filter(
+            wallet_id__in=ids,
+            hasta_asiento_id=Subquery(ultimo_corte)
+        ).values_list('wallet_id', 'saldo_usdc')
+    )
+
+    movimientos = dict(
+        LedgerEntry.objects.filter(
+            wallet_id__in=ids,
+            id__gt=corte,
+            id__lte=hasta
+        ).order_by().values('wallet').annotate(
+            total=Sum('monto_usdc')
+        ).values_list('wallet', 'total')
+    )
+
+    filas = wallets.values_list('pk', 'nombre_cuenta', 'user__username', 'balance_usdc')
+    for wallet_id, nombre_cuenta, username, balance in filas.iterator(chunk_size=2000):
+        esperado = saldos_corte.get(wallet_id, Decimal('0.00')) + movimientos.get(wallet_id, Decimal('0.00'))
+        if balance == esperado:
+            continue
+
+        diferencia = _verificar_diferencia(wallet_id)
+        if diferencia is None:
+            continue
+
+        balance, esperado = diferencia
+        yield {
+            'wallet_id': wallet_id,
+            'cuenta': username or nombre_cuenta,
+            'balance_usdc': balance,
+            'saldo_ledger': esperado,
+            'diferencia': balance - esperado,
+        }
+
+
+def _verificar_diferencia(wallet_id):
+    """
+    Recalcula una diferencia con la wallet bloqueada.
+
+    Returns:
+        tuple: (balance_usdc, saldo_ledger) o None si ya coinciden
+    """
+    with db_transaction.atomic():
+        wallet = Wallet.objects.select_for_update().filter(pk=wallet_id).first()
+        if wallet is None:
+            return None
+        esperado = saldo_en(wallet)
+        if wallet.balance_usdc == esperado:
+            return None
+        return wallet.balance_usdc, esperado
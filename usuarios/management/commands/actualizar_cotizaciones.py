@@ -0,0 +1,62 @@
+"""
+Actualiza periódicamente las cotizaciones USDC/ARS fuera del ciclo de request.
+
+Uso:
+    python manage.py actualizar_cotizaciones              # Loop cada CURRENCY_REFRESH_INTERVAL segundos
+    python manage.py actualizar_cotizaciones --una-vez    # Una sola actualización (cron)
+
+El comando escribe en la caché que leen los workers web, así que requiere
+una caché compartida entre procesos (CACHE_COMPARTIDA, ver CACHE_BACKEND en
+settings): con LocMemCache cada proceso tiene la suya y el comando no la
+alcanza. Sin caché compartida cada worker renueva sus tasas en un hilo
+propio (CURRENCY_BACKGROUND_REFRESH) y este comando no hace falta.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from usuarios.currency_service import CurrencyService
+
+
+class Command(BaseCommand):
+    help = 'Actualiza las cotizaciones USDC/ARS (blue y oficial) en segundo plano.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Actualiza una sola vez y termina.',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=int,
+            default=getattr(settings, 'CURRENCY_REFRESH_INTERVAL', CurrencyService.CACHE_TIMEOUT),
+            help='Segundos entre actualizaciones (default: CURRENCY_REFRESH_INTERVAL).',
+        )
+
+    def handle(self, *args, **options):
+        if not settings.CACHE_COMPARTIDA:
+            raise CommandError(
+                f'{settings.CACHES["default"]["BACKEND"]} no se comparte con los workers web: '
+                'configurar CACHE_BACKEND con una caché compartida (p. ej. Redis).'
+            )
+
+        intervalo = max(options['intervalo'], 1)
+
+        while True:
+            resultados = CurrencyService.refresh_rates()
+
+            for tipo_cambio, tasa in resultados.items():
+                if tasa is None:
+                    self.stderr.write(self.style.ERROR(
+                        f'✗ {tipo_cambio}: no se pudo actualizar, se mantiene la última tasa conocida'
+                    ))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f'✓ {tipo_cambio}: {tasa} ARS/USDC'))
+
+            if options['una_vez']:
+                break
+
+            time.sleep(intervalo)
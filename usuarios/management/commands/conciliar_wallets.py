@@ -0,0 +1,85 @@
+"""
+Concilia los saldos de las wallets contra el libro mayor.
+
+Uso:
+    python manage.py conciliar_wallets                        # Incremental, CSV por stdout
+    python manage.py conciliar_wallets --salida diffs.csv     # CSV a un archivo
+    python manage.py conciliar_wallets --completa             # Revisa todas las wallets
+
+Por defecto sólo revisa las wallets con movimientos desde la corrida anterior
+(ConciliacionLedger) y genera antes los checkpoints pendientes, así que cada
+corrida nocturna cuesta proporcional a la actividad del día.
+Las diferencias se escriben a medida que aparecen, sin cargar todo en memoria.
+"""
+
+import csv
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from usuarios.ledger import conciliar, generar_checkpoints, marca_de_agua, wallets_a_conciliar
+from usuarios.models import ConciliacionLedger
+
+
+class Command(BaseCommand):
+    help = 'Compara balance_usdc de cada wallet con el libro mayor y reporta las diferencias en CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--completa',
+            action='store_true',
+            help='Revisa todas las wallets, ignorando la marca de agua de la corrida anterior',
+        )
+        parser.add_argument(
+            '--salida',
+            help='Archivo CSV de diferencias (por defecto, stdout)',
+        )
+        parser.add_argument(
+            '--sin-checkpoints',
+            action='store_true',
+            help='No genera checkpoints antes de conciliar',
+        )
+
+    def handle(self, *args, **options):
+        inicio = timezone.now()
+
+        if not options['sin_checkpoints']:
+            generar_checkpoints()
+
+        hasta = marca_de_agua() or 0
+        anterior = None if options['completa'] else ConciliacionLedger.objects.order_by('-fecha_inicio').first()
+        wallets = wallets_a_conciliar(desde=anterior, hasta=hasta)
+        revisadas = wallets.count()
+
+        archivo = open(options['salida'], 'w', newline='', encoding='utf-8') if options['salida'] else None
+        try:
+            writer = csv.writer(archivo or self.stdout)
+            writer.writerow(['Wallet', 'Cuenta', 'Balance USDC', 'Saldo Libro Mayor', 'Diferencia'])
+
+            diferencias = 0
+            for fila in conciliar(wallets, hasta):
+                writer.writerow([
+                    fila['wallet_id'],
+                    fila['cuenta'],
+                    fila['balance_usdc'],
+                    fila['saldo_ledger'],
+                    fila['diferencia'],
+                ])
+                diferencias += 1
+        finally:
+            if archivo:
+                archivo.close()
+
+        ConciliacionLedger.objects.create(
+            fecha_inicio=inicio,
+            hasta_asiento_id=hasta,
+            completa=anterior is None,
+            wallets_revisadas=revisadas,
+            diferencias=diferencias,
+        )
+
+        resumen = f'{revisadas} wallets revisadas, {diferencias} diferencias'
+        if diferencias:
+            self.stderr.write(f'✗ {resumen}')
+        else:
+            self.stderr.write(f'✓ {resumen}', style_func=self.style.SUCCESS)
@@ -0,0 +1,25 @@
+"""
+Genera checkpoints de saldo del libro mayor.
+
+Uso:
+    python manage.py generar_checkpoints_ledger    # Pensado para cron (p. ej. cada hora)
+
+Sólo procesa los asientos posteriores al último checkpoint, así que cada
+corrida cuesta proporcional a los movimientos nuevos, no al historial.
+"""
+
+from django.core.management.base import BaseCommand
+
+from usuarios.ledger import generar_checkpoints
+
+
+class Command(BaseCommand):
+    help = 'Genera checkpoints de saldo por wallet a partir de los asientos nuevos del libro mayor.'
+
+    def handle(self, *args, **options):
+        creados = generar_checkpoints()
+
+        if creados:
+            self.stdout.write(self.style.SUCCESS(f'✓ {creados} checkpoints generados'))
+        else:
+            self.stdout.write('Sin asientos nuevos desde el último checkpoint')
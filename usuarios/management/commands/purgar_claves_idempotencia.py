@@ -0,0 +1,21 @@
+"""
+Borra las claves de idempotencia vencidas.
+
+Uso:
+    python manage.py purgar_claves_idempotencia    # Pensado para cron (p. ej. diario)
+
+Las claves derivadas viven segundos y las enviadas por el cliente
+IDEMPOTENCY_KEY_TTL; purgarlas mantiene la tabla chica.
+"""
+
+from django.core.management.base import BaseCommand
+
+from usuarios.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Borra las claves de idempotencia vencidas.'
+
+    def handle(self, *args, **options):
+        borradas = IdempotencyKey.purgar_vencidas()
+        self.stdout.write(self.style.SUCCESS(f'✓ {borradas} claves vencidas borradas'))
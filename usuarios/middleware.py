@@ -1,6 +1,16 @@
+import logging
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
 from django.shortcuts import redirect
 from django.urls import reverse
-from usuarios.models import UserProfile
+from usuarios.currency_service import CurrencyService
+from usuarios.query_budget import ContadorConsultas, presupuesto_de
+from usuarios.user_context import (
+    marcar_onboarding, migrar_backend_de_sesion, obtener_perfil, onboarding_marcado
+)
+
+logger = logging.getLogger(__name__)
 
 
 class OnboardingMiddleware:
@@ -8,12 +18,23 @@ class OnboardingMiddleware:
     Middleware que verifica si el usuario necesita completar el onboarding.
     Si el usuario está autenticado pero no ha completado su perfil,
     lo redirige al flujo de onboarding correspondiente.
+
+    `request.user` llega con perfil y wallet cargados en la consulta de
+    autenticación (usuarios/backends.py). Una vez que el usuario tiene rol,
+    la verificación usa la marca de onboarding de la sesión y no consulta
+    la base.
     """
     
     def __init__(self, get_response):
         self.get_response = get_response
     
     def __call__(self, request):
+        migrar_backend_de_sesion(request)
+        
+        # Usuario con onboarding completo: marca firmada en la sesión, sin consultas
+        if onboarding_marcado(request):
+            return self.get_response(request)
+        
         # Solo aplicar para usuarios autenticados
         if request.user.is_authenticated:
             # Excluir rutas de administración, cuentas, assets estáticos
@@ -34,14 +55,77 @@ class OnboardingMiddleware:
                 
                 if not is_exempt:
                     # Crear perfil si no existe
-                    profile, created = UserProfile.objects.get_or_create(
-                        user=request.user,
-                        defaults={'tipo_rol': ''}
-                    )
+                    profile = obtener_perfil(request.user, tipo_rol='')
                     
                     # Si el perfil no tiene rol asignado o está vacío, redirigir
                     if not profile.tipo_rol or profile.tipo_rol.strip() == '':
                         return redirect('usuarios:role_selection')
+                    
+                    marcar_onboarding(request)
         
         response = self.get_response(request)
         return response
+
+
+class ExchangeRateMiddleware:
+    """
+    Middleware que fija una única cotización USDC/ARS por request.
+    El context processor, los template tags de currency_tags y
+    Wallet.get_balance_ars comparten la misma tasa, con una sola
+    lectura de caché por página.
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        with CurrencyService.request_snapshot():
+            return self.get_response(request)
+
+
+class QueryBudgetMiddleware:
+    """
+    Mide las consultas de cada request (ver usuarios/query_budget.py). Va primero
+    en MIDDLEWARE para contar también las de sesión y autenticación.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_BUDGET_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        contador = ContadorConsultas()
+        with contador.activo():
+            response = self.get_response(request)
+
+        timing = f'db;dur={contador.milisegundos:.1f};desc="{contador.total} consultas"'
+        if response.has_header('Server-Timing'):
+            timing = f"{response['Server-Timing']}, {timing}"
+        response['Server-Timing'] = timing
+
+        self.registrar(request, response, contador)
+        return response
+
+    def registrar(self, request, response, contador):
+        match = request.resolver_match
+        vista = match.view_name if match else request.path
+        presupuesto = presupuesto_de(match.func) if match else settings.QUERY_BUDGET_DEFAULT
+        repetidas = contador.repetidas()
+
+        datos = {
+            'vista': vista,
+            'metodo': request.method,
+            'status': response.status_code,
+            'consultas': contador.total,
+            'db_ms': round(contador.milisegundos, 1),
+            'presupuesto': presupuesto,
+            'n_mas_1': [{'sql': sql[:200], 'veces': veces} for sql, veces in repetidas],
+        }
+        nivel = logging.WARNING if contador.total > presupuesto or repetidas else logging.INFO
+        logger.log(
+            nivel,
+            "vista=%s consultas=%d db_ms=%.1f presupuesto=%d n_mas_1=%d",
+            vista, contador.total, contador.milisegundos, presupuesto, len(repetidas),
+            extra={'query_budget': datos}
+        )
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.11 on 2026-10-18 00:38
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0006_userprofile_cuit_userprofile_direccion_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CotizacionHistorica',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo_cambio', models.CharField(choices=[('blue', 'Dólar Blue'), ('oficial', 'Dólar Oficial')], default='blue', max_length=10, verbose_name='Tipo de Cambio')),
+                ('tasa', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Tasa (ARS por USDC)')),
+                ('vigente_desde', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Vigente Desde')),
+            ],
+            options={
+                'verbose_name': 'Cotización Histórica',
+                'verbose_name_plural': 'Cotizaciones Históricas',
+                'ordering': ['tipo_cambio', '-vigente_desde'],
+                'indexes': [models.Index(fields=['tipo_cambio', 'vigente_desde'], name='usuarios_co_tipo_ca_e61247_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.11 on 2026-10-18 00:43
+
+from django.db import migrations, models
+
+
+def asignar_shards_escrow(apps, schema_editor):
+    """La cuenta de escrow existente pasa a ser el shard 0 (y duplicados, si los hay, los siguientes)."""
+    Wallet = apps.get_model('usuarios', 'Wallet')
+    for shard, wallet in enumerate(Wallet.objects.filter(tipo_cuenta='ESCROW').order_by('pk')):
+        wallet.shard = shard
+        wallet.save(update_fields=['shard'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0007_cotizacionhistorica'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wallet',
+            name='shard',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='Número de sub-cuenta para las cuentas ESCROW (ver ESCROW_SHARDS)', null=True, verbose_name='Shard de Escrow'),
+        ),
+        migrations.RunPython(asignar_shards_escrow, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='wallet',
+            constraint=models.UniqueConstraint(condition=models.Q(('tipo_cuenta', 'ESCROW')), fields=('shard',), name='wallet_escrow_shard_unico'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.11 on 2026-10-18 00:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+def crear_asientos_apertura(apps, schema_editor):
+    """El saldo actual de cada wallet pasa a ser su asiento de apertura."""
+    Wallet = apps.get_model('usuarios', 'Wallet')
+    LedgerEntry = apps.get_model('usuarios', 'LedgerEntry')
+    ahora = django.utils.timezone.now()
+
+    asientos = []
+    for wallet_id, balance in Wallet.objects.exclude(balance_usdc=0).values_list('id', 'balance_usdc'):
+        movimiento = uuid.uuid4()
+        referencia = f'wallet:{wallet_id}'
+        asientos.append(LedgerEntry(movimiento=movimiento, wallet_id=None, monto_usdc=-balance,
+                                    tipo='APERTURA', referencia=referencia, fecha=ahora))
+        asientos.append(LedgerEntry(movimiento=movimiento, wallet_id=wallet_id, monto_usdc=balance,
+                                    tipo='APERTURA', referencia=referencia, fecha=ahora))
+    LedgerEntry.objects.bulk_create(asientos, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0008_wallet_shard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('movimiento', models.UUIDField(help_text='Agrupa los asientos de un mismo movimiento (suman cero)', verbose_name='Movimiento')),
+                ('monto_usdc', models.DecimalField(decimal_places=2, help_text='Positivo: crédito a la wallet. Negativo: débito.', max_digits=12, verbose_name='Monto USDC')),
+                ('tipo', models.CharField(choices=[('APERTURA', 'Saldo de Apertura'), ('CARGA', 'Carga de Fondos'), ('DEPOSITO_ESCROW', 'Depósito a Escrow'), ('LIBERACION', 'Liberación de Escrow'), ('REEMBOLSO', 'Reembolso'), ('TRANSFERENCIA', 'Transferencia')], max_length=20, verbose_name='Tipo')),
+                ('referencia', models.CharField(blank=True, help_text='Objeto de negocio que originó el movimiento (ej: job:12)', max_length=100, verbose_name='Referencia')),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Fecha')),
+                ('wallet', models.ForeignKey(blank=True, help_text='Null para la cuenta externa', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='asientos', to='usuarios.wallet', verbose_name='Billetera')),
+            ],
+            options={
+                'verbose_name': 'Asiento Contable',
+                'verbose_name_plural': 'Asientos Contables',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['wallet', 'id'], name='usuarios_le_wallet__8edb63_idx'), models.Index(fields=['wallet', 'fecha'], name='usuarios_le_wallet__e6b122_idx'), models.Index(fields=['movimiento'], name='usuarios_le_movimie_b13348_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('saldo_usdc', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Saldo USDC')),
+                ('hasta_asiento_id', models.BigIntegerField(help_text='Último asiento incluido en el saldo', verbose_name='Hasta Asiento')),
+                ('fecha', models.DateTimeField(help_text='Fecha del último asiento incluido', verbose_name='Fecha del Corte')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')),
+                ('wallet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='usuarios.wallet', verbose_name='Billetera')),
+            ],
+            options={
+                'verbose_name': 'Checkpoint de Saldo',
+                'verbose_name_plural': 'Checkpoints de Saldo',
+                'ordering': ['wallet', '-hasta_asiento_id'],
+                'indexes': [models.Index(fields=['wallet', 'hasta_asiento_id'], name='usuarios_le_wallet__470647_idx'), models.Index(fields=['wallet', 'fecha'], name='usuarios_le_wallet__94af0a_idx'), models.Index(fields=['hasta_asiento_id'], name='usuarios_le_hasta_a_8160cd_idx')],
+            },
+        ),
+        migrations.RunPython(crear_asientos_apertura, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.11 on 2026-10-18 00:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0009_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(help_text='SHA-256 de usuario, vista y clave enviada', max_length=64, unique=True, verbose_name='Clave')),
+                ('huella', models.CharField(help_text='SHA-256 de la ruta y los datos del POST', max_length=64, verbose_name='Huella del Request')),
+                ('status_code', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Código de Respuesta')),
+                ('location', models.CharField(blank=True, max_length=500, verbose_name='Redirección')),
+                ('expira_en', models.DateTimeField(db_index=True, verbose_name='Expira En')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')),
+            ],
+            options={
+                'verbose_name': 'Clave de Idempotencia',
+                'verbose_name_plural': 'Claves de Idempotencia',
+            },
+        ),
+    ]
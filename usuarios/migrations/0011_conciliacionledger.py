@@ -0,0 +1,33 @@
+# Generated by Django 4.2.11 on 2026-10-18 00:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0010_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConciliacionLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_inicio', models.DateTimeField(verbose_name='Inicio')),
+                ('hasta_asiento_id', models.BigIntegerField(help_text='Último asiento considerado en la corrida', verbose_name='Hasta Asiento')),
+                ('completa', models.BooleanField(default=False, help_text='True si se revisaron todas las wallets', verbose_name='Completa')),
+                ('wallets_revisadas', models.PositiveIntegerField(default=0, verbose_name='Wallets Revisadas')),
+                ('diferencias', models.PositiveIntegerField(default=0, verbose_name='Diferencias')),
+            ],
+            options={
+                'verbose_name': 'Conciliación del Libro Mayor',
+                'verbose_name_plural': 'Conciliaciones del Libro Mayor',
+                'ordering': ['-fecha_inicio'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='wallet',
+            index=models.Index(fields=['fecha_actualizacion'], name='usuarios_wa_fecha_a_9d6e20_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.11 on 2026-10-18 00:50
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def calcular_saldos_escrow(apps, schema_editor):
+    """Inicializa los contadores con los depósitos LOCKED existentes (un aggregate por contador)."""
+    Wallet = apps.get_model('usuarios', 'Wallet')
+    EscrowTransaction = apps.get_model('jobs', 'EscrowTransaction')
+    bloqueados = EscrowTransaction.objects.filter(status='LOCKED').order_by()
+    
+    for fila in bloqueados.values('from_wallet').annotate(total=Sum('amount_usdc')):
+        Wallet.objects.filter(pk=fila['from_wallet']).update(saldo_bloqueado_usdc=fila['total'])
+    
+    for fila in bloqueados.values('bid__professional__user').annotate(total=Sum('amount_usdc')):
+        Wallet.objects.filter(user_id=fila['bid__professional__user']).update(saldo_por_recibir_usdc=fila['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0011_conciliacionledger'),
+        ('jobs', '0003_escrowtransaction'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wallet',
+            name='saldo_bloqueado_usdc',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Depósitos de esta wallet que siguen bloqueados en escrow (cliente)', max_digits=12, verbose_name='Bloqueado en Escrow'),
+        ),
+        migrations.AddField(
+            model_name='wallet',
+            name='saldo_por_recibir_usdc',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Fondos bloqueados en escrow que se liberarán a esta wallet (profesional)', max_digits=12, verbose_name='Por Recibir de Escrow'),
+        ),
+        migrations.RunPython(calcular_saldos_escrow, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.11 on 2026-10-18 00:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0012_wallet_saldos_escrow'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['from_wallet', '-fecha_creacion', '-id'], name='usuarios_tr_from_wa_14e0a0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['to_wallet', '-fecha_creacion', '-id'], name='usuarios_tr_to_wall_db33bf_idx'),
+        ),
+    ]
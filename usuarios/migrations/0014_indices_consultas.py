@@ -0,0 +1,21 @@
+# Generated by Django 4.2.11 on 2026-10-18 00:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0013_transaction_historial_wallet'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['propuesta_relacionada', 'tipo_transaccion', 'status'], name='usuarios_tr_propues_60d708_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['oferta_relacionada', 'tipo_transaccion', 'status'], name='usuarios_tr_oferta__7c40b5_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.11 on 2026-10-18 01:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def cargas_desde_origen_externo(apps, schema_editor):
+    # Las cargas de fondos se registraban con la cuenta de escrow como origen
+    Transaction = apps.get_model('usuarios', 'Transaction')
+    Transaction.objects.filter(metadata__tipo='carga_manual').update(from_wallet=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0014_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transaction',
+            name='from_wallet',
+            field=models.ForeignKey(blank=True, help_text='Vacío para ingresos desde fuera de la plataforma (cargas de fondos)', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='transacciones_enviadas', to='usuarios.wallet', verbose_name='Billetera Origen'),
+        ),
+        migrations.RunPython(cargas_desde_origen_externo, migrations.RunPython.noop),
+    ]
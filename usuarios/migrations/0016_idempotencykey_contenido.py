@@ -0,0 +1,23 @@
+# Generated by Django 4.2.11 on 2026-10-18 01:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0015_transaction_origen_externo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='contenido',
+            field=models.BinaryField(blank=True, default=b'', help_text='Sólo respuestas que no redirigen (hasta MAX_CONTENIDO bytes)', verbose_name='Cuerpo de la Respuesta'),
+        ),
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='content_type',
+            field=models.CharField(blank=True, help_text='Vacío si no se guardó el cuerpo', max_length=100, verbose_name='Content-Type'),
+        ),
+    ]
@@ -1,4 +1,9 @@
-from django.db import models
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, models, transaction as db_transaction
+from django.db.models import F, Q, Sum
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
@@ -120,11 +125,13 @@ class UserProfile(models.Model):
     
     @property
     def wallet(self):
-        """Retorna la wallet del usuario."""
+        """
+        Retorna la wallet del usuario. Usa la relación inversa de User, así
+        no consulta si el usuario se cargó con select_related('wallet').
+        """
         try:
-            from .models import Wallet
-            return Wallet.objects.get(user=self.user)
-        except:
+            return self.user.wallet
+        except Wallet.DoesNotExist:
             return None
     
     def aplicar_penalizacion(self, dias_atraso):
@@ -485,6 +492,14 @@ class DelayJustification(models.Model):
         return reduccion
 
 
+# Cuentas de escrow ya resueltas en este proceso: {shard: (pk, nombre_cuenta)}
+_escrow_accounts = {}
+
+
+class SaldoInsuficienteError(Exception):
+    """El débito condicional no se aplicó porque el saldo no alcanzaba."""
+
+
 class Wallet(models.Model):
     """
     Billetera virtual de cada usuario para manejar transacciones internas.
@@ -522,6 +537,29 @@ class Wallet(models.Model):
         validators=[MinValueValidator(0)]
     )
     
+    saldo_bloqueado_usdc = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name='Bloqueado en Escrow',
+        help_text='Depósitos de esta wallet que siguen bloqueados en escrow (cliente)'
+    )
+    
+    saldo_por_recibir_usdc = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name='Por Recibir de Escrow',
+        help_text='Fondos bloqueados en escrow que se liberarán a esta wallet (profesional)'
+    )
+    
+    shard = models.PositiveSmallIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Shard de Escrow',
+        help_text='Número de sub-cuenta para las cuentas ESCROW (ver ESCROW_SHARDS)'
+    )
+    
     nombre_cuenta = models.CharField(
         max_length=100,
         blank=True,
@@ -548,6 +586,16 @@ class Wallet(models.Model):
         verbose_name = 'Billetera'
         verbose_name_plural = 'Billeteras'
         ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['fecha_actualizacion']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['shard'],
+                condition=models.Q(tipo_cuenta='ESCROW'),
+                name='wallet_escrow_shard_unico'
+            ),
+        ]
     
     def __str__(self):
         if self.user:
@@ -559,16 +607,74 @@ class Wallet(models.Model):
         return self.balance_usdc >= monto
     
     def restar_saldo(self, monto):
-        """Resta monto del saldo. No verifica suficiencia, debe hacerse antes."""
-        from decimal import Decimal
-        self.balance_usdc -= Decimal(str(monto))
-        self.save()
+        """
+        Resta monto del saldo con un único UPDATE condicional:
+        balance_usdc = balance_usdc - monto WHERE balance_usdc >= monto.
+        
+        El UPDATE bloquea la fila sólo mientras se aplica, así que dos débitos
+        concurrentes nunca pisan el saldo ni lo dejan negativo. El valor en
+        memoria se ajusta sin volver a leer la fila (usar refresh_from_db()
+        para ver el saldo real).
+        
+        Es la operación de bajo nivel sobre la proyección del saldo: para que el
+        movimiento quede en el libro mayor usar Wallet.transferir_saldo.
+        
+        Returns:
+            bool: True si se debitó, False si el saldo no alcanzaba
+        """
+        monto = Decimal(str(monto))
+        debitado = Wallet.objects.filter(pk=self.pk, balance_usdc__gte=monto).update(
+            balance_usdc=F('balance_usdc') - monto,
+            fecha_actualizacion=timezone.now()
+        ) == 1
+        
+        if debitado and 'balance_usdc' not in self.get_deferred_fields():
+            self.balance_usdc = Decimal(str(self.balance_usdc)) - monto
+        return debitado
     
     def sumar_saldo(self, monto):
-        """Suma monto al saldo."""
-        from decimal import Decimal
-        self.balance_usdc += Decimal(str(monto))
-        self.save()
+        """
+        Suma monto al saldo con un único UPDATE (balance_usdc = balance_usdc + monto).
+        Operación de bajo nivel: ver Wallet.transferir_saldo.
+        """
+        monto = Decimal(str(monto))
+        actualizadas = Wallet.objects.filter(pk=self.pk).update(
+            balance_usdc=F('balance_usdc') + monto,
+            fecha_actualizacion=timezone.now()
+        )
+        
+        if not actualizadas:
+            raise Wallet.DoesNotExist(f"La wallet {self.pk} no existe")
+        if 'balance_usdc' not in self.get_deferred_fields():
+            self.balance_usdc = Decimal(str(self.balance_usdc)) + monto
+    
+    @classmethod
+    def transferir_saldo(cls, origen, destino, monto, tipo='TRANSFERENCIA', referencia=''):
+        """
+        Mueve monto entre dos wallets en una transacción de base de datos
+        y registra los asientos en el libro mayor (ver usuarios.ledger).
+        Si origen y destino son la misma wallet no hay nada que mover.
+        
+        Raises:
+            SaldoInsuficienteError: si el origen no tiene saldo (no se modifica nada)
+        """
+        from .ledger import transferir
+        return transferir(origen, destino, monto, tipo=tipo, referencia=referencia)
+    
+    @classmethod
+    def ajustar_saldo_bloqueado(cls, cliente_wallet_id, profesional_user_id, monto):
+        """
+        Ajusta los contadores de escrow con UPDATEs sobre F(): `monto` positivo
+        al bloquear un depósito, negativo al liberarlo o reembolsarlo.
+        Debe llamarse en la misma transacción que cambia el EscrowTransaction.
+        """
+        monto = Decimal(str(monto))
+        cls.objects.filter(pk=cliente_wallet_id).update(
+            saldo_bloqueado_usdc=F('saldo_bloqueado_usdc') + monto
+        )
+        cls.objects.filter(user_id=profesional_user_id).update(
+            saldo_por_recibir_usdc=F('saldo_por_recibir_usdc') + monto
+        )
     
     def get_balance_ars(self, tipo_cambio="blue"):
         """
@@ -597,17 +703,64 @@ class Wallet(models.Model):
         return CurrencyService.get_usdc_to_ars_rate(tipo_cambio)
     
     @classmethod
-    def get_escrow_account(cls):
-        """Obtiene o crea la cuenta de escrow de la plataforma."""
+    def escrow_shard_for(cls, job_id):
+        """Sub-cuenta de escrow que corresponde a un trabajo (job_id % ESCROW_SHARDS)."""
+        if job_id is None:
+            return 0
+        return int(job_id) % max(getattr(settings, 'ESCROW_SHARDS', 1), 1)
+    
+    @classmethod
+    def get_escrow_account(cls, job_id=None, refresh=False):
+        """
+        Obtiene o crea la sub-cuenta de escrow de la plataforma para un trabajo.
+        
+        El escrow está repartido en ESCROW_SHARDS wallets para que operaciones
+        sobre trabajos distintos no compitan por la misma fila. Sin job_id se
+        usa la sub-cuenta 0. Para liberar o reembolsar un depósito debe usarse
+        la wallet registrada en el depósito (to_wallet), no recalcular el shard.
+        
+        La cuenta se resuelve una vez por proceso y luego se arma desde su pk
+        sin consultar la base; balance_usdc queda diferido y se lee recién si
+        se accede. refresh=True vuelve a buscarla (ver clear_escrow_cache).
+        """
+        shard = cls.escrow_shard_for(job_id)
+        
+        if not refresh and shard in _escrow_accounts:
+            pk, nombre_cuenta = _escrow_accounts[shard]
+            return cls.from_db(
+                None,
+                ['id', 'user_id', 'tipo_cuenta', 'shard', 'nombre_cuenta'],
+                [pk, None, 'ESCROW', shard, nombre_cuenta]
+            )
+        
         escrow, created = cls.objects.get_or_create(
             tipo_cuenta='ESCROW',
-            user=None,
+            shard=shard,
             defaults={
-                'nombre_cuenta': 'Plataforma_Escrow',
-                'balance_usdc': 0.00
+                'user': None,
+                'nombre_cuenta': 'Plataforma_Escrow' if shard == 0 else f'Plataforma_Escrow_{shard}',
+                'balance_usdc': Decimal('0.00')
             }
         )
+        
+        # Se memoriza recién al confirmar la transacción: una cuenta creada
+        # dentro de un atomic que luego se revierte no debe quedar en la caché
+        db_transaction.on_commit(
+            lambda: _escrow_accounts.__setitem__(shard, (escrow.pk, escrow.nombre_cuenta))
+        )
         return escrow
+    
+    @classmethod
+    def clear_escrow_cache(cls):
+        """Olvida las cuentas de escrow resueltas (p. ej. si se borró o recreó alguna)."""
+        _escrow_accounts.clear()
+    
+    @classmethod
+    def get_escrow_balance(cls):
+        """Saldo total del escrow de la plataforma (suma de todas las sub-cuentas)."""
+        return cls.objects.filter(tipo_cuenta='ESCROW').aggregate(
+            total=models.Sum('balance_usdc')
+        )['total'] or Decimal('0.00')
 
 
 class Transaction(models.Model):
@@ -634,8 +787,11 @@ class Transaction(models.Model):
     from_wallet = models.ForeignKey(
         Wallet,
         on_delete=models.PROTECT,
+        null=True,
+        blank=True,
         related_name='transacciones_enviadas',
-        verbose_name='Billetera Origen'
+        verbose_name='Billetera Origen',
+        help_text='Vacío para ingresos desde fuera de la plataforma (cargas de fondos)'
     )
     
     to_wallet = models.ForeignKey(
@@ -718,11 +874,76 @@ class Transaction(models.Model):
             models.Index(fields=['-fecha_creacion']),
             models.Index(fields=['status']),
             models.Index(fields=['tipo_transaccion']),
+            # Historial de una wallet ordenado por (fecha_creacion, id), ver historial_wallet
+            models.Index(fields=['from_wallet', '-fecha_creacion', '-id']),
+            models.Index(fields=['to_wallet', '-fecha_creacion', '-id']),
+            # Escrow de una propuesta (liberar_pago_a_profesional, procesar_reembolso)
+            models.Index(fields=['propuesta_relacionada', 'tipo_transaccion', 'status']),
+            # Transacciones de un trabajo por tipo (exportaciones)
+            models.Index(fields=['oferta_relacionada', 'tipo_transaccion', 'status']),
         ]
     
     def __str__(self):
         return f"{self.tipo_transaccion} - {self.monto_usdc} USDC - {self.status}"
     
+    @classmethod
+    def historial_wallet(cls, wallet, antes=None, limite=20):
+        """
+        Una página del historial de una wallet (enviadas y recibidas) en una
+        sola consulta, de la más reciente a la más vieja.
+        
+        Usa paginación por cursor sobre (fecha_creacion, id): cada página es
+        una búsqueda en el índice desde el cursor, sin OFFSET, así que cuesta
+        lo mismo en la primera página que en la número mil.
+        
+        Args:
+            wallet: Wallet a consultar
+            antes: cursor (fecha_creacion, id) de la última transacción de la
+                   página anterior, o None para la primera página
+            limite: transacciones por página
+        
+        Returns:
+            tuple: (list de Transaction, cursor de la página siguiente o None)
+        """
+        transacciones = cls.objects.filter(
+            Q(from_wallet=wallet) | Q(to_wallet=wallet)
+        ).select_related(
+            'from_wallet', 'to_wallet', 'oferta_relacionada', 'propuesta_relacionada'
+        ).order_by('-fecha_creacion', '-id')
+        
+        if antes is not None:
+            fecha, pk = antes
+            transacciones = transacciones.filter(
+                Q(fecha_creacion__lt=fecha) | Q(fecha_creacion=fecha, id__lt=pk)
+            )
+        
+        pagina = list(transacciones[:limite + 1])
+        siguiente = None
+        if len(pagina) > limite:
+            pagina = pagina[:limite]
+            siguiente = (pagina[-1].fecha_creacion, pagina[-1].pk)
+        return pagina, siguiente
+    
+    @classmethod
+    def totales_wallet(cls, wallet):
+        """
+        Totales completados enviados y recibidos por una wallet, en un único aggregate.
+        
+        Returns:
+            dict: {"enviado": Decimal, "recibido": Decimal}
+        """
+        totales = cls.objects.filter(
+            Q(from_wallet=wallet) | Q(to_wallet=wallet),
+            status='COMPLETED'
+        ).aggregate(
+            enviado=Sum('monto_usdc', filter=Q(from_wallet=wallet)),
+            recibido=Sum('monto_usdc', filter=Q(to_wallet=wallet))
+        )
+        return {
+            'enviado': totales['enviado'] or Decimal('0.00'),
+            'recibido': totales['recibido'] or Decimal('0.00'),
+        }
+    
     @classmethod
     def crear_transaccion_escrow(cls, cliente_wallet, monto_total, propuesta, porcentaje_escrow=30):
         """
@@ -750,8 +971,8 @@ class Transaction(models.Model):
         if not cliente_wallet.tiene_saldo_suficiente(monto_escrow):
             return None, None
         
-        # Obtener cuenta de escrow
-        escrow_wallet = Wallet.get_escrow_account()
+        # Obtener sub-cuenta de escrow del trabajo
+        escrow_wallet = Wallet.get_escrow_account(propuesta.oferta_id)
         
         # Crear transacción
         transaccion = cls.objects.create(
@@ -773,10 +994,13 @@ class Transaction(models.Model):
         
         # Ejecutar la transacción
         try:
-            cliente_wallet.restar_saldo(monto_escrow)
-            escrow_wallet.sumar_saldo(monto_escrow)
-            transaccion.status = 'COMPLETED'
-            transaccion.save()
+            with db_transaction.atomic():
+                Wallet.transferir_saldo(
+                    cliente_wallet, escrow_wallet, monto_escrow,
+                    tipo='DEPOSITO_ESCROW', referencia=f'propuesta:{propuesta.id}'
+                )
+                transaccion.status = 'COMPLETED'
+                transaccion.save(update_fields=['status'])
             
             return transaccion, monto_escrow
         except Exception as e:
@@ -800,7 +1024,6 @@ class Transaction(models.Model):
         from decimal import Decimal, ROUND_HALF_UP
         
         # Obtener wallets
-        escrow_wallet = Wallet.get_escrow_account()
         profesional_wallet, _ = Wallet.objects.get_or_create(
             user=propuesta.profesional,
             defaults={'tipo_cuenta': 'USER', 'balance_usdc': Decimal('1000.00')}
@@ -816,6 +1039,9 @@ class Transaction(models.Model):
         if not transaccion_escrow:
             return None, None, None
         
+        # Los fondos están en la sub-cuenta de escrow donde se depositaron
+        escrow_wallet = transaccion_escrow.to_wallet
+        
         # Calcular montos
         monto_total = Decimal(str(propuesta.monto))
         monto_escrow = transaccion_escrow.monto_usdc  # 30% que está en escrow
@@ -860,7 +1086,7 @@ class Transaction(models.Model):
             )
             
             # 2. Crear transacción de comisión para la plataforma
-            plataforma_wallet = Wallet.get_escrow_account()  # Usamos la misma cuenta de escrow
+            plataforma_wallet = escrow_wallet  # La comisión queda en la misma sub-cuenta de escrow
             transaccion_comision = cls.objects.create(
                 from_wallet=escrow_wallet,
                 to_wallet=plataforma_wallet,
@@ -876,16 +1102,21 @@ class Transaction(models.Model):
                 }
             )
             
-            # 3. Ejecutar transferencias
-            escrow_wallet.restar_saldo(monto_escrow)  # Restar todo el escrow
-            profesional_wallet.sumar_saldo(monto_neto_profesional)  # Dar al profesional su parte
-            # La comisión ya queda en el escrow (no se mueve físicamente)
+            # 3. Ejecutar transferencia: sólo sale del escrow la parte del profesional,
+            # la comisión queda en el escrow (un único UPDATE por wallet)
+            with db_transaction.atomic():
+                Wallet.transferir_saldo(
+                    escrow_wallet, profesional_wallet, monto_neto_profesional,
+                    tipo='LIBERACION', referencia=f'propuesta:{propuesta.id}'
+                )
+                
+                # Marcar transacciones como completadas
+                cls.objects.filter(
+                    pk__in=[transaccion_pago.pk, transaccion_comision.pk]
+                ).update(status='COMPLETED')
             
-            # Marcar transacciones como completadas
             transaccion_pago.status = 'COMPLETED'
-            transaccion_pago.save()
             transaccion_comision.status = 'COMPLETED'
-            transaccion_comision.save()
             
             return transaccion_pago, transaccion_comision, monto_neto_profesional
             
@@ -913,7 +1144,6 @@ class Transaction(models.Model):
         from decimal import Decimal
         
         # Obtener wallets
-        escrow_wallet = Wallet.get_escrow_account()
         cliente_wallet, _ = Wallet.objects.get_or_create(
             user=propuesta.oferta.creador,
             defaults={'tipo_cuenta': 'USER', 'balance_usdc': Decimal('1000.00')}
@@ -929,6 +1159,8 @@ class Transaction(models.Model):
         if not transaccion_escrow:
             return None, None
         
+        escrow_wallet = transaccion_escrow.to_wallet
+        
         monto_reembolso = transaccion_escrow.monto_usdc
         
         # Verificar saldo en escrow
@@ -953,11 +1185,13 @@ class Transaction(models.Model):
             )
             
             # Ejecutar transferencia
-            escrow_wallet.restar_saldo(monto_reembolso)
-            cliente_wallet.sumar_saldo(monto_reembolso)
-            
-            transaccion_reembolso.status = 'COMPLETED'
-            transaccion_reembolso.save()
+            with db_transaction.atomic():
+                Wallet.transferir_saldo(
+                    escrow_wallet, cliente_wallet, monto_reembolso,
+                    tipo='REEMBOLSO', referencia=f'propuesta:{propuesta.id}'
+                )
+                transaccion_reembolso.status = 'COMPLETED'
+                transaccion_reembolso.save(update_fields=['status'])
             
             return transaccion_reembolso, monto_reembolso
             
@@ -1105,3 +1339,389 @@ class WorkEvent(models.Model):
                 'fecha_reembolso': timezone.now().isoformat()
             }
         )
+
+
+class CotizacionHistorica(models.Model):
+    """
+    Historial de cotizaciones USDC/ARS.
+    
+    Sólo se guarda una fila cuando la tasa cambia: cada fila vale desde
+    `vigente_desde` hasta la siguiente del mismo tipo. La consulta
+    "tasa en el momento T" es una búsqueda en el índice (tipo_cambio, vigente_desde).
+    """
+    
+    TIPO_CAMBIO_CHOICES = [
+        ('blue', 'Dólar Blue'),
+        ('oficial', 'Dólar Oficial'),
+    ]
+    
+    tipo_cambio = models.CharField(
+        max_length=10,
+        choices=TIPO_CAMBIO_CHOICES,
+        default='blue',
+        verbose_name='Tipo de Cambio'
+    )
+    
+    tasa = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        verbose_name='Tasa (ARS por USDC)'
+    )
+    
+    vigente_desde = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Vigente Desde'
+    )
+    
+    class Meta:
+        verbose_name = 'Cotización Histórica'
+        verbose_name_plural = 'Cotizaciones Históricas'
+        ordering = ['tipo_cambio', '-vigente_desde']
+        indexes = [
+            models.Index(fields=['tipo_cambio', 'vigente_desde']),
+        ]
+    
+    def __str__(self):
+        return f"{self.tipo_cambio}: {self.tasa} ARS desde {self.vigente_desde.strftime('%d/%m/%Y %H:%M')}"
+    
+    @classmethod
+    def registrar(cls, tipo_cambio, tasa, fecha=None):
+        """
+        Registra una tasa obtenida de la API si difiere de la última guardada.
+        
+        Returns:
+            bool: True si se creó una fila nueva
+        """
+        ultima = cls.objects.filter(tipo_cambio=tipo_cambio).order_by('-vigente_desde').values_list('tasa', flat=True).first()
+        if ultima == tasa:
+            return False
+        
+        cls.objects.create(tipo_cambio=tipo_cambio, tasa=tasa, vigente_desde=fecha or timezone.now())
+        return True
+    
+    @classmethod
+    def tasa_en(cls, fecha, tipo_cambio='blue'):
+        """
+        Tasa vigente en `fecha` (o la primera registrada si `fecha` es anterior
+        al historial). None si no hay historial para ese tipo.
+        """
+        filas = cls.objects.filter(tipo_cambio=tipo_cambio).values_list('tasa', flat=True)
+        
+        tasa = filas.filter(vigente_desde__lte=fecha).order_by('-vigente_desde').first()
+        if tasa is None:
+            tasa = filas.order_by('vigente_desde').first()
+        return tasa
+
+
+class LedgerEntry(models.Model):
+    """
+    Asiento del libro mayor (partida doble, sólo inserción).
+    
+    Cada movimiento de dinero escribe dos asientos con el mismo `movimiento`:
+    uno negativo en la wallet origen y uno positivo en la destino, de modo
+    que la suma por movimiento es siempre cero. wallet=None representa la
+    cuenta externa (cargas de fondos, saldos de apertura).
+    
+    Wallet.balance_usdc es la proyección materializada de estos asientos;
+    LedgerCheckpoint guarda cortes periódicos para calcular saldos históricos.
+    Ver usuarios.ledger.
+    """
+    
+    TIPO_CHOICES = [
+        ('APERTURA', 'Saldo de Apertura'),
+        ('CARGA', 'Carga de Fondos'),
+        ('DEPOSITO_ESCROW', 'Depósito a Escrow'),
+        ('LIBERACION', 'Liberación de Escrow'),
+        ('REEMBOLSO', 'Reembolso'),
+        ('TRANSFERENCIA', 'Transferencia'),
+    ]
+    
+    movimiento = models.UUIDField(
+        verbose_name='Movimiento',
+        help_text='Agrupa los asientos de un mismo movimiento (suman cero)'
+    )
+    
+    wallet = models.ForeignKey(
+        Wallet,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='asientos',
+        verbose_name='Billetera',
+        help_text='Null para la cuenta externa'
+    )
+    
+    monto_usdc = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        verbose_name='Monto USDC',
+        help_text='Positivo: crédito a la wallet. Negativo: débito.'
+    )
+    
+    tipo = models.CharField(
+        max_length=20,
+        choices=TIPO_CHOICES,
+        verbose_name='Tipo'
+    )
+    
+    referencia = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name='Referencia',
+        help_text='Objeto de negocio que originó el movimiento (ej: job:12)'
+    )
+    
+    fecha = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Fecha'
+    )
+    
+    class Meta:
+        verbose_name = 'Asiento Contable'
+        verbose_name_plural = 'Asientos Contables'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['wallet', 'id']),
+            models.Index(fields=['wallet', 'fecha']),
+            models.Index(fields=['movimiento']),
+        ]
+    
+    def __str__(self):
+        cuenta = self.wallet_id or 'externa'
+        return f"{self.get_tipo_display()} - wallet {cuenta}: {self.monto_usdc} USDC"
+    
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError("Los asientos contables no se modifican: registrar un movimiento inverso.")
+        super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        raise ValueError("Los asientos contables no se eliminan: registrar un movimiento inverso.")
+
+
+class LedgerCheckpoint(models.Model):
+    """
+    Corte de saldo de una wallet: saldo acumulado de todos sus asientos
+    con id <= hasta_asiento_id. El saldo en un momento T es el último
+    checkpoint anterior a T más los asientos posteriores hasta T.
+    """
+    
+    wallet = models.ForeignKey(
+        Wallet,
+        on_delete=models.CASCADE,
+        related_name='checkpoints',
+        verbose_name='Billetera'
+    )
+    
+    saldo_usdc = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        verbose_name='Saldo USDC'
+    )
+    
+    hasta_asiento_id = models.BigIntegerField(
+        verbose_name='Hasta Asiento',
+        help_text='Último asiento incluido en el saldo'
+    )
+    
+    fecha = models.DateTimeField(
+        verbose_name='Fecha del Corte',
+        help_text='Fecha del último asiento incluido'
+    )
+    
+    fecha_creacion = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Fecha de Creación'
+    )
+    
+    class Meta:
+        verbose_name = 'Checkpoint de Saldo'
+        verbose_name_plural = 'Checkpoints de Saldo'
+        ordering = ['wallet', '-hasta_asiento_id']
+        indexes = [
+            models.Index(fields=['wallet', 'hasta_asiento_id']),
+            models.Index(fields=['wallet', 'fecha']),
+            models.Index(fields=['hasta_asiento_id']),
+        ]
+    
+    def __str__(self):
+        return f"Wallet {self.wallet_id}: {self.saldo_usdc} USDC al asiento #{self.hasta_asiento_id}"
+
+
+class ConciliacionLedger(models.Model):
+    """
+    Corrida del comando `conciliar_wallets`.
+    
+    `hasta_asiento_id` y `fecha_inicio` son la marca de agua de la corrida
+    siguiente: sólo se revisan las wallets con asientos posteriores o con
+    el saldo modificado desde entonces.
+    """
+    
+    fecha_inicio = models.DateTimeField(
+        verbose_name='Inicio'
+    )
+    
+    hasta_asiento_id = models.BigIntegerField(
+        verbose_name='Hasta Asiento',
+        help_text='Último asiento considerado en la corrida'
+    )
+    
+    completa = models.BooleanField(
+        default=False,
+        verbose_name='Completa',
+        help_text='True si se revisaron todas las wallets'
+    )
+    
+    wallets_revisadas = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Wallets Revisadas'
+    )
+    
+    diferencias = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Diferencias'
+    )
+    
+    class Meta:
+        verbose_name = 'Conciliación del Libro Mayor'
+        verbose_name_plural = 'Conciliaciones del Libro Mayor'
+        ordering = ['-fecha_inicio']
+    
+    def __str__(self):
+        return f"Conciliación {self.fecha_inicio.strftime('%d/%m/%Y %H:%M')}: {self.diferencias} diferencias"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Claves de idempotencia de los POST que mueven dinero.
+    
+    Guarda la huella del request y la respuesta que produjo (código y
+    redirección, o cuerpo y content type). Un reintento con la misma clave devuelve esa respuesta
+    con una sola búsqueda por índice, sin volver a ejecutar la vista.
+    Mientras `status_code` es nulo la operación está en curso.
+    """
+    
+    clave = models.CharField(
+        max_length=64,
+        unique=True,
+        verbose_name='Clave',
+        help_text='SHA-256 de usuario, vista y clave enviada'
+    )
+    
+    huella = models.CharField(
+        max_length=64,
+        verbose_name='Huella del Request',
+        help_text='SHA-256 de la ruta y los datos del POST'
+    )
+    
+    status_code = models.PositiveSmallIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Código de Respuesta'
+    )
+    
+    location = models.CharField(
+        max_length=500,
+        blank=True,
+        verbose_name='Redirección'
+    )
+    
+    contenido = models.BinaryField(
+        blank=True,
+        default=b'',
+        verbose_name='Cuerpo de la Respuesta',
+        help_text='Sólo respuestas que no redirigen (hasta MAX_CONTENIDO bytes)'
+    )
+    
+    content_type = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name='Content-Type',
+        help_text='Vacío si no se guardó el cuerpo'
+    )
+    
+    expira_en = models.DateTimeField(
+        db_index=True,
+        verbose_name='Expira En'
+    )
+    
+    fecha_creacion = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Fecha de Creación'
+    )
+    
+    # Cuerpos más grandes no se guardan: el reintento recibe sólo el código
+    MAX_CONTENIDO = 64 * 1024
+    
+    class Meta:
+        verbose_name = 'Clave de Idempotencia'
+        verbose_name_plural = 'Claves de Idempotencia'
+    
+    def __str__(self):
+        estado = self.status_code or 'en curso'
+        return f"{self.clave[:12]}… ({estado})"
+    
+    @classmethod
+    def reclamar(cls, clave, huella, vigencia):
+        """
+        Busca la clave y, si no existe o está vencida, la reserva para este request.
+        
+        Returns:
+            tuple: (IdempotencyKey, bool) - el registro y True si este request
+                   debe ejecutar la vista
+        """
+        ahora = timezone.now()
+        expira_en = ahora + timedelta(seconds=vigencia)
+        
+        existente = cls.objects.filter(clave=clave).first()
+        if existente is None:
+            try:
+                with db_transaction.atomic():
+                    return cls.objects.create(clave=clave, huella=huella, expira_en=expira_en), True
+            except IntegrityError:
+                # Otro request la reservó entre la búsqueda y el INSERT
+                return cls.objects.get(clave=clave), False
+        
+        if existente.expira_en > ahora:
+            return existente, False
+        
+        # Vencida: la reutiliza sólo el request cuyo UPDATE condicional la toma
+        tomada = cls.objects.filter(pk=existente.pk, expira_en__lte=ahora).update(
+            huella=huella,
+            status_code=None,
+            location='',
+            contenido=b'',
+            content_type='',
+            expira_en=expira_en,
+            fecha_creacion=ahora
+        )
+        existente.refresh_from_db()
+        return existente, bool(tomada)
+    
+    def guardar_respuesta(self, respuesta):
+        """Registra la respuesta de la vista para devolverla en los reintentos."""
+        self.status_code = respuesta.status_code
+        self.location = respuesta.get('Location', '')[:500]
+        self.contenido, self.content_type = b'', ''
+        if not self.location and not respuesta.streaming and len(respuesta.content) <= self.MAX_CONTENIDO:
+            self.contenido = respuesta.content
+            self.content_type = respuesta.get('Content-Type', '')[:100]
+        IdempotencyKey.objects.filter(pk=self.pk).update(
+            status_code=self.status_code,
+            location=self.location,
+            contenido=self.contenido,
+            content_type=self.content_type
+        )
+    
+    def liberar(self):
+        """Borra la reserva para que la operación pueda reintentarse (la vista falló)."""
+        IdempotencyKey.objects.filter(pk=self.pk, status_code__isnull=True).delete()
+    
+    @classmethod
+    def purgar_vencidas(cls):
+        """
+        Returns:
+            int: cantidad de claves vencidas borradas
+        """
+        borradas, _ = cls.objects.filter(expira_en__lte=timezone.now()).delete()
+        return borradas
@@ -0,0 +1,118 @@
+"""
+Presupuesto de consultas por vista.
+
+QueryBudgetMiddleware (usuarios/middleware.py, opt-in con
+QUERY_BUDGET_ENABLED) cuenta las consultas y el tiempo de base de datos de
+cada request con ContadorConsultas, un `execute_wrapper`:
+
+- Agrega el header `Server-Timing: db;dur=<ms>;desc="<n> consultas"`.
+- Agrupa las consultas por forma de SQL (los parámetros ya van aparte y las
+  listas `IN (...)` se colapsan): una forma que se repite
+  QUERY_BUDGET_REPEAT_THRESHOLD veces o más es un N+1.
+- Loguea una línea por request con la vista, las consultas, el tiempo y el
+  presupuesto; en WARNING si se pasó del presupuesto o hay N+1.
+
+Cada vista declara su presupuesto con `@query_budget(n)`; las demás usan
+QUERY_BUDGET_DEFAULT. En tests, QueryBudgetTestMixin.assertQueryBudget()
+falla si una vista se pasa del suyo.
+
+Las respuestas en streaming consultan mientras se envían, después del
+middleware: sólo se cuentan las consultas previas al primer byte.
+"""
+
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.urls import resolve
+
+_LISTA_PARAMETROS = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+
+
+def query_budget(maximo):
+    """
+    Declara cuántas consultas puede hacer una vista.
+
+    Uso (debajo de los demás decoradores, `wraps` copia el atributo):
+        @login_required
+        @query_budget(12)
+        def mi_vista(request): ...
+    """
+    def decorador(vista):
+        vista.query_budget = maximo
+        return vista
+    return decorador
+
+
+def presupuesto_de(vista):
+    """Presupuesto declarado de una vista (o QUERY_BUDGET_DEFAULT)."""
+    return getattr(vista, 'query_budget', settings.QUERY_BUDGET_DEFAULT)
+
+
+def forma_sql(sql):
+    """Forma de una consulta: el SQL sin parámetros con las listas IN colapsadas."""
+    return _LISTA_PARAMETROS.sub('(%s, ...)', sql)
+
+
+class ContadorConsultas:
+    """
+    `execute_wrapper` que cuenta consultas, tiempo total y repeticiones
+    por forma de SQL.
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.segundos = 0.0
+        self.formas = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.segundos += time.perf_counter() - inicio
+            self.total += 1
+            self.formas[forma_sql(sql)] += 1
+
+    @contextmanager
+    def activo(self):
+        """Cuenta las consultas de todas las conexiones dentro del bloque."""
+        with ExitStack() as stack:
+            for conexion in connections.all():
+                stack.enter_context(conexion.execute_wrapper(self))
+            yield self
+
+    @property
+    def milisegundos(self):
+        return self.segundos * 1000
+
+    def repetidas(self, minimo=None):
+        """Formas ejecutadas `minimo` veces o más: [(sql, veces)], la más repetida primero."""
+        minimo = minimo or settings.QUERY_BUDGET_REPEAT_THRESHOLD
+        return [(sql, veces) for sql, veces in self.formas.most_common() if veces >= minimo]
+
+
+class QueryBudgetTestMixin:
+    """
+    Mixin para TestCase: `assertQueryBudget(url)` hace el request con
+    self.client y falla si la vista supera su presupuesto declarado.
+    """
+
+    def assertQueryBudget(self, url, metodo='get', presupuesto=None, **kwargs):
+        if presupuesto is None:
+            presupuesto = presupuesto_de(resolve(url.split('?')[0]).func)
+
+        contador = ContadorConsultas()
+        with contador.activo():
+            response = getattr(self.client, metodo)(url, **kwargs)
+
+        if contador.total > presupuesto:
+            repetidas = '\n'.join(f'  {veces}x {sql}' for sql, veces in contador.repetidas(2))
+            self.fail(
+                f'{url} hizo {contador.total} consultas (presupuesto: {presupuesto})'
+                + (f'\nRepetidas:\n{repetidas}' if repetidas else '')
+            )
+        return response
@@ -1,8 +1,10 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
 from decimal import Decimal
 from .models import UserProfile, Wallet
+from .ledger import registrar_asientos
+from .user_context import invalidar_onboarding
 
 
 @receiver(post_save, sender=User)
@@ -18,6 +20,16 @@ def create_or_update_user_profile(sender, instance, created, **kwargs):
             instance.profile.save()
 
 
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidar_marca_onboarding(sender, instance, **kwargs):
+    """
+    Cualquier cambio del perfil invalida las marcas de onboarding completo
+    guardadas en sesión (usuarios/user_context.py).
+    """
+    invalidar_onboarding(instance.user_id)
+
+
 @receiver(post_save, sender=User)
 def crear_wallet_usuario(sender, instance, created, **kwargs):
     """
@@ -30,3 +42,26 @@ def crear_wallet_usuario(sender, instance, created, **kwargs):
             tipo_cuenta='USER',
             balance_usdc=Decimal('1000.00')  # Saldo inicial de demo
         )
+
+
+@receiver(post_save, sender=Wallet)
+def registrar_saldo_apertura(sender, instance, created, **kwargs):
+    """
+    Las wallets pueden crearse con saldo inicial (bono de demo, scripts):
+    ese saldo se registra en el libro mayor como ingreso desde la cuenta externa.
+    """
+    if created and instance.balance_usdc:
+        registrar_asientos(
+            None, instance, Decimal(str(instance.balance_usdc)),
+            'APERTURA', referencia=f'wallet:{instance.pk}'
+        )
+
+
+@receiver(post_delete, sender=Wallet)
+def olvidar_cuenta_escrow(sender, instance, **kwargs):
+    """
+    Si se borra una cuenta de escrow se limpia la caché de
+    Wallet.get_escrow_account para que se vuelva a resolver.
+    """
+    if instance.tipo_cuenta == 'ESCROW':
+        Wallet.clear_escrow_cache()
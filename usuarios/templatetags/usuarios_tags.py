@@ -1,4 +1,7 @@
+import uuid
+
 from django import template
+from django.utils.html import format_html
 from decimal import Decimal
 
 register = template.Library()
@@ -34,3 +37,11 @@ def mul(value, arg):
         return Decimal(str(value)) * Decimal(str(arg))
     except (ValueError, TypeError, AttributeError):
         return 0
+
+@register.simple_tag
+def idempotency_field():
+    """
+    Campo oculto con una clave de idempotencia nueva por cada render del formulario.
+    Uso: {% idempotency_field %} junto a {% csrf_token %}
+    """
+    return format_html('<input type="hidden" name="idempotency_key" value="{}">', uuid.uuid4().hex)
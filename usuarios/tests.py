@@ -1 +1,800 @@
-# Create your tests here.
+import re
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+import requests
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import User
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.http import HttpResponse, HttpResponseRedirect
+from django.template import RequestContext, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from jobs.models import Bid, EscrowTransaction, JobOffer as Trabajo
+from . import ledger
+from .circuit_breaker import CircuitBreaker, CircuitoAbiertoError
+from .currency_service import CurrencyService
+from .idempotency import IDEMPOTENCY_FIELD, idempotente
+from .middleware import ExchangeRateMiddleware, OnboardingMiddleware
+from .models import (
+    CotizacionHistorica, IdempotencyKey, JobOffer, LedgerCheckpoint, LedgerEntry, Proposal, SaldoInsuficienteError,
+    Transaction, UserProfile, Wallet,
+)
+from .query_budget import ContadorConsultas
+from .user_context import MARCA_ONBOARDING
+
+
+@skipUnless(connection.vendor == 'sqlite', 'El plan se lee con EXPLAIN QUERY PLAN de SQLite')
+class IndicesConsultasTest(TestCase):
+    """
+    Las consultas calientes sobre Transaction y EscrowTransaction deben
+    resolverse con búsquedas en índices: si alguna cae en un SCAN de la
+    tabla (p. ej. porque se borró un índice o cambió un filtro) el test falla.
+    """
+
+    TABLAS = ('usuarios_transaction', 'jobs_escrowtransaction')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = User.objects.create_user('cliente', password='x')
+        cls.profesional = User.objects.create_user('profesional', password='x')
+        cls.wallet_cliente = Wallet.objects.get(user=cls.cliente)
+
+        cls.oferta = JobOffer.objects.create(
+            creador=cls.cliente,
+            titulo='Pintura',
+            zona='CABA',
+            presupuesto_ars=Decimal('100000'),
+        )
+        cls.propuesta = Proposal.objects.create(
+            oferta=cls.oferta,
+            profesional=cls.profesional,
+            monto=Decimal('100.00'),
+            dias_entrega=5,
+        )
+
+        cls.trabajo = Trabajo.objects.create(
+            creator=cls.cliente.profile,
+            title='Pintura',
+            description='Pintar living',
+            budget_base_ars=Decimal('100000'),
+        )
+        cls.bid = Bid.objects.create(
+            job_offer=cls.trabajo,
+            professional=cls.profesional.profile,
+            amount_ars=Decimal('100000'),
+            estimated_days=5,
+            pitch_text='Presupuesto',
+        )
+
+    def setUp(self):
+        patcher = mock.patch.object(CurrencyService, 'get_rate_at', return_value=Decimal('1000'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def assertSinScanCompleto(self, funcion):
+        """Ejecuta `funcion` y revisa el plan de cada SELECT que emitió."""
+        with CaptureQueriesContext(connection) as consultas:
+            funcion()
+
+        selects = [c['sql'] for c in consultas.captured_queries if c['sql'].startswith('SELECT')]
+        self.assertTrue(selects, 'La función no ejecutó ninguna consulta')
+
+        for sql in selects:
+            if not any(tabla in sql for tabla in self.TABLAS):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = [fila[-1] for fila in cursor.fetchall()]
+            scans = [paso for paso in plan if re.match(r'SCAN (?!CONSTANT ROW)', paso)]
+            self.assertFalse(scans, f'Scan completo en:\n{sql}\nPlan: {plan}')
+
+    def test_historial_wallet(self):
+        self.assertSinScanCompleto(lambda: Transaction.historial_wallet(self.wallet_cliente))
+
+    def test_historial_wallet_con_cursor(self):
+        self.assertSinScanCompleto(
+            lambda: Transaction.historial_wallet(self.wallet_cliente, antes=(timezone.now(), 10))
+        )
+
+    def test_totales_wallet(self):
+        self.assertSinScanCompleto(lambda: Transaction.totales_wallet(self.wallet_cliente))
+
+    def test_escrow_de_propuesta(self):
+        self.assertSinScanCompleto(lambda: Transaction.liberar_pago_a_profesional(self.propuesta))
+
+    def test_depositos_de_trabajo(self):
+        self.assertSinScanCompleto(lambda: EscrowTransaction.release_initial_payment(self.trabajo, self.bid))
+
+    def test_fondos_bloqueados_de_cliente(self):
+        self.assertSinScanCompleto(lambda: list(
+            EscrowTransaction.objects.filter(from_wallet=self.wallet_cliente, status='LOCKED')
+        ))
+
+    def test_fondos_bloqueados_de_profesional(self):
+        self.assertSinScanCompleto(lambda: list(
+            EscrowTransaction.objects.filter(bid__professional=self.profesional.profile, status='LOCKED')
+        ))
+
+
+class ContadorConsultasTest(TestCase):
+    """El contador de consultas de QueryBudgetMiddleware tiene que detectar los N+1."""
+
+    def test_detecta_consultas_repetidas(self):
+        contador = ContadorConsultas()
+        with contador.activo():
+            for pk in range(5):
+                User.objects.filter(pk=pk).exists()
+            User.objects.filter(pk__in=[1, 2]).exists()
+            User.objects.filter(pk__in=[1, 2, 3]).exists()
+
+        self.assertEqual(contador.total, 7)
+        self.assertEqual([veces for _, veces in contador.repetidas(2)], [5, 2])
+
+
+class ContextoUsuarioTest(TestCase):
+    """
+    El usuario, su perfil y su wallet se cargan en la consulta de
+    autenticación (usuarios/backends.py): obtener_perfil / obtener_wallet
+    no vuelven a la base.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('cliente', password='x')
+        UserProfile.objects.filter(user=cls.usuario).update(tipo_rol='PERSONA', zona='CABA', telefono='1')
+
+    def setUp(self):
+        patcher = mock.patch.object(CurrencyService, 'get_usdc_to_ars_rate', return_value=Decimal('1000'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_login(self.usuario)
+        # Primer request: guarda la marca de onboarding en la sesión
+        self.client.get(reverse('usuarios:wallet_escrow'))
+
+    def test_wallet_escrow(self):
+        # Sesión, usuario con perfil y wallet, conteo y detalle de escrow, cuentas sociales (navbar)
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('usuarios:wallet_escrow'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_perfil_y_wallet_en_la_consulta_del_usuario(self):
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(reverse('usuarios:wallet_escrow'))
+
+        usuario = [c['sql'] for c in consultas.captured_queries if 'FROM "auth_user"' in c['sql']]
+        self.assertEqual(len(usuario), 1)
+        self.assertIn('"usuarios_userprofile"', usuario[0])
+        self.assertIn('"usuarios_wallet"', usuario[0])
+
+    def test_sesion_con_backend_anterior(self):
+        self.client.force_login(self.usuario, backend='django.contrib.auth.backends.ModelBackend')
+
+        response = self.client.get(reverse('usuarios:wallet_escrow'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.session[BACKEND_SESSION_KEY], 'usuarios.backends.ModelBackend')
+
+
+@override_settings(ONBOARDING_SESSION_MARKER=True)
+class MarcaOnboardingTest(TestCase):
+    """
+    Con la marca de onboarding en la sesión, OnboardingMiddleware no evalúa
+    request.user; un cambio del perfil la invalida.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('cliente', password='x')
+        UserProfile.objects.filter(user=cls.usuario).update(tipo_rol='PERSONA', zona='CABA', telefono='1')
+
+    def setUp(self):
+        patcher = mock.patch.object(CurrencyService, 'get_usdc_to_ars_rate', return_value=Decimal('1000'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_login(self.usuario)
+        self.client.get(reverse('usuarios:ofertas_lista'))
+
+    def _pasar_por_middleware(self):
+        """Request por sesión, autenticación y onboarding hasta una vista que no usa request.user."""
+        cadena = SessionMiddleware(AuthenticationMiddleware(OnboardingMiddleware(lambda request: HttpResponse())))
+        request = RequestFactory().get(reverse('usuarios:ofertas_lista'))
+        request.COOKIES[settings.SESSION_COOKIE_NAME] = self.client.session.session_key
+        return cadena(request)
+
+    def test_marca_guardada(self):
+        self.assertIn(MARCA_ONBOARDING, self.client.session)
+
+    def test_marca_evita_la_consulta_del_usuario(self):
+        # Sólo la lectura de la sesión
+        with self.assertNumQueries(1):
+            response = self._pasar_por_middleware()
+        self.assertEqual(response.status_code, 200)
+
+    def test_cambio_de_perfil_invalida_la_marca(self):
+        perfil = UserProfile.objects.get(user=self.usuario)
+        perfil.tipo_rol = ''
+        perfil.save()
+
+        response = self.client.get(reverse('usuarios:ofertas_lista'))
+        self.assertRedirects(response, reverse('usuarios:role_selection'), fetch_redirect_response=False)
+
+    @override_settings(ONBOARDING_SESSION_MARKER=False)
+    def test_sin_cache_compartida_no_hay_marca(self):
+        self.client.logout()
+        self.client.force_login(self.usuario)
+        self.client.get(reverse('usuarios:ofertas_lista'))
+
+        self.assertNotIn(MARCA_ONBOARDING, self.client.session)
+
+
+class RefrescoCotizacionesTest(TestCase):
+    """
+    Stale-while-revalidate: una tasa vencida (o, en frío, la del historial o
+    la tasa por defecto) se sirve sin esperar a la API y se renueva en
+    segundo plano.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        patcher = mock.patch.object(CurrencyService, '_fetch_rate_from_api', return_value=Decimal('1500'))
+        self.api = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _tasa_vencida(self, tasa='1200'):
+        cache.set(CurrencyService._cache_key('blue'), {
+            'tasa': tasa,
+            'obtenida_en': time.time() - CurrencyService.CACHE_TIMEOUT - 60,
+            'duracion': 0,
+        }, None)
+
+    @override_settings(CURRENCY_BACKGROUND_REFRESH=True)
+    def test_tasa_vencida_se_sirve_y_se_renueva_en_un_hilo(self):
+        self._tasa_vencida()
+
+        with mock.patch.object(CurrencyService, '_revalidar_en_segundo_plano') as revalidar:
+            snapshot = CurrencyService.get_rate_snapshot('blue')
+        self.assertEqual(snapshot['tasa'], Decimal('1200'))
+        self.assertFalse(snapshot['fresca'])
+        revalidar.assert_called_once_with('blue')
+        self.api.assert_not_called()
+
+        # El hilo renueva la tasa para los requests siguientes
+        with mock.patch('usuarios.currency_service.connections'):
+            with mock.patch('usuarios.currency_service.threading.Thread') as hilo:
+                CurrencyService._revalidar_en_segundo_plano('blue')
+            CurrencyService._refrescar_en_hilo(*hilo.call_args.kwargs['args'])
+        self.assertEqual(CurrencyService.get_usdc_to_ars_rate('blue'), Decimal('1500'))
+        self.assertIsNone(cache.get(CurrencyService._lock_key('blue')))
+
+    @override_settings(CURRENCY_BACKGROUND_REFRESH=True)
+    def test_un_solo_refresco_a_la_vez(self):
+        cache.add(CurrencyService._lock_key('blue'), 'otro', CurrencyService.LOCK_TIMEOUT)
+
+        with mock.patch('usuarios.currency_service.threading.Thread') as hilo:
+            CurrencyService._revalidar_en_segundo_plano('blue')
+        hilo.assert_not_called()
+
+    @override_settings(CURRENCY_BACKGROUND_REFRESH=True)
+    def test_sin_tasa_previa_no_espera_a_la_api(self):
+        with mock.patch.object(CurrencyService, '_revalidar_en_segundo_plano') as revalidar:
+            snapshot = CurrencyService.get_rate_snapshot('blue')
+        self.assertEqual(snapshot['tasa'], CurrencyService.DEFAULT_RATE)
+        self.assertIsNone(snapshot['timestamp'])
+        self.assertFalse(snapshot['fresca'])
+        revalidar.assert_called_once_with('blue')
+        self.api.assert_not_called()
+
+    @override_settings(CURRENCY_BACKGROUND_REFRESH=True)
+    def test_sin_tasa_previa_usa_la_ultima_del_historial(self):
+        CotizacionHistorica.registrar('blue', Decimal('1350.00'))
+
+        with mock.patch.object(CurrencyService, '_revalidar_en_segundo_plano') as revalidar:
+            snapshot = CurrencyService.get_rate_snapshot('blue')
+        self.assertEqual(snapshot['tasa'], Decimal('1350.00'))
+        self.assertIsNotNone(snapshot['timestamp'])
+        self.assertFalse(snapshot['fresca'])
+        revalidar.assert_called_once_with('blue')
+        self.api.assert_not_called()
+
+    @override_settings(CURRENCY_BACKGROUND_REFRESH=False)
+    def test_sin_refresco_en_segundo_plano_se_consulta_en_linea(self):
+        self.assertEqual(CurrencyService.get_usdc_to_ars_rate('blue'), Decimal('1500'))
+        self.api.assert_called_once_with('blue')
+
+    @override_settings(CACHE_COMPARTIDA=False)
+    def test_comando_requiere_cache_compartida(self):
+        with self.assertRaises(CommandError):
+            call_command('actualizar_cotizaciones', '--una-vez')
+        self.api.assert_not_called()
+
+
+class SingleFlightCotizacionTest(TestCase):
+    """
+    Varios requests que encuentran la caché vacía a la vez consultan la API
+    una sola vez: el resto espera la tasa que deja el que tomó el lock.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.llamadas = 0
+        self.contador = threading.Lock()
+
+        def consultar_api(tipo_cambio='blue'):
+            with self.contador:
+                self.llamadas += 1
+            time.sleep(0.3)  # Los demás llegan mientras la API responde
+            return Decimal('1500')
+
+        for nombre, reemplazo in (('_fetch_rate_from_api', consultar_api), ('_registrar_historial', None)):
+            patcher = mock.patch.object(CurrencyService, nombre, side_effect=reemplazo)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @override_settings(CURRENCY_BACKGROUND_REFRESH=False)
+    def test_misses_concurrentes_consultan_la_api_una_vez(self):
+        concurrentes = 8
+        largada = threading.Barrier(concurrentes)
+        tasas = []
+
+        def request():
+            largada.wait()
+            tasas.append(CurrencyService.get_usdc_to_ars_rate('blue'))
+
+        hilos = [threading.Thread(target=request) for _ in range(concurrentes)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(self.llamadas, 1)
+        self.assertEqual(tasas, [Decimal('1500')] * concurrentes)
+        self.assertIsNone(cache.get(CurrencyService._lock_key('blue')))
+
+    def test_expiracion_anticipada_sin_vencer(self):
+        entrada = {'tasa': '1500', 'obtenida_en': time.time(), 'duracion': 0.5}
+        # Recién obtenida: nunca se adelanta; al borde del vencimiento, casi siempre
+        self.assertFalse(CurrencyService._debe_refrescar(entrada))
+        entrada['obtenida_en'] = time.time() - CurrencyService.CACHE_TIMEOUT
+        self.assertTrue(CurrencyService._debe_refrescar(entrada))
+
+
+class CotizacionPorRequestTest(TestCase):
+    """
+    La cotización del context processor es perezosa: sólo lee la caché si el
+    template la usa. Con ExchangeRateMiddleware, el context processor, los
+    template tags y los modelos comparten una sola lectura por request.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('cliente', password='x')
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        cache.set(CurrencyService._cache_key('blue'), {'tasa': '1500', 'obtenida_en': time.time(), 'duracion': 0})
+
+    def _request(self, plantilla, vista_extra=lambda request: ''):
+        request = RequestFactory().get('/')
+        request.user = self.usuario
+
+        def vista(request):
+            contenido = Template(plantilla).render(RequestContext(request))
+            return HttpResponse(contenido + vista_extra(request))
+
+        with mock.patch.object(CurrencyService, '_leer_cache', wraps=CurrencyService._leer_cache) as leer:
+            response = ExchangeRateMiddleware(vista)(request)
+        return response.content.decode(), leer.call_count
+
+    def test_plantilla_sin_montos_no_lee_la_cache(self):
+        with self.assertNumQueries(0):
+            contenido, lecturas = self._request('<h1>Hola</h1>')
+
+        self.assertEqual(contenido, '<h1>Hola</h1>')
+        self.assertEqual(lecturas, 0)
+
+    def test_se_resuelve_al_usarla(self):
+        contenido, lecturas = self._request('{{ exchange_rate_blue }}|{{ exchange_rate_blue|floatformat:2 }}')
+
+        self.assertEqual(contenido, '1500|1500,00')
+        self.assertEqual(lecturas, 1)
+
+
+    def test_una_lectura_de_cache_por_request(self):
+        contenido, lecturas = self._request(
+            '{% load currency_tags %}{{ exchange_rate_blue }}|{{ wallet_balance_ars }}|'
+            '{{ 10|to_ars }}|{% get_exchange_rate %}|{% show_balance_dual 5 %}',
+            vista_extra=lambda request: f"|{request.user.wallet.get_balance_ars()}",
+        )
+
+        self.assertEqual(lecturas, 1)
+        self.assertTrue(contenido.startswith('1500|1500000,00|15000,00|1500|'))
+        self.assertTrue(contenido.endswith('|1500000.00'))
+
+    def test_cada_request_vuelve_a_leer(self):
+        self.assertEqual(self._request('{{ exchange_rate_blue }}')[1], 1)
+        cache.set(CurrencyService._cache_key('blue'), {'tasa': '1600', 'obtenida_en': time.time(), 'duracion': 0})
+        self.assertEqual(self._request('{{ exchange_rate_blue }}'), ('1600', 1))
+
+
+class ConversionMasivaTest(TestCase):
+    """
+    convert_many_* y annotate_ars dan lo mismo que la conversión monto por
+    monto, con una sola lectura de la tasa.
+    """
+
+    tasa = Decimal('1000.01')
+    montos = [Decimal('0.01'), Decimal('0.50'), Decimal('33.33'), Decimal('1000.00'), Decimal('999999.99')]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.wallets = []
+        for numero, monto in enumerate(cls.montos):
+            wallet = User.objects.create_user(f'usuario{numero}', password='x').wallet
+            Wallet.objects.filter(pk=wallet.pk).update(balance_usdc=monto)
+            cls.wallets.append(wallet.pk)
+
+    def setUp(self):
+        patcher = mock.patch.object(CurrencyService, 'get_usdc_to_ars_rate', return_value=self.tasa)
+        self.get_tasa = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_convert_many_igual_a_la_conversion_escalar(self):
+        escalares = [CurrencyService.convert_usdc_to_ars(monto) for monto in self.montos]
+        self.get_tasa.reset_mock()
+
+        self.assertEqual(CurrencyService.convert_many_usdc_to_ars(self.montos), escalares)
+        self.assertEqual(self.get_tasa.call_count, 1)
+
+        self.assertEqual(
+            CurrencyService.convert_many_ars_to_usdc(escalares),
+            [CurrencyService.convert_ars_to_usdc(monto) for monto in escalares],
+        )
+
+    def test_annotate_ars_igual_a_la_conversion_escalar(self):
+        wallets = CurrencyService.annotate_ars(Wallet.objects.filter(pk__in=self.wallets))
+
+        for wallet in wallets:
+            # 0.50 * 1000.01 = 500.005: ROUND() de la base redondea la mitad hacia arriba
+            with self.subTest(balance_usdc=wallet.balance_usdc):
+                self.assertEqual(wallet.balance_ars, CurrencyService.convert_usdc_to_ars(wallet.balance_usdc))
+
+
+class CircuitBreakerTest(TestCase):
+    """
+    Con las APIs caídas el circuito y la caché negativa limitan las
+    llamadas: una prueba por intervalo, no una por request.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.ahora = 1_000_000.0
+        patcher = mock.patch('usuarios.circuit_breaker.time')
+        patcher.start().time.side_effect = lambda: self.ahora
+        self.addCleanup(patcher.stop)
+
+    def _fallar(self):
+        raise requests.ConnectionError('caída')
+
+    def test_cerrado_abierto_semiabierto_cerrado(self):
+        breaker = CircuitBreaker('prueba', umbral_fallas=2, tiempo_reapertura=60)
+        self.enterContext(self.assertLogs('usuarios.circuit_breaker'))
+        funcion = mock.Mock(side_effect=requests.ConnectionError('caída'))
+
+        for _ in range(2):
+            self.assertEqual(breaker.estado(), CircuitBreaker.CERRADO)
+            with self.assertRaises(requests.ConnectionError):
+                breaker.llamar(funcion)
+        self.assertEqual(breaker.estado(), CircuitBreaker.ABIERTO)
+
+        # Abierto: no se llama al servicio
+        with self.assertRaises(CircuitoAbiertoError):
+            breaker.llamar(funcion)
+        self.assertEqual(funcion.call_count, 2)
+
+        self.ahora += 60
+        self.assertEqual(breaker.estado(), CircuitBreaker.SEMIABIERTO)
+        funcion.side_effect = None
+        funcion.return_value = Decimal('1500')
+        self.assertEqual(breaker.llamar(funcion), Decimal('1500'))
+        self.assertEqual(breaker.estado(), CircuitBreaker.CERRADO)
+        self.assertEqual(breaker.metricas()['fallas'], 0)
+
+    def test_una_sola_prueba_por_intervalo(self):
+        breaker = CircuitBreaker('prueba', umbral_fallas=1, tiempo_reapertura=60)
+        self.enterContext(self.assertLogs('usuarios.circuit_breaker'))
+        with self.assertRaises(requests.ConnectionError):
+            breaker.llamar(self._fallar)
+
+        self.ahora += 60
+        # Sólo el primero obtiene la sonda (cache.add)
+        self.assertTrue(breaker.permitir())
+        self.assertFalse(breaker.permitir())
+
+        # La prueba falla: vuelve a abrirse por otro intervalo
+        breaker.registrar_falla()
+        self.assertEqual(breaker.estado(), CircuitBreaker.ABIERTO)
+        self.assertFalse(breaker.permitir())
+        self.ahora += 60
+        self.assertTrue(breaker.permitir())
+
+    @override_settings(
+        CURRENCY_BACKGROUND_REFRESH=False,
+        CURRENCY_BREAKER_FAILURE_THRESHOLD=3,
+        CURRENCY_NEGATIVE_CACHE_TIMEOUT=30,
+    )
+    def test_api_caida_no_se_consulta_en_cada_request(self):
+        with mock.patch('usuarios.currency_service.requests.get', side_effect=requests.ConnectionError) as get, \
+                self.assertLogs('usuarios', 'WARNING'):
+            # Caché negativa: tras el primer fallo los requests no vuelven a probar
+            for _ in range(50):
+                self.assertEqual(CurrencyService.get_usdc_to_ars_rate('blue'), CurrencyService.DEFAULT_RATE)
+            self.assertEqual(get.call_count, 2)  # DolarAPI + respaldo
+
+            # Vence la caché negativa varias veces: tras 3 fallas se abren los circuitos
+            for _ in range(10):
+                cache.delete(CurrencyService._fallo_key('blue'))
+                for _ in range(20):
+                    CurrencyService.get_usdc_to_ars_rate('blue')
+            self.assertEqual(get.call_count, 3 * 2)
+
+        metricas = CurrencyService.get_breaker_metrics()
+        self.assertEqual(metricas['apis']['dolarapi']['estado'], CircuitBreaker.ABIERTO)
+        self.assertEqual(metricas['apis']['exchangerate']['estado'], CircuitBreaker.ABIERTO)
+        self.assertTrue(metricas['fallo_reciente']['blue'])
+
+
+class LibroMayorTest(TestCase):
+    """
+    Partida doble: los asientos de cada movimiento suman cero y el saldo
+    según el libro mayor (checkpoint + asientos posteriores) coincide con
+    Wallet.balance_usdc; conciliar reporta lo que se cambió por fuera.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.origen = User.objects.create_user('origen', password='x').wallet
+        cls.destino = User.objects.create_user('destino', password='x').wallet
+
+    def _transferir(self, monto):
+        Wallet.transferir_saldo(self.origen, self.destino, Decimal(monto), referencia='test')
+
+    def test_restar_saldo_insuficiente(self):
+        self.assertFalse(self.origen.restar_saldo(Decimal('1000.01')))
+
+        self.assertEqual(self.origen.balance_usdc, Decimal('1000.00'))
+        self.origen.refresh_from_db()
+        self.assertEqual(self.origen.balance_usdc, Decimal('1000.00'))
+
+    def test_transferencia_sin_saldo_no_registra_asientos(self):
+        asientos = LedgerEntry.objects.count()
+
+        with self.assertRaises(SaldoInsuficienteError):
+            self._transferir('1500.00')
+
+        self.destino.refresh_from_db()
+        self.assertEqual(self.destino.balance_usdc, Decimal('1000.00'))
+        self.assertEqual(LedgerEntry.objects.count(), asientos)
+
+    def test_asientos_balanceados(self):
+        movimiento = Wallet.transferir_saldo(self.origen, self.destino, Decimal('250.00'))
+
+        self.assertEqual(LedgerEntry.objects.filter(movimiento=movimiento).count(), 2)
+        descuadrados = LedgerEntry.objects.order_by().values('movimiento').annotate(
+            total=Sum('monto_usdc')
+        ).exclude(total=0)
+        self.assertFalse(descuadrados.exists())
+
+    def test_saldo_en_coincide_con_la_wallet(self):
+        antes = timezone.now()
+        self._transferir('250.00')
+        self._transferir('100.00')
+
+        for wallet in (self.origen, self.destino):
+            wallet.refresh_from_db()
+            self.assertEqual(ledger.saldo_en(wallet), wallet.balance_usdc)
+        self.assertEqual(ledger.saldo_en(self.origen, antes), Decimal('1000.00'))
+
+    def test_checkpoint_mas_asientos_posteriores(self):
+        self._transferir('250.00')
+        with mock.patch.object(ledger, 'MARGEN_SEGUNDOS', 0):
+            self.assertEqual(ledger.generar_checkpoints(), 2)
+        checkpoint = LedgerCheckpoint.objects.get(wallet=self.origen)
+        self.assertEqual(checkpoint.saldo_usdc, Decimal('750.00'))
+
+        self._transferir('100.00')
+        self.origen.refresh_from_db()
+        self.assertEqual(self.origen.balance_usdc, Decimal('650.00'))
+        self.assertEqual(ledger.saldo_en(self.origen), Decimal('650.00'))
+
+    def test_marca_de_agua_deja_los_asientos_recientes(self):
+        self._transferir('250.00')
+
+        # Recién escritos: podría haber un ID menor todavía sin confirmar
+        self.assertIsNone(ledger.marca_de_agua())
+        self.assertEqual(ledger.generar_checkpoints(), 0)
+
+    def test_conciliar_reporta_cambios_fuera_del_libro_mayor(self):
+        self._transferir('250.00')
+        Wallet.objects.filter(pk=self.destino.pk).update(balance_usdc=F('balance_usdc') + Decimal('5.00'))
+        hasta = LedgerEntry.objects.order_by('-id').values_list('id', flat=True).first()
+
+        diferencias = list(ledger.conciliar(Wallet.objects.all(), hasta))
+
+        self.assertEqual(len(diferencias), 1)
+        self.assertEqual(diferencias[0]['wallet_id'], self.destino.pk)
+        self.assertEqual(diferencias[0]['saldo_ledger'], Decimal('1250.00'))
+        self.assertEqual(diferencias[0]['diferencia'], Decimal('5.00'))
+
+    def test_carga_de_fondos_desde_la_cuenta_externa(self):
+        self.client.force_login(self.origen.user)
+        with mock.patch.object(CurrencyService, 'get_usdc_to_ars_rate', return_value=Decimal('1000')):
+            self.client.post(reverse('usuarios:cargar_fondos'), {'monto_ars': '50000', IDEMPOTENCY_FIELD: 'carga-1'})
+
+        carga = Transaction.objects.get(metadata__tipo='carga_manual')
+        self.assertIsNone(carga.from_wallet)
+        self.assertEqual(carga.monto_usdc, Decimal('50.00'))
+        self.assertFalse(Wallet.objects.filter(tipo_cuenta='ESCROW').exists())
+        self.assertEqual(ledger.saldo_en(self.origen), Decimal('1050.00'))
+
+
+class CuentaEscrowCacheTest(TestCase):
+    """
+    Wallet.get_escrow_account resuelve cada sub-cuenta una vez por proceso y
+    no memoriza cuentas creadas en una transacción que se revierte.
+    """
+
+    def setUp(self):
+        Wallet.clear_escrow_cache()
+        self.addCleanup(Wallet.clear_escrow_cache)
+
+    def _resolver(self, job_id):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Wallet.get_escrow_account(job_id)
+
+    def test_segunda_busqueda_sin_consultas(self):
+        primera = self._resolver(5)
+
+        with self.assertNumQueries(0):
+            segunda = Wallet.get_escrow_account(5)
+        self.assertEqual((segunda.pk, segunda.shard, segunda.tipo_cuenta), (primera.pk, primera.shard, 'ESCROW'))
+
+        # El saldo queda diferido: se lee recién al usarlo
+        with self.assertNumQueries(1):
+            self.assertEqual(segunda.balance_usdc, Decimal('0.00'))
+
+    def test_rollback_no_deja_la_cuenta_en_cache(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                revertida = Wallet.get_escrow_account(3)
+                raise RuntimeError('se revierte')
+        self.assertEqual(callbacks, [])
+        self.assertFalse(Wallet.objects.filter(pk=revertida.pk).exists())
+
+        # La siguiente búsqueda vuelve a la base y crea la cuenta de verdad
+        with CaptureQueriesContext(connection) as consultas:
+            cuenta = self._resolver(3)
+        self.assertTrue(consultas.captured_queries)
+        self.assertTrue(Wallet.objects.filter(pk=cuenta.pk, tipo_cuenta='ESCROW').exists())
+
+    def test_borrar_la_cuenta_limpia_la_cache(self):
+        cuenta = self._resolver(2)
+        Wallet.objects.get(pk=cuenta.pk).delete()
+
+        nueva = self._resolver(2)
+        self.assertNotEqual(nueva.pk, cuenta.pk)
+        self.assertTrue(Wallet.objects.filter(pk=nueva.pk).exists())
+
+
+class IdempotenciaTest(TestCase):
+    """
+    @idempotente: un reintento con la misma clave devuelve la respuesta
+    guardada sin ejecutar la vista; la clave se libera si la vista falla.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('cliente', password='x')
+
+    def setUp(self):
+        self.llamadas = 0
+        self.respuesta = lambda request: HttpResponseRedirect('/hecho/')
+        self.vista = idempotente(self._vista)
+
+    def _vista(self, request):
+        self.llamadas += 1
+        return self.respuesta(request)
+
+    def _post(self, clave='clave-1', **datos):
+        request = RequestFactory().post('/operacion/', {'monto': '100', IDEMPOTENCY_FIELD: clave, **datos})
+        request.user = self.usuario
+        request._messages = CookieStorage(request)
+        return self.vista(request)
+
+    def test_reintento_devuelve_la_respuesta_guardada(self):
+        primera = self._post()
+        segunda = self._post()
+
+        self.assertEqual(self.llamadas, 1)
+        self.assertEqual(segunda.status_code, primera.status_code)
+        self.assertEqual(segunda['Location'], '/hecho/')
+
+    def test_misma_clave_con_otros_datos(self):
+        self._post()
+
+        response = self._post(monto='200')
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.llamadas, 1)
+
+    def test_operacion_en_curso(self):
+        # Un reintento que llega mientras la primera ejecución sigue en la vista
+        concurrentes = []
+        self.respuesta = lambda request: concurrentes.append(self._post()) or HttpResponseRedirect('/hecho/')
+
+        self._post()
+
+        self.assertEqual(concurrentes[0].status_code, 409)
+        self.assertEqual(self.llamadas, 1)
+
+    def test_excepcion_libera_la_clave(self):
+        def fallar(request):
+            raise RuntimeError('falla de la vista')
+        self.respuesta = fallar
+
+        with self.assertRaises(RuntimeError):
+            self._post()
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        self.respuesta = lambda request: HttpResponseRedirect('/hecho/')
+        self.assertEqual(self._post()['Location'], '/hecho/')
+        self.assertEqual(self.llamadas, 2)
+
+    def test_reintento_repite_cuerpo_y_content_type(self):
+        self.respuesta = lambda request: HttpResponse('{"ok": true}', status=201, content_type='application/json')
+        self._post()
+
+        segunda = self._post()
+
+        self.assertEqual(self.llamadas, 1)
+        self.assertEqual(segunda.status_code, 201)
+        self.assertEqual(segunda['Content-Type'], 'application/json')
+        self.assertEqual(segunda.content, b'{"ok": true}')
+
+    @override_settings(IDEMPOTENCY_WINDOW=10)
+    def test_clave_derivada_ventana_deslizante(self):
+        inicio = timezone.now()
+        with mock.patch('usuarios.models.timezone.now') as ahora:
+            # Sin clave: dos envíos a 9 s se deduplican aunque crucen una franja de 10 s
+            for segundos, llamadas in ((0, 1), (9, 1), (10, 2), (15, 2), (21, 3)):
+                ahora.return_value = inicio + timedelta(seconds=segundos)
+                self._post(clave='')
+                self.assertEqual(self.llamadas, llamadas, f'a los {segundos} s')
+
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+    def test_error_5xx_libera_la_clave(self):
+        self.respuesta = lambda request: HttpResponse(status=503)
+        self.assertEqual(self._post().status_code, 503)
+
+        self.respuesta = lambda request: HttpResponseRedirect('/hecho/')
+        self.assertEqual(self._post().status_code, 302)
+        self.assertEqual(self.llamadas, 2)
@@ -0,0 +1,134 @@
+"""
+Contexto del usuario por request.
+
+Los backends de usuarios/backends.py cargan `request.user` con su perfil y su
+wallet en la misma consulta de autenticación (`select_related('profile',
+'wallet')`). El middleware, los context processors, los templates y las
+vistas comparten esa instancia: `request.user.profile` y `request.user.wallet`
+ya no consultan la base.
+
+Cuando el usuario ya tiene rol, el middleware guarda en la sesión una marca
+firmada "onboarding completo" (`pk:versión`). La versión vive en la caché y
+la sube cada guardado de UserProfile, así la verificación de los usuarios
+que ya completaron el onboarding no evalúa `request.user` (ni consulta la
+base). La versión tiene que ser la misma en todos los workers: la marca se
+usa sólo con ONBOARDING_SESSION_MARKER, que por defecto requiere una caché
+compartida (CACHE_COMPARTIDA). Sin ella el middleware revisa el perfil, que
+ya viene cargado con el usuario.
+"""
+
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, SESSION_KEY
+from django.core import signing
+from django.core.cache import cache
+
+from .backends import BACKENDS_ANTERIORES
+
+MARCA_ONBOARDING = '_onboarding_completo'
+
+_signer = signing.Signer(salt='usuarios.onboarding')
+
+
+def migrar_backend_de_sesion(request):
+    """
+    Las sesiones abiertas con los backends estándar de Django/allauth pasan
+    al equivalente de usuarios/backends.py (sin cerrarlas) para que el
+    usuario se cargue con perfil y wallet. Va antes del primer uso de
+    `request.user`.
+    """
+    anterior = request.session.get(BACKEND_SESSION_KEY)
+    nuevo = BACKENDS_ANTERIORES.get(anterior)
+    if nuevo and anterior not in settings.AUTHENTICATION_BACKENDS:
+        request.session[BACKEND_SESSION_KEY] = nuevo
+
+
+def obtener_perfil(user, **defaults):
+    """
+    Perfil del usuario; si no existe (usuarios anteriores a la señal que
+    crea el perfil) lo crea con `defaults`.
+    """
+    from .models import UserProfile
+
+    try:
+        return user.profile
+    except UserProfile.DoesNotExist:
+        user.profile = UserProfile.objects.create(user=user, **defaults)
+        return user.profile
+
+
+def obtener_wallet(user, saldo_inicial=Decimal('1000.00')):
+    """
+    Wallet del usuario; si no existe la crea con `saldo_inicial` (reemplaza
+    los Wallet.objects.get_or_create de las vistas).
+    """
+    from .models import Wallet
+
+    try:
+        return user.wallet
+    except Wallet.DoesNotExist:
+        wallet, created = Wallet.objects.get_or_create(
+            user=user,
+            defaults={
+                'tipo_cuenta': 'USER',
+                'balance_usdc': saldo_inicial
+            }
+        )
+        user.wallet = wallet
+        return wallet
+
+
+def _version_onboarding_key(user_id):
+    return f"onboarding:version:{user_id}"
+
+
+def version_onboarding(user_id):
+    """Versión vigente del perfil para las marcas de onboarding."""
+    clave = _version_onboarding_key(user_id)
+    version = cache.get(clave)
+    if version is None:
+        # Basada en el reloj: si la clave se pierde, las marcas anteriores no vuelven a valer
+        version = int(time.time() * 1000)
+        if not cache.add(clave, version, None):
+            version = cache.get(clave, version)
+    return version
+
+
+def invalidar_onboarding(user_id):
+    """Sube la versión del perfil: las marcas guardadas en sesión dejan de valer."""
+    try:
+        cache.incr(_version_onboarding_key(user_id))
+    except ValueError:
+        cache.set(_version_onboarding_key(user_id), int(time.time() * 1000), None)
+
+
+def onboarding_marcado(request):
+    """
+    True si la sesión tiene una marca de onboarding válida para el usuario
+    logueado. No evalúa `request.user`: sólo lee la sesión y la caché.
+    """
+    if not settings.ONBOARDING_SESSION_MARKER:
+        return False
+    marca = request.session.get(MARCA_ONBOARDING)
+    user_id = request.session.get(SESSION_KEY)
+    if not marca or not user_id:
+        return False
+    try:
+        valor = _signer.unsign(marca)
+    except signing.BadSignature:
+        return False
+    return valor == f"{user_id}:{version_onboarding(user_id)}"
+
+
+def marcar_onboarding(request):
+    """Guarda la marca de onboarding completo del usuario logueado."""
+    user_id = request.session.get(SESSION_KEY)
+    if user_id and settings.ONBOARDING_SESSION_MARKER:
+        request.session[MARCA_ONBOARDING] = _signer.sign(f"{user_id}:{version_onboarding(user_id)}")
+
+
+def desmarcar_onboarding(request):
+    """Borra la marca: el próximo request vuelve a verificar el perfil."""
+    request.session.pop(MARCA_ONBOARDING, None)
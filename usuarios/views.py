@@ -3,7 +3,11 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.db.models import Count, Min, Avg, Sum, Q
 from django.utils import timezone
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse
+from django.core.paginator import Paginator
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
 from django.views.decorators.http import require_POST
 from django.db import transaction
 from decimal import Decimal, ROUND_HALF_UP
@@ -12,8 +16,9 @@ from .models import (
     Wallet, Transaction, WorkEvent
 )
 from .currency_service import CurrencyService
+from .idempotency import idempotente
+from .user_context import desmarcar_onboarding, obtener_perfil, obtener_wallet
 from django.contrib.auth.models import User
-import csv
 from datetime import timedelta
 
 
@@ -52,8 +57,7 @@ def dashboard_home(request):
     - Sin rol: Redirige a selección de rol
     """
     # Verificar si el usuario tiene perfil
-    if not hasattr(request.user, 'profile'):
-        UserProfile.objects.create(user=request.user)
+    obtener_perfil(request.user)
     
     # Si no ha seleccionado un rol, redirigir al onboarding
     if not request.user.profile.tipo_rol:
@@ -63,13 +67,7 @@ def dashboard_home(request):
     context = {}
     
     # Obtener o crear wallet del usuario
-    wallet, created = Wallet.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'tipo_cuenta': 'USER',
-            'balance_usdc': Decimal('1000.00')
-        }
-    )
+    wallet = obtener_wallet(request.user)
     context['wallet'] = wallet
     
     # Dashboard para OFICIO: Trabajos disponibles en su zona
@@ -163,8 +161,7 @@ def dashboard(request):
     Dashboard principal del usuario con métricas según su rol.
     """
     # Verificar si el usuario tiene perfil
-    if not hasattr(request.user, 'profile'):
-        UserProfile.objects.create(user=request.user)
+    obtener_perfil(request.user)
     
     # Si no ha seleccionado un rol, redirigir al onboarding
     if not request.user.profile.tipo_rol:
@@ -174,13 +171,7 @@ def dashboard(request):
     context = {}
     
     # Obtener o crear wallet del usuario
-    wallet, created = Wallet.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'tipo_cuenta': 'USER',
-            'balance_usdc': Decimal('1000.00')
-        }
-    )
+    wallet = obtener_wallet(request.user)
     context['wallet'] = wallet
     
     # Obtener últimas transacciones del usuario
@@ -274,9 +265,11 @@ def role_selection(request):
     Vista para seleccionar el rol del usuario (Persona, Consorcio, Oficio).
     Primera pantalla del onboarding después del registro.
     """
+    # El middleware vuelve a verificar el perfil en el próximo request
+    desmarcar_onboarding(request)
+    
     # Crear perfil si no existe
-    if not hasattr(request.user, 'profile'):
-        UserProfile.objects.create(user=request.user, tipo_rol='')
+    obtener_perfil(request.user, tipo_rol='')
     
     # Si ya tiene rol completo, redirigir al dashboard
     profile = request.user.profile
@@ -314,9 +307,11 @@ def onboarding_form(request):
     Formulario dinámico de onboarding según el rol seleccionado.
     Muestra diferentes campos según el tipo de rol elegido.
     """
+    # El middleware vuelve a verificar el perfil en el próximo request
+    desmarcar_onboarding(request)
+    
     # Verificar que el usuario tenga perfil y rol
-    if not hasattr(request.user, 'profile'):
-        UserProfile.objects.create(user=request.user, tipo_rol='')
+    obtener_perfil(request.user, tipo_rol='')
     
     profile = request.user.profile
     
@@ -355,13 +350,7 @@ def onboarding_form(request):
                 profile.save()
                 
                 # Crear wallet inicial
-                Wallet.objects.get_or_create(
-                    user=request.user,
-                    defaults={
-                        'tipo_cuenta': 'USER',
-                        'balance_usdc': Decimal('1000.00')
-                    }
-                )
+                obtener_wallet(request.user)
                 
                 messages.success(request, '¡Bienvenido a Kunfido! Tu perfil de Consorcio está completo.')
                 return redirect(get_dashboard_url(request.user))
@@ -380,13 +369,7 @@ def onboarding_form(request):
                 profile.save()
                 
                 # Crear wallet inicial
-                Wallet.objects.get_or_create(
-                    user=request.user,
-                    defaults={
-                        'tipo_cuenta': 'USER',
-                        'balance_usdc': Decimal('1000.00')
-                    }
-                )
+                obtener_wallet(request.user)
                 
                 messages.success(request, f'¡Bienvenido a Kunfido! Tu perfil de {rubro} está completo.')
                 return redirect(get_dashboard_url(request.user))
@@ -403,13 +386,7 @@ def onboarding_form(request):
                 profile.save()
                 
                 # Crear wallet inicial
-                Wallet.objects.get_or_create(
-                    user=request.user,
-                    defaults={
-                        'tipo_cuenta': 'USER',
-                        'balance_usdc': Decimal('1000.00')
-                    }
-                )
+                obtener_wallet(request.user)
                 
                 messages.success(request, '¡Bienvenido a Kunfido! Tu perfil está completo.')
                 return redirect(get_dashboard_url(request.user))
@@ -430,8 +407,7 @@ def onboarding_rol(request):
     DEPRECATED: Usar role_selection y onboarding_form en su lugar.
     """
     # Verificar si el usuario tiene perfil
-    if not hasattr(request.user, 'profile'):
-        UserProfile.objects.create(user=request.user)
+    obtener_perfil(request.user)
     
     if request.method == 'POST':
         tipo_rol = request.POST.get('tipo_rol')
@@ -592,6 +568,7 @@ def oferta_detalle(request, oferta_id):
 
 @login_required
 @require_POST
+@idempotente
 def votar_propuesta(request, propuesta_id):
     """
     Vista para que el dueño de la oferta vote/desvote una propuesta.
@@ -1068,6 +1045,26 @@ def solicitar_reembolso(request, oferta_id):
     return redirect('usuarios:job_detail_private', oferta_id=oferta.id)
 
 
+def _codificar_cursor(cursor):
+    """Cursor (fecha_creacion, id) del historial como texto apto para la URL."""
+    if cursor is None:
+        return None
+    fecha, pk = cursor
+    return urlsafe_base64_encode(force_bytes(f"{fecha.isoformat()}|{pk}"))
+
+
+def _decodificar_cursor(valor):
+    """Inverso de _codificar_cursor; None (primera página) si el valor no es válido."""
+    if not valor:
+        return None
+    try:
+        fecha, pk = force_str(urlsafe_base64_decode(valor)).split('|')
+        fecha = parse_datetime(fecha)
+        return (fecha, int(pk)) if fecha else None
+    except (ValueError, TypeError):
+        return None
+
+
 @login_required
 @login_required
 def wallet_detalle(request):
@@ -1076,40 +1073,19 @@ def wallet_detalle(request):
     Muestra saldo, historial de transacciones y opciones de carga.
     """
     # Obtener o crear wallet del usuario
-    wallet, created = Wallet.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'tipo_cuenta': 'USER',
-            'balance_usdc': Decimal('1000.00')
-        }
-    )
+    wallet = obtener_wallet(request.user)
     
-    # Obtener todas las transacciones del usuario
-    transacciones_enviadas = Transaction.objects.filter(
-        from_wallet=wallet
-    ).select_related('to_wallet', 'oferta_relacionada', 'propuesta_relacionada')
-    
-    transacciones_recibidas = Transaction.objects.filter(
-        to_wallet=wallet
-    ).select_related('from_wallet', 'oferta_relacionada', 'propuesta_relacionada')
-    
-    # Combinar y ordenar por fecha
-    from itertools import chain
-    todas_transacciones = sorted(
-        chain(transacciones_enviadas, transacciones_recibidas),
-        key=lambda x: x.fecha_creacion,
-        reverse=True
+    # Historial paginado por cursor: una consulta por página, sin cargar
+    # todas las transacciones de la wallet en memoria
+    todas_transacciones, siguiente = Transaction.historial_wallet(
+        wallet,
+        antes=_decodificar_cursor(request.GET.get('antes'))
     )
     
-    # Calcular estadísticas
-    total_enviado = sum(
-        t.monto_usdc for t in transacciones_enviadas 
-        if t.status == 'COMPLETED'
-    )
-    total_recibido = sum(
-        t.monto_usdc for t in transacciones_recibidas 
-        if t.status == 'COMPLETED'
-    )
+    # Estadísticas: un único aggregate condicional
+    totales = Transaction.totales_wallet(wallet)
+    total_enviado = totales['enviado']
+    total_recibido = totales['recibido']
     
     # Obtener tasa de conversión en tiempo real
     tasa_conversion = CurrencyService.get_usdc_to_ars_rate(tipo_cambio="blue")
@@ -1118,6 +1094,8 @@ def wallet_detalle(request):
     context = {
         'wallet': wallet,
         'transacciones': todas_transacciones,
+        'cursor_siguiente': _codificar_cursor(siguiente),
+        'es_primera_pagina': not request.GET.get('antes'),
         'total_enviado': total_enviado,
         'total_recibido': total_recibido,
         'tasa_conversion': tasa_conversion,
@@ -1129,6 +1107,7 @@ def wallet_detalle(request):
 
 @login_required
 @require_POST
+@idempotente
 def cargar_fondos(request):
     """
     Simula la carga de fondos convirtiendo ARS a USDC_MOCK.
@@ -1154,13 +1133,11 @@ def cargar_fondos(request):
             }
         )
         
-        # Obtener cuenta del sistema (escrow) como origen
-        sistema_wallet = Wallet.get_escrow_account()
-        
         with transaction.atomic():
-            # Crear transacción de carga
+            # Crear transacción de carga: el dinero entra desde fuera de la
+            # plataforma, no sale de ninguna wallet (tampoco del escrow)
             trans = Transaction.objects.create(
-                from_wallet=sistema_wallet,
+                from_wallet=None,
                 to_wallet=wallet,
                 monto_usdc=monto_usdc,
                 tipo_transaccion='REFUND',  # Usamos REFUND para cargas manuales
@@ -1173,8 +1150,11 @@ def cargar_fondos(request):
                 }
             )
             
-            # Sumar al balance del usuario
-            wallet.sumar_saldo(monto_usdc)
+            # Sumar al balance del usuario (ingreso desde la cuenta externa)
+            Wallet.transferir_saldo(
+                None, wallet, monto_usdc,
+                tipo='CARGA', referencia=f'transaction:{trans.pk}'
+            )
             
             # Marcar como completada
             trans.status = 'COMPLETED'
@@ -1202,66 +1182,64 @@ def wallet_escrow(request):
     Muestra saldo disponible vs fondos bloqueados con diseño de alta seguridad.
     """
     # Obtener o crear wallet del usuario
-    wallet, created = Wallet.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'tipo_cuenta': 'USER',
-            'balance_usdc': Decimal('1000.00')
-        }
-    )
+    wallet = obtener_wallet(request.user)
     
     # Importar modelos de jobs para acceder a EscrowTransaction
     from jobs.models import EscrowTransaction, JobOffer
     
-    # Obtener fondos en garantía (escrow)
+    # Fondos en garantía (escrow): los totales vienen de los contadores de la
+    # wallet (se mantienen al bloquear/liberar), sólo se pagina el detalle
     # Como CLIENTE: fondos que depositó y están bloqueados
     # Como PROFESIONAL: fondos que están bloqueados para liberarse a él
     
-    fondos_bloqueados = []
-    total_en_garantia = Decimal('0.00')
+    es_cliente = request.user.profile.tipo_rol in ['PERSONA', 'CONSORCIO']
+    es_profesional = request.user.profile.tipo_rol == 'OFICIO'
     
-    if request.user.profile.tipo_rol in ['PERSONA', 'CONSORCIO']:
-        # Cliente: ver fondos que depositó y están LOCKED
+    if es_cliente:
+        total_en_garantia = wallet.saldo_bloqueado_usdc
         escrow_transactions = EscrowTransaction.objects.filter(
             from_wallet=wallet,
             status='LOCKED'
         ).select_related('job', 'bid__professional__user')
-        
-        for tx in escrow_transactions:
-            total_en_garantia += tx.amount_usdc
-            fondos_bloqueados.append({
-                'transaccion': tx,
-                'tipo': 'depositado',
-                'job': tx.job,
-                'profesional': tx.bid.professional,
-                'monto': tx.amount_usdc,
-                'porcentaje': '30%' if tx.transaction_type == 'INITIAL_DEPOSIT' else '70%',
-                'puede_confirmar': tx.transaction_type == 'INITIAL_DEPOSIT',
-            })
-    
-    elif request.user.profile.tipo_rol == 'OFICIO':
-        # Profesional: ver fondos bloqueados que se liberarán a él
+    elif es_profesional:
+        total_en_garantia = wallet.saldo_por_recibir_usdc
         escrow_transactions = EscrowTransaction.objects.filter(
-            bid__professional__user=request.user,
+            bid__professional=request.user.profile,
             status='LOCKED'
         ).select_related('job', 'job__creator__user')
-        
-        for tx in escrow_transactions:
-            total_en_garantia += tx.amount_usdc
-            fondos_bloqueados.append({
-                'transaccion': tx,
-                'tipo': 'pendiente_recibir',
-                'job': tx.job,
-                'cliente': tx.job.creator,
-                'monto': tx.amount_usdc,
-                'porcentaje': '30%' if tx.transaction_type == 'INITIAL_DEPOSIT' else '70%',
-                'puede_confirmar': False,
-            })
+    else:
+        total_en_garantia = Decimal('0.00')
+        escrow_transactions = EscrowTransaction.objects.none()
+    
+    paginator = Paginator(escrow_transactions.order_by('-created_at', '-id'), 10)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    
+    fondos_bloqueados = []
+    for tx in page_obj:
+        item = {
+            'transaccion': tx,
+            'job': tx.job,
+            'monto': tx.amount_usdc,
+            'porcentaje': '30%' if tx.transaction_type == 'INITIAL_DEPOSIT' else '70%',
+        }
+        if es_cliente:
+            item.update(
+                tipo='depositado',
+                profesional=tx.bid.professional,
+                puede_confirmar=tx.transaction_type == 'INITIAL_DEPOSIT',
+            )
+        else:
+            item.update(
+                tipo='pendiente_recibir',
+                cliente=tx.job.creator,
+                puede_confirmar=False,
+            )
+        fondos_bloqueados.append(item)
     
     # Obtener historial de transacciones de escrow completadas
     escrow_history = []
     
-    if request.user.profile.tipo_rol in ['PERSONA', 'CONSORCIO']:
+    if es_cliente:
         # Historial como cliente
         history_txs = EscrowTransaction.objects.filter(
             Q(from_wallet=wallet) | Q(job__creator__user=request.user)
@@ -1288,9 +1266,11 @@ def wallet_escrow(request):
         'saldo_disponible': saldo_disponible,
         'total_en_garantia': total_en_garantia,
         'fondos_bloqueados': fondos_bloqueados,
+        'page_obj': page_obj,
+        'is_paginated': page_obj.has_other_pages(),
         'escrow_history': escrow_history,
-        'es_cliente': request.user.profile.tipo_rol in ['PERSONA', 'CONSORCIO'],
-        'es_profesional': request.user.profile.tipo_rol == 'OFICIO',
+        'es_cliente': es_cliente,
+        'es_profesional': es_profesional,
     }
     
     return render(request, 'usuarios/wallet_escrow.html', context)
@@ -1384,88 +1364,5 @@ def exportar_trabajos_csv(request):
     Exporta un CSV con todos los trabajos terminados y sus montos.
     Solo accesible para superusuarios.
     """
-    # Crear la respuesta HTTP con el tipo de contenido CSV
-    response = HttpResponse(content_type='text/csv; charset=utf-8-sig')
-    response['Content-Disposition'] = 'attachment; filename="trabajos_terminados.csv"'
-    
-    # Agregar BOM para compatibilidad con Excel
-    response.write('\ufeff')
-    
-    # Crear el writer CSV
-    writer = csv.writer(response)
-    
-    # Escribir encabezados
-    writer.writerow([
-        'ID Trabajo',
-        'Título',
-        'Cliente',
-        'Email Cliente',
-        'Profesional Asignado',
-        'Email Profesional',
-        'Monto Total (USDC)',
-        'Fecha Creación',
-        'Fecha Límite',
-        'Fecha Finalización',
-        'Estado',
-        'Comisión Kunfido (USDC)',
-        'Pago a Profesional (USDC)',
-    ])
-    
-    # Obtener trabajos finalizados
-    trabajos = JobOffer.objects.filter(
-        status='FINALIZADA'
-    ).select_related(
-        'creador',
-        'profesional_asignado'
-    ).order_by('-fecha_creacion')
-    
-    # Escribir datos
-    for trabajo in trabajos:
-        # Buscar transacciones relacionadas
-        trans_escrow = Transaction.objects.filter(
-            oferta_relacionada=trabajo,
-            tipo_transaccion='ESCROW',
-            status='COMPLETED'
-        ).first()
-        
-        trans_pago = Transaction.objects.filter(
-            oferta_relacionada=trabajo,
-            tipo_transaccion='PAYMENT',
-            status='COMPLETED'
-        ).first()
-        
-        trans_fee = Transaction.objects.filter(
-            oferta_relacionada=trabajo,
-            tipo_transaccion='FEE',
-            status='COMPLETED'
-        ).first()
-        
-        # Buscar fecha de finalización
-        evento_completado = WorkEvent.objects.filter(
-            oferta=trabajo,
-            tipo_evento='TRABAJO_COMPLETADO'
-        ).first()
-        
-        fecha_finalizacion = evento_completado.fecha_evento if evento_completado else trabajo.fecha_actualizacion
-        
-        monto_total = trans_escrow.monto_usdc if trans_escrow else Decimal('0.00')
-        comision = trans_fee.monto_usdc if trans_fee else Decimal('0.00')
-        pago_profesional = trans_pago.monto_usdc if trans_pago else Decimal('0.00')
-        
-        writer.writerow([
-            trabajo.id,
-            trabajo.titulo,
-            trabajo.creador.get_full_name() or trabajo.creador.username,
-            trabajo.creador.email,
-            trabajo.profesional_asignado.get_full_name() if trabajo.profesional_asignado else 'N/A',
-            trabajo.profesional_asignado.email if trabajo.profesional_asignado else 'N/A',
-            str(monto_total),
-            trabajo.fecha_creacion.strftime('%Y-%m-%d %H:%M'),
-            trabajo.fecha_limite.strftime('%Y-%m-%d') if trabajo.fecha_limite else 'N/A',
-            fecha_finalizacion.strftime('%Y-%m-%d %H:%M'),
-            trabajo.get_status_display(),
-            str(comision),
-            str(pago_profesional),
-        ])
-    
-    return response
+    from analytics.exports import ReporteTrabajosTerminados
+    return ReporteTrabajosTerminados().respuesta()